@@ -1,76 +1,96 @@
 # Clinic Management API (Admin functions)
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from app.api.dependencies import verify_staff_token
 from app.models.clinic import Clinic, ClinicRequest, ClinicResponse
 from app.core.config import settings
-from typing import List, Dict
+from app.core.tracing import TracedRoute
+from app.services.clinic_registry import ClinicSnapshot, clinic_registry
+from pydantic import TypeAdapter
+from typing import List, Dict, Optional, Tuple
+import hashlib
 import json
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
+
+class ClinicPayloads:
+    """
+    Pre-serialized JSON bodies and strong ETags for one clinic registry version.
+    Built once per version so the hot clinic endpoints skip pydantic validation and encoding.
+    """
+
+    def __init__(self, snapshot: ClinicSnapshot):
+        self.version = snapshot.version
+        self.list_body = _clinic_list_adapter.dump_json(
+            [ClinicResponse.model_validate(c.model_dump()) for c in snapshot.active_clinics]
+        )
+        self.list_etag = _strong_etag(self.list_body)
+        self.details: Dict[str, Tuple[bytes, str]] = {}
+        for clinic in snapshot.clinics:
+            body = ClinicResponse.model_validate(clinic.model_dump()).model_dump_json().encode()
+            self.details[clinic.clinic_id] = (body, _strong_etag(body))
+
+_clinic_list_adapter = TypeAdapter(List[ClinicResponse])
+_payloads: Optional[ClinicPayloads] = None
+
+def _strong_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+def get_clinic_payloads() -> ClinicPayloads:
+    """Return payloads for the current registry version, regenerating them only when clinic data changed."""
+    global _payloads
+    snapshot = clinic_registry.snapshot
+    if _payloads is None or _payloads.version != snapshot.version:
+        _payloads = ClinicPayloads(snapshot)
+    return _payloads
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
+
+def cached_json_response(request: Request, body: bytes, etag: str) -> Response:
+    """Serve a pre-serialized JSON body, or 304 Not Modified when the client already has it."""
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.CLINIC_CACHE_MAX_AGE_SECONDS}"
+    }
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @router.get("/clinics", response_model=List[ClinicResponse])
-async def get_all_clinics():
+async def get_all_clinics(request: Request):
     """
     Get all available clinics (public endpoint for clinic selection)
     Using shared JamAI tables with clinic_name column
+    Supports conditional GET via ETag / If-None-Match
     """
     try:
-        # Return predefined clinics - all use shared JamAI tables
-        clinics = [
-            ClinicResponse(
-                clinic_id="clinic_001",
-                name="Klinik Bandar Utama",
-                address="Bandar Utama, Petaling Jaya, Selangor",
-                phone="+60-3-7725-0123",
-                email="info@klinikbandarutama.com",
-                operating_hours="Mon-Fri: 8:00AM-10:00PM, Sat-Sun: 8:00AM-6:00PM",
-                languages_supported=["BM", "EN", "ZH"],
-                services=["General Consultation", "Health Screening", "Vaccination", "Minor Surgery"],
-                is_active=True
-            ),
-            ClinicResponse(
-                clinic_id="clinic_002",
-                name="Klinik Sri Hartamas",
-                address="Sri Hartamas, Kuala Lumpur",
-                phone="+60-3-6201-9876",
-                email="contact@klinikshartamas.com",
-                operating_hours="Mon-Fri: 9:00AM-9:00PM, Sat: 9:00AM-5:00PM, Sun: Closed",
-                languages_supported=["BM", "EN", "TA"],
-                services=["Family Medicine", "Pediatrics", "Women's Health", "Travel Medicine"],
-                is_active=True
-            ),
-            ClinicResponse(
-                clinic_id="clinic_003",
-                name="Klinik Desa Jaya",
-                address="Desa Jaya, Kuala Lumpur",
-                phone="+60-3-4142-5678",
-                email="info@pksetapak.gov.my",
-                operating_hours="Mon-Sun: 8:00AM-12:00AM (24 hours emergency)",
-                languages_supported=["BM", "EN", "ZH", "TA"],
-                services=["Emergency Care", "Maternal Care", "Immunization", "Chronic Disease Management"],
-                is_active=True
-            )
-        ]
-        
-        return clinics
+        # Active clinics from the registry - all use shared JamAI tables
+        payloads = get_clinic_payloads()
+        return cached_json_response(request, payloads.list_body, payloads.list_etag)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching clinics: {str(e)}")
 
 @router.get("/clinics/{clinic_id}", response_model=ClinicResponse)
-async def get_clinic_details(clinic_id: str):
+async def get_clinic_details(clinic_id: str, request: Request):
     """
     Get detailed information about a specific clinic
+    Supports conditional GET via ETag / If-None-Match
     """
     try:
-        # Get all clinics and find the requested one
-        all_clinics = await get_all_clinics()
-        clinic = next((c for c in all_clinics if c.clinic_id == clinic_id), None)
+        clinic = clinic_registry.get(clinic_id)
         
         if not clinic:
             raise HTTPException(status_code=404, detail=f"Clinic {clinic_id} not found")
             
-        return clinic
+        body, etag = get_clinic_payloads().details[clinic.clinic_id]
+        return cached_json_response(request, body, etag)
         
     except HTTPException:
         raise
@@ -121,6 +141,19 @@ async def create_clinic(clinic_request: ClinicRequest):
     
     return clinic
 
+@router.post("/admin/clinics/reload", dependencies=[Depends(verify_staff_token)])
+async def reload_clinic_registry():
+    """
+    Re-read the clinic registry file immediately instead of waiting for the next hot-reload check (Admin only)
+    """
+    changed = clinic_registry.reload()
+    snapshot = clinic_registry.snapshot
+    return {
+        "changed": changed,
+        "version": snapshot.version,
+        "total_clinics": len(snapshot.clinics)
+    }
+
 @router.put("/admin/clinics/{clinic_id}", dependencies=[Depends(verify_staff_token)], response_model=ClinicResponse)
 async def update_clinic(clinic_id: str, clinic_request: ClinicRequest):
     """
@@ -154,12 +187,13 @@ async def get_system_status():
     """
     Get overall system status for all clinics (Admin only)
     """
-    all_clinics = await get_all_clinics()
-    active_clinics = [c.clinic_id for c in all_clinics if c.is_active]
+    snapshot = clinic_registry.snapshot
+    active_clinics = [c.clinic_id for c in snapshot.active_clinics]
     
     status_report = {
-        "total_clinics": len(all_clinics),
+        "total_clinics": len(snapshot.clinics),
         "active_clinics": active_clinics,
+        "clinic_registry_version": snapshot.version,
         "jamai_project_id": settings.JAMAI_PROJECT_ID,
         "shared_tables": {
             "appointment_booking": settings.ACTION_TABLE_TRIAGE,
@@ -1,64 +1,30 @@
 # FAQ, SOP Search, Triage (Public/Patient) 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import Response, StreamingResponse
+from app.core.config import settings
+from app.core.tracing import TracedRoute, span
 from app.services.jamai_services import jamai_service
-from app.models.chat import ChatRequest, ChatResponse
+from app.services.clinic_registry import clinic_registry, get_clinic_name_from_id
+from app.models.chat import ChatBatchItem, ChatBatchRequest, ChatBatchResponse, ChatRequest, ChatResponse
 from app.models.triage import TriageRequest, TriageResponse
-from typing import List
-
-def get_clinic_name_from_id(clinic_id: str, clinic_name: str = None) -> str:
-    """
-    Get clinic name for JamAI action tables.
-    If clinic_name is provided in request, use it. Otherwise derive from clinic_id.
-    """
-    if clinic_name:
-        return clinic_name
-    
-    # Default mapping - you may want to use a database lookup in production
-    clinic_name_mapping = {
-        'clinic_001': 'Klinik Bandar Utama',
-        'clinic_002': 'Klinik Sri Hartamas',
-        'clinic_003': 'Klinik Desa Jaya',
-        'clinic_004': 'Klinik Famili Wangsa Maju',
-        # Legacy mappings for backward compatibility
-        'klinik-bandar-utama': 'Klinik Bandar Utama',
-        'klinik-sri-hartamas': 'Klinik Sri Hartamas', 
-        'klinik-desa-jaya': 'Klinik Desa Jaya',
-        'klinik-wangsa': 'Klinik Famili Wangsa Maju',
-        # Add more mappings as needed
-    }
-    
-    return clinic_name_mapping.get(clinic_id, clinic_id.replace('-', ' ').title())
+from app.models.appointment import AppointmentResponse
+from app.models.job import AppointmentJobRequest, JobStatus, TriageJobRequest
+from app.services.appointment_parser import parse_appointment
+from app.services.faq_warmup import faq_warmer
+from app.services.jobs import job_manager
+from typing import List, Optional
+import json
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 @router.get("/clinics")
 async def get_available_clinics():
     """
-    Get list of available clinics - simplified version to avoid circular imports
+    Get list of available clinics from the clinic registry
     """
     return [
-        {
-            "clinic_id": "clinic_001",
-            "name": "Klinik Bandar Utama",
-            "address": "Bandar Utama, Petaling Jaya",
-            "phone": "+603-7725-0123",
-            "email": "info@klinikbandarutama.com",
-            "operating_hours": "Mon-Fri: 8AM-10PM, Sat-Sun: 8AM-6PM",
-            "languages_supported": ["English", "Bahasa Malaysia", "Mandarin"],
-            "services": ["General Consultation", "Health Screening", "Vaccination", "Minor Surgery"],
-            "is_active": True
-        },
-        {
-            "clinic_id": "clinic_002", 
-            "name": "Klinik Sri Hartamas",
-            "address": "Sri Hartamas, Kuala Lumpur",
-            "phone": "+603-6201-9876",
-            "email": "contact@klinikshartamas.com",
-            "operating_hours": "Mon-Fri: 9AM-9PM, Sat: 9AM-5PM, Sun: Closed",
-            "languages_supported": ["English", "Bahasa Malaysia", "Tamil"],
-            "services": ["Family Medicine", "Pediatrics", "Women's Health", "Travel Medicine"],
-            "is_active": True
-        }
+        clinic.public_dump()
+        for clinic in clinic_registry.active_clinics()
     ]
 
 @router.post("/chat", response_model=ChatResponse)
@@ -70,6 +36,8 @@ async def unified_chat(request: ChatRequest):
     """
     try:
         clinic_name = get_clinic_name_from_id(request.clinic_id, request.clinic_name)
+        # Frequent questions become warm-up candidates
+        faq_warmer.record(clinic_name, request.message, request.language)
         sop_result = await jamai_service.pdf_sop_answering(
             clinic_name=clinic_name,
             question=request.message,
@@ -79,9 +47,114 @@ async def unified_chat(request: ChatRequest):
             reply=sop_result.get("response", "No answer found"),
             source_document=sop_result.get("source_document", "")
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing chat query: {str(e)}")
 
+def format_sse(event: str, data: dict) -> str:
+    """Encode one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/chat/stream")
+async def unified_chat_stream(request: ChatRequest):
+    """
+    Streaming variant of /chat using Server-Sent Events (text/event-stream)
+    Events: `response` {"text": chunk} as the answer is generated,
+    then `done` {"source_document": ...}, or `error` {"reply": fallback message}
+    """
+    clinic_name = get_clinic_name_from_id(request.clinic_id, request.clinic_name)
+    faq_warmer.record(clinic_name, request.message, request.language)
+
+    async def event_stream():
+        # Flush headers straight away so the client sees the first byte before JamAI answers
+        yield ": stream opened\n\n"
+        async for event, text in jamai_service.stream_pdf_sop_answering(
+            clinic_name=clinic_name,
+            question=request.message,
+            language=request.language
+        ):
+            if event == "response":
+                yield format_sse("response", {"text": text})
+            elif event == "source_document":
+                yield format_sse("done", {"source_document": text})
+            else:
+                yield format_sse("error", {"reply": text})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Disable proxy buffering (nginx)
+        }
+    )
+
+def _batch_item(index: int, question: str, result: dict) -> ChatBatchItem:
+    return ChatBatchItem(
+        index=index,
+        question=question,
+        reply=result["response"],
+        source_document=result["source_document"],
+        cached=result["cached"],
+        error=result["error"]
+    )
+
+@router.post("/chat/batch", response_model=ChatBatchResponse)
+async def unified_chat_batch(request: ChatBatchRequest):
+    """
+    Answer several FAQ/SOP questions for one clinic and language in a single request
+    Uncached questions are answered with one multi-row SOP QnA call; each result carries its own error
+    With stream=true, Server-Sent Events: `result` {ChatBatchItem} per question as it is answered
+    (cached answers first), then `done` {"count": n}
+    """
+    max_questions = min(settings.CHAT_BATCH_MAX_QUESTIONS, 100)
+    if not request.questions:
+        raise HTTPException(status_code=422, detail="questions must not be empty")
+    if len(request.questions) > max_questions:
+        raise HTTPException(status_code=422, detail=f"At most {max_questions} questions per batch")
+    clinic_name = get_clinic_name_from_id(request.clinic_id, request.clinic_name)
+
+    if request.stream:
+        async def event_stream():
+            yield ": stream opened\n\n"
+            answered = set()
+            try:
+                async for index, result in jamai_service.iter_batch_pdf_sop_answering(
+                    clinic_name, request.questions, request.language
+                ):
+                    answered.add(index)
+                    item = _batch_item(index, request.questions[index], result)
+                    yield format_sse("result", item.model_dump())
+            except Exception as e:
+                # e.g. AdmissionRejected: headers are already sent, so report it per question
+                detail = e.detail if isinstance(e, HTTPException) else "Document search failed"
+                for index, question in enumerate(request.questions):
+                    if index not in answered:
+                        item = ChatBatchItem(index=index, question=question, reply="", error=str(detail))
+                        yield format_sse("result", item.model_dump())
+            yield format_sse("done", {"count": len(request.questions)})
+
+        return StreamingResponse(
+            event_stream(),
+            media_type="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no"  # Disable proxy buffering (nginx)
+            }
+        )
+
+    try:
+        results = await jamai_service.batch_pdf_sop_answering(clinic_name, request.questions, request.language)
+        return ChatBatchResponse(results=[
+            _batch_item(index, question, result)
+            for index, (question, result) in enumerate(zip(request.questions, results))
+        ])
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing chat batch: {str(e)}")
+
 @router.post("/chat/pdf", response_model=ChatResponse)
 async def search_pdf_sop(request: ChatRequest):
     """
@@ -99,6 +172,8 @@ async def search_pdf_sop(request: ChatRequest):
             reply=sop_result.get("response", "No answer found"),
             source_document=sop_result.get("source_document", "")
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error searching PDF documents: {str(e)}")
 
@@ -126,10 +201,70 @@ async def book_appointment(request: ChatRequest):
             "refined_user_message": booking_result.get("refined_user_message", "Appointment processed")
         }
         
+        with span("json", desc="structured_response"):
+            reply = json.dumps(structured_response)
+
         return ChatResponse(
-            reply=json.dumps(structured_response),
+            reply=reply,
             source_document=booking_result.get("booking_record", "{}")
         )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing appointment booking: {str(e)}")
+
+async def run_appointment(request: ChatRequest) -> AppointmentResponse:
+    """Run the Appointment Booking chain and decode its columns (shared by /appointment/v2 and jobs)."""
+    clinic_name = get_clinic_name_from_id(request.clinic_id, request.clinic_name)
+    booking_result = await jamai_service.appointment_booking(
+        clinic_name=clinic_name,
+        user_input=request.message,
+        language=request.language
+    )
+    return parse_appointment(booking_result, clinic_name)
+
+async def run_triage(request: TriageRequest) -> dict:
+    """Run triage through the Appointment Booking chain (shared by /triage and jobs)."""
+    # Convert triage request to user query for appointment booking
+    user_query = f"I have these symptoms: {request.symptoms}"
+    if request.patient_age:
+        user_query += f". I am {request.patient_age} years old."
+    if request.is_emergency:
+        user_query += " This is urgent/emergency."
+
+    clinic_name = get_clinic_name_from_id(request.clinic_id, request.clinic_name)
+    booking_result = await jamai_service.appointment_booking(
+        clinic_name=clinic_name,
+        user_input=user_query,
+        language="BM",
+        emergency=bool(request.is_emergency)
+    )
+
+    return {
+        "clinic_id": request.clinic_id,
+        "clinic_name": clinic_name,
+        "assessment": booking_result.get("refined_user_message", "Appointment processed"),
+        "booking_record": booking_result.get("booking_record", "{}"),
+        "symptoms_provided": request.symptoms,
+        "patient_age": request.patient_age,
+        "action_table_used": "appointment_booking"
+    }
+
+@router.post("/appointment/v2", response_model=AppointmentResponse)
+async def book_appointment_structured(request: ChatRequest):
+    """
+    Appointment booking using Action Table A (Appointment Booking), typed response (schema_version 2)
+    Same input as /appointment; time slots, case type, recommended time and booking record are
+    returned as nested objects instead of JSON strings inside `reply`
+    """
+    try:
+        appointment = await run_appointment(request)
+        # Already validated; serialize once instead of re-validating through response_model
+        with span("serialize", desc="appointment"):
+            body = appointment.model_dump_json()
+        return Response(content=body, media_type="application/json")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing appointment booking: {str(e)}")
 
@@ -140,32 +275,83 @@ async def trigger_triage(request: TriageRequest):
     Uses Action Table A for symptom analysis and booking recommendations
     """
     try:
-        # Convert triage request to user query for appointment booking
-        user_query = f"I have these symptoms: {request.symptoms}"
-        if request.patient_age:
-            user_query += f". I am {request.patient_age} years old."
-        if request.is_emergency:
-            user_query += " This is urgent/emergency."
-        
-        clinic_name = get_clinic_name_from_id(request.clinic_id, request.clinic_name)
-        booking_result = await jamai_service.appointment_booking(
-            clinic_name=clinic_name,
-            user_input=user_query,
-            language="BM"
-        )
-        
-        return {
-            "clinic_id": request.clinic_id,
-            "clinic_name": clinic_name,
-            "assessment": booking_result.get("refined_user_message", "Appointment processed"),
-            "booking_record": booking_result.get("booking_record", "{}"),
-            "symptoms_provided": request.symptoms,
-            "patient_age": request.patient_age,
-            "action_table_used": "appointment_booking"
-        }
+        return await run_triage(request)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing triage: {str(e)}")
 
+def _accepted(job, response: Response) -> dict:
+    response.headers["Location"] = f"/api/v1/patients/jobs/{job.job_id}"
+    return job.view()
+
+@router.post("/appointment/jobs", response_model=JobStatus, status_code=202)
+async def submit_appointment_job(
+    request: AppointmentJobRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None)
+):
+    """
+    Asynchronous /appointment/v2: returns a job id at once and runs the booking chain in the
+    background. Poll GET /jobs/{job_id} (result is the AppointmentResponse) or pass webhook_url.
+    Retries with the same Idempotency-Key header return the original job.
+    """
+    try:
+        async def run():
+            appointment = await run_appointment(request)
+            return appointment.model_dump(mode="json")
+
+        job = await job_manager.submit(
+            "appointment", request.clinic_id, run,
+            webhook_url=request.webhook_url, idempotency_key=idempotency_key
+        )
+        return _accepted(job, response)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error submitting appointment job: {str(e)}")
+
+@router.post("/triage/jobs", response_model=JobStatus, status_code=202)
+async def submit_triage_job(
+    request: TriageJobRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None)
+):
+    """
+    Asynchronous /triage: returns a job id at once; poll GET /jobs/{job_id} or pass webhook_url.
+    Emergency triage keeps its JamAI priority once the job runs.
+    """
+    try:
+        async def run():
+            return await run_triage(request)
+
+        job = await job_manager.submit(
+            "triage", request.clinic_id, run,
+            webhook_url=request.webhook_url, idempotency_key=idempotency_key
+        )
+        return _accepted(job, response)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error submitting triage job: {str(e)}")
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    """
+    Status of an appointment/triage job; `result` or `error` is set once it has finished.
+    Finished jobs are kept for JOB_RESULT_TTL_SECONDS, then 404.
+    Jobs are held by the worker process that accepted them, so multi-worker deployments need
+    sticky routing for polling (another worker answers 404).
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found or expired")
+    return job.view()
+
 # Legacy endpoint for backward compatibility
 @router.post("/triage/simple")
 async def simple_triage(clinic_id: str, symptoms: str, clinic_name: str = None):
@@ -184,5 +370,7 @@ async def simple_triage(clinic_id: str, symptoms: str, clinic_name: str = None):
             "booking_record": booking_result.get("booking_record", "{}"),
             "clinic_name": resolved_clinic_name
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing simple triage: {str(e)}")
\ No newline at end of file
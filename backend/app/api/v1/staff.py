@@ -1,35 +1,21 @@
 # Medication Lookup, Admin (Protected)
 from fastapi import APIRouter, Depends, HTTPException, Query
 from app.services.jamai_services import jamai_service
+from app.services.admission import admission_controller
+from app.services.jobs import job_manager
+from app.services.faq_warmup import faq_warmer
+from app.services.clinic_registry import clinic_registry, get_clinic_name_from_id
+from app.services.answer_cache import sop_answer_cache
+from app.services.answer_store import NAMESPACE_MEDICATION, NAMESPACE_SOP, answer_store
+from app.services.medication_index import medication_index
+from app.services.drug_resolver import drug_resolver
 from app.api.dependencies import verify_staff_token
 from app.models.med_lookup import MedLookupRequest, MedLookupResponse
+from app.core.config import settings
+from app.core.tracing import TracedRoute
 from typing import List
 
-def get_clinic_name_from_id(clinic_id: str, clinic_name: str = None) -> str:
-    """
-    Get clinic name for JamAI action tables.
-    If clinic_name is provided, use it. Otherwise derive from clinic_id.
-    """
-    if clinic_name:
-        return clinic_name
-    
-    # Default mapping - should match the one in patients.py
-    clinic_name_mapping = {
-        'clinic_001': 'Klinik Bandar Utama',
-        'clinic_002': 'Klinik Dr. Ahmad',
-        'clinic_003': 'Pusat Kesihatan Setapak',
-        'clinic_004': 'Klinik Famili Wangsa Maju',
-        # Legacy mappings for backward compatibility
-        'klinik-bandar-utama': 'Klinik Bandar Utama',
-        'klinik-sri-hartamas': 'Klinik Sri Hartamas', 
-        'klinik-desa-jaya': 'Pusat Kesihatan Setapak',
-        'klinik-wangsa': 'Klinik Famili Wangsa Maju',
-        # Add more mappings as needed
-    }
-    
-    return clinic_name_mapping.get(clinic_id, clinic_id.replace('-', ' ').title())
-
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 @router.get("/medication-lookup", dependencies=[Depends(verify_staff_token)])
 async def lookup_medication(
@@ -46,7 +32,8 @@ async def lookup_medication(
         user_input = f"Check stock and availability for {drug_name}"
         lookup_result = await jamai_service.medication_lookup_staff(
             clinic_name=resolved_clinic_name,
-            user_input=user_input
+            user_input=user_input,
+            drug_name=drug_name
         )
         return {
             "clinic_id": clinic_id,
@@ -54,8 +41,11 @@ async def lookup_medication(
             "drug_name": drug_name,
             "drug_entry": lookup_result.get("drug_entry", "{}"),
             "medication_message": lookup_result.get("medication_message", "No information found"),
-            "action_table_used": "medication_lookup"
+            "action_table_used": "medication_lookup",
+            "answered_from": lookup_result.get("answered_from", "action_table")
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error looking up medication: {str(e)}")
 
@@ -70,7 +60,8 @@ async def lookup_medication_post(request: MedLookupRequest):
         user_input = f"I need information about {request.drug_name} - check stock, price, and any alternatives available"
         lookup_result = await jamai_service.medication_lookup_staff(
             clinic_name=clinic_name,
-            user_input=user_input
+            user_input=user_input,
+            drug_name=request.drug_name
         )
         
         return {
@@ -80,8 +71,11 @@ async def lookup_medication_post(request: MedLookupRequest):
             "drug_entry": lookup_result.get("drug_entry", "{}"),
             "medication_message": lookup_result.get("medication_message", "No information found"),
             "action_table_used": "medication_lookup",
+            "answered_from": lookup_result.get("answered_from", "action_table"),
             "query_processed": user_input
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error looking up medication: {str(e)}")
 
@@ -92,7 +86,7 @@ async def get_staff_accessible_clinics():
     In a production system, this would be filtered based on staff permissions.
     """
     try:
-        clinics = await jamai_service.get_available_clinics()
+        clinics = [clinic.model_dump(exclude={"aliases"}) for clinic in clinic_registry.all_clinics()]
         return {
             "accessible_clinics": clinics,
             "note": "Staff access to all configured clinics"
@@ -106,12 +100,22 @@ async def get_clinic_status(clinic_id: str):
     Get operational status and basic info for a specific clinic.
     This could include system health, table status, etc.
     """
+    clinic = clinic_registry.get(clinic_id)
+    if not clinic:
+        raise HTTPException(status_code=404, detail=f"Clinic {clinic_id} not found")
+
     try:
         # In a real implementation, you might check if JamAI tables exist and are accessible
-        clinic_config = jamai_service._get_clinic_tables(clinic_id)
+        # All clinics share the same tables, filtered by clinic_name
+        clinic_config = {
+            "clinic_name": clinic.name,
+            "appointment_booking": settings.ACTION_TABLE_TRIAGE,
+            "sop_qna": settings.ACTION_TABLE_SOP_QNA,
+            "medication_lookup": settings.ACTION_TABLE_LOOKUP
+        }
         return {
-            "clinic_id": clinic_id,
-            "status": "operational",
+            "clinic_id": clinic.clinic_id,
+            "status": "operational" if clinic.is_active else "inactive",
             "configured_tables": clinic_config,
             "timestamp": "2024-11-26T00:00:00Z"
         }
@@ -139,8 +143,11 @@ async def staff_chat_message(request: dict):
             "clinic_name": resolved_clinic_name,
             "drug_entry": lookup_result.get("drug_entry", "{}"),
             "medication_message": lookup_result.get("medication_message", "No information found"),
-            "action_table_used": "medication_lookup"
+            "action_table_used": "medication_lookup",
+            "answered_from": lookup_result.get("answered_from", "action_table")
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing staff chat: {str(e)}")
 
@@ -163,11 +170,155 @@ async def complex_medication_query(clinic_id: str, query: str, clinic_name: str
             "staff_query": query,
             "drug_entry": lookup_result.get("drug_entry", "{}"),
             "medication_message": lookup_result.get("medication_message", "No information found"),
-            "action_table_used": "medication_lookup"
+            "action_table_used": "medication_lookup",
+            "answered_from": lookup_result.get("answered_from", "action_table")
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing medication query: {str(e)}")
 
+@router.get("/cache/stats", dependencies=[Depends(verify_staff_token)])
+async def get_answer_cache_stats():
+    """
+    Hit/miss counters and size of the SOP QnA answer cache (this process) and the shared answer store
+    """
+    return {"sop_answer_cache": sop_answer_cache.stats(), "answer_store": await answer_store.stats()}
+
+@router.post("/answer-store/purge", dependencies=[Depends(verify_staff_token)])
+async def purge_answer_store(clinic_id: str = None, clinic_name: str = None, namespace: str = None):
+    """
+    Drop one clinic's answers from the shared answer store, optionally only one namespace
+    ("sop" or "medication"). This worker's in-process SOP cache entries for the clinic are dropped
+    at once; other workers drop theirs within ANSWER_STORE_REVALIDATE_SECONDS (needs the store enabled).
+    """
+    if namespace not in (None, NAMESPACE_SOP, NAMESPACE_MEDICATION):
+        raise HTTPException(status_code=400, detail=f"Unknown namespace: {namespace}")
+    if not (clinic_id or clinic_name):
+        raise HTTPException(status_code=400, detail="clinic_id or clinic_name is required")
+    resolved_clinic_name = get_clinic_name_from_id(clinic_id or "", clinic_name)
+    removed = await answer_store.purge_clinic(resolved_clinic_name, namespace)
+    if namespace != NAMESPACE_MEDICATION:
+        sop_answer_cache.invalidate_clinic(resolved_clinic_name)
+    return {"clinic_name": resolved_clinic_name, "namespace": namespace, "entries_removed": removed}
+
+@router.get("/jamai/stats", dependencies=[Depends(verify_staff_token)])
+async def get_jamai_stats():
+    """
+    Action Table call metrics: micro-batch sizes, queueing delay, single-flight coalescing,
+    hedges/retries and circuit breaker state
+    """
+    return {
+        "batching": jamai_service.batching_stats(),
+        "single_flight": jamai_service.single_flight_stats(),
+        "hedging": jamai_service.hedging_stats(),
+        "circuit_breakers": jamai_service.circuit_breaker_stats()
+    }
+
+@router.post("/jamai/circuit-breakers/reset", dependencies=[Depends(verify_staff_token)])
+async def reset_circuit_breakers(table_id: str = None):
+    """
+    Close an Action Table's circuit breaker (all tables when table_id is omitted),
+    e.g. after JamAI confirms an incident is resolved
+    """
+    if table_id and table_id not in jamai_service.circuit_breaker_stats():
+        raise HTTPException(status_code=404, detail=f"Unknown Action Table: {table_id}")
+    return {"reset": jamai_service.reset_circuit_breakers(table_id)}
+
+@router.get("/admission/stats", dependencies=[Depends(verify_staff_token)])
+async def get_admission_stats():
+    """
+    Shared JamAI slots in use, and per-clinic limits, queue depth, waits and rejections
+    """
+    return {"admission": admission_controller.stats()}
+
+@router.get("/jobs/stats", dependencies=[Depends(verify_staff_token)])
+async def get_job_stats():
+    """
+    Async appointment/triage jobs: queue depth, retained results, outcomes, evictions and webhook deliveries
+    """
+    return {"jobs": job_manager.stats()}
+
+@router.get("/medication-index/stats", dependencies=[Depends(verify_staff_token)])
+async def get_medication_index_stats():
+    """
+    Items indexed per clinic and hit/miss counts of the local medication index
+    """
+    return {"medication_index": medication_index.stats()}
+
+@router.get("/drug-resolve", dependencies=[Depends(verify_staff_token)])
+async def resolve_drug_name(
+    q: str = Query(..., description="Drug name as typed, e.g. 'pcm', 'panadol' or a misspelling"),
+    limit: int = Query(5, ge=1, le=20)
+):
+    """
+    Ranked canonical drug names with similarity scores for a typed drug name
+    """
+    return {
+        "query": q,
+        "candidates": [
+            {"drug_name": name, "score": score}
+            for name, score in drug_resolver.resolve(q, limit)
+        ]
+    }
+
+@router.post("/medication-index/reload", dependencies=[Depends(verify_staff_token)])
+async def reload_medication_index():
+    """
+    Rebuild the local medication index from the CSVs in MEDICATION_DATA_DIR.
+    Called by scripts/upload_knowledge.py after pushing medication CSVs to KNOWLEDGE_TABLE_MEDS.
+    """
+    items = medication_index.reload()
+    # Stored Action Table answers may quote the old stock levels
+    await answer_store.clear(NAMESPACE_MEDICATION)
+    return {"items_indexed": items, "files_loaded": medication_index.files_loaded}
+
+@router.post("/cache/invalidate", dependencies=[Depends(verify_staff_token)])
+async def invalidate_answer_cache(clinic_id: str = None, clinic_name: str = None):
+    """
+    Drop cached SOP answers after new knowledge is uploaded: this worker's in-process cache
+    (entries_removed) and the shared answer store (stored_entries_removed). Other workers drop
+    their in-process copies within ANSWER_STORE_REVALIDATE_SECONDS (needs the store enabled).
+    Invalidates a single clinic when clinic_id or clinic_name is given, otherwise the whole cache.
+    Called by scripts/upload_knowledge.py after pushing documents to KNOWLEDGE_TABLE_SOP.
+    """
+    if clinic_id or clinic_name:
+        resolved_clinic_name = get_clinic_name_from_id(clinic_id or "", clinic_name)
+        removed = sop_answer_cache.invalidate_clinic(resolved_clinic_name)
+        stored_removed = await answer_store.purge_clinic(resolved_clinic_name, NAMESPACE_SOP)
+        # Re-precompute the clinic's starter questions against the new knowledge
+        clinic = clinic_registry.get_by_name(resolved_clinic_name)
+        if clinic is not None:
+            faq_warmer.knowledge_updated(clinic.clinic_id)
+        return {"clinic_name": resolved_clinic_name, "entries_removed": removed, "stored_entries_removed": stored_removed}
+
+    removed = sop_answer_cache.clear()
+    stored_removed = await answer_store.clear(NAMESPACE_SOP)
+    faq_warmer.knowledge_updated()
+    return {"clinic_name": None, "entries_removed": removed, "stored_entries_removed": stored_removed}
+
+@router.get("/faq-warmup/status", dependencies=[Depends(verify_staff_token)])
+async def get_faq_warmup_status(clinic_id: str = None):
+    """
+    Which starter questions are precomputed: per clinic and language, each question's state
+    (warm, stale, failed, cold), source (configured or mined) and answer age
+    """
+    if clinic_id and not clinic_registry.get(clinic_id):
+        raise HTTPException(status_code=404, detail=f"Clinic {clinic_id} not found")
+    return {"faq_warmup": faq_warmer.status(clinic_registry.get(clinic_id).clinic_id if clinic_id else None)}
+
+@router.post("/faq-warmup/run", dependencies=[Depends(verify_staff_token)], status_code=202)
+async def run_faq_warmup(clinic_id: str = None, force: bool = False):
+    """
+    Start a warm-up now for one clinic (or all active clinics) in the background.
+    force=true recomputes answers that are still fresh.
+    """
+    clinic = clinic_registry.get(clinic_id) if clinic_id else None
+    if clinic_id and clinic is None:
+        raise HTTPException(status_code=404, detail=f"Clinic {clinic_id} not found")
+    faq_warmer.trigger(clinic.clinic_id if clinic else None, force)
+    return {"scheduled": clinic.clinic_id if clinic else "all", "force": force}
+
 @router.post("/admin/clinic-config", dependencies=[Depends(verify_staff_token)])
 async def update_clinic_config(clinic_id: str, config: dict):
     """
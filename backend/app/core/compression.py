@@ -0,0 +1,165 @@
+# Response compression: brotli/gzip negotiated from Accept-Encoding, for text bodies above a size threshold
+from typing import Dict, Optional, Tuple
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.core.tracing import span
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml")
+# Never compressed: SSE must reach the client event by event
+UNCOMPRESSED_TYPES = ("text/event-stream",)
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Accept-Encoding as {coding: q}, e.g. "gzip, br;q=0.8" -> {"gzip": 1.0, "br": 0.8}."""
+    codings = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        codings[name] = q
+    return codings
+
+
+def choose_encoding(accept_encoding: str, available: Tuple[str, ...]) -> Optional[str]:
+    """Best coding the client accepts; ties go to the server's order in `available`."""
+    if not accept_encoding:
+        return None
+    codings = parse_accept_encoding(accept_encoding)
+    wildcard = codings.get("*", 0.0)
+    best, best_q = None, 0.0
+    for coding in available:
+        q = codings.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class _Encoder:
+    """Incremental compressor; flush() emits everything written so far so streams are not held back."""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        if self.encoding == "br":
+            out = self._brotli.process(data)
+            return out + self._brotli.flush() if flush else out
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI compression middleware (Starlette's GZipMiddleware buffers streams and has no brotli).
+    - Bodies under `minimum_size` bytes are sent as-is: the codec overhead outweighs the savings.
+    - Only text-like content types are compressed; responses that already carry a
+      Content-Encoding, and text/event-stream, pass through untouched.
+    - Vary: Accept-Encoding is added whenever the encoding depended on the request.
+    - Strong ETags become weak on compressed bodies (the bytes differ per coding); If-None-Match
+      uses weak comparison, so conditional requests keep working.
+    - Other streamed bodies are compressed chunk by chunk with a sync flush after each one.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.available = ("br", "gzip") if brotli is not None else ("gzip",)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""), self.available)
+        start_message = None
+        encoder: Optional[_Encoder] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, encoder, passthrough
+            if message["type"] == "http.response.start":
+                # Held until the first body chunk shows whether (and how) to compress
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            if encoder is not None:
+                body = message.get("body", b"")
+                if message.get("more_body", False):
+                    chunk = encoder.compress(body, flush=True)
+                else:
+                    chunk = encoder.compress(body) + encoder.finish()
+                await send({**message, "body": chunk})
+                return
+
+            # First body chunk
+            headers = MutableHeaders(scope=start_message)
+            body = message.get("body", b"")
+            streaming = message.get("more_body", False)
+            if not self._compressible(start_message["status"], headers) or \
+                    (not streaming and len(body) < self.minimum_size):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            headers.add_vary_header("Accept-Encoding")
+            if encoding is None:
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["etag"] = f"W/{etag}"
+            headers["content-encoding"] = encoding
+            encoder = _Encoder(encoding, self.gzip_level, self.brotli_quality)
+            if streaming:
+                del headers["content-length"]
+                await send(start_message)
+                await send({**message, "body": encoder.compress(body, flush=True)})
+                return
+
+            with span("compress", desc=encoding):
+                compressed = encoder.compress(body) + encoder.finish()
+            headers["content-length"] = str(len(compressed))
+            await send(start_message)
+            await send({**message, "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _compressible(self, status: int, headers: MutableHeaders) -> bool:
+        if status < 200 or status in (204, 304) or "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "").lower()
+        if content_type.startswith(UNCOMPRESSED_TYPES):
+            return False
+        return content_type.startswith(COMPRESSIBLE_TYPES)
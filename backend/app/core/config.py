@@ -1,6 +1,10 @@
 # Env vars (JamAI Token, Project ID) 
+import os
 from pydantic_settings import BaseSettings
 
+# backend/ (relative state paths resolve here, not against the working directory)
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 class Settings(BaseSettings):
     JAMAI_API_KEY: str
     JAMAI_PROJECT_ID: str
@@ -12,15 +16,151 @@ class Settings(BaseSettings):
     ACTION_TABLE_TRIAGE: str = "Appointment Booking"
     ACTION_TABLE_LOOKUP: str = "Medical Lookup"
     ACTION_TABLE_SOP_QNA: str = "SOP QnA"
+
+    # Max concurrent in-flight calls per Action Table (protects JamAI rate limits)
+    ACTION_TABLE_TRIAGE_CONCURRENCY: int = 8
+    ACTION_TABLE_LOOKUP_CONCURRENCY: int = 8
+    ACTION_TABLE_SOP_QNA_CONCURRENCY: int = 16
+
+    # Micro-batching of concurrent rows into one add_table_rows call (window 0 disables)
+    ACTION_TABLE_BATCH_WINDOW_MS: float = 10.0
+    ACTION_TABLE_MAX_BATCH_SIZE: int = 20
+    # Questions accepted by /patients/chat/batch (answered with one multi-row SOP QnA call; max 100)
+    CHAT_BATCH_MAX_QUESTIONS: int = 20
+
+    # Deadline per Action Table call (streams included); slower calls fail over to the fallback answer
+    ACTION_TABLE_TRIAGE_TIMEOUT_SECONDS: float = 45.0
+    ACTION_TABLE_LOOKUP_TIMEOUT_SECONDS: float = 30.0
+    ACTION_TABLE_SOP_QNA_TIMEOUT_SECONDS: float = 30.0
+
+    # Circuit breaker per Action Table: opens after N consecutive timeouts, connection or server errors (not 4xx),
+    # answers with fallbacks for RECOVERY seconds, then lets PROBES calls through to test recovery
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_BREAKER_RECOVERY_SECONDS: float = 30.0
+    CIRCUIT_BREAKER_HALF_OPEN_PROBES: int = 1
+
+    # Hedging (opt-in per table): fire a duplicate call when the first is slower than the
+    # table's HEDGE_PERCENTILE latency (never sooner than HEDGE_MIN_DELAY_SECONDS).
+    # Ignored for Appointment Booking, whose calls write a booking
+    ACTION_TABLE_TRIAGE_HEDGING: bool = False
+    ACTION_TABLE_LOOKUP_HEDGING: bool = False
+    ACTION_TABLE_SOP_QNA_HEDGING: bool = False
+    HEDGE_PERCENTILE: float = 95.0
+    HEDGE_MIN_DELAY_SECONDS: float = 1.0
+    HEDGE_MIN_SAMPLES: int = 50
+    # Retries of transient JamAI errors with full-jitter exponential backoff
+    RETRY_MAX_ATTEMPTS: int = 2
+    RETRY_BASE_DELAY_SECONDS: float = 0.2
+    RETRY_MAX_DELAY_SECONDS: float = 2.0
+    # Global budget shared by hedges and retries: extra calls <= RATIO * calls + BURST
+    EXTRA_CALL_BUDGET_RATIO: float = 0.05
+    EXTRA_CALL_BUDGET_BURST: float = 10.0
+
+    # Admission control in front of JamAI: per-clinic token buckets plus weighted fair queuing
+    # for ADMISSION_MAX_CONCURRENT shared slots. Defaults per clinic; override per clinic_id in the
+    # registry ("capacity") or in ADMISSION_CLINIC_LIMITS, a JSON object keyed by clinic_id
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_MAX_CONCURRENT: int = 32
+    ADMISSION_MAX_WAIT_SECONDS: float = 10.0
+    ADMISSION_WEIGHT: float = 1.0
+    ADMISSION_RATE_PER_SECOND: float = 5.0
+    ADMISSION_BURST: int = 20
+    ADMISSION_MAX_QUEUE: int = 50
+    ADMISSION_CLINIC_LIMITS: str = ""
+    # Emergency triage (client-flagged is_emergency) has its own per-clinic bucket and queue bound,
+    # sized well above real emergency volume but still finite
+    ADMISSION_EMERGENCY_RATE_PER_SECOND: float = 1.0
+    ADMISSION_EMERGENCY_BURST: int = 10
+    ADMISSION_EMERGENCY_MAX_QUEUE: int = 20
+    # Queued work is served emergency > booking > staff lookup > FAQ; waiting work moves up one
+    # priority per PRIORITY_AGING_SECONDS (up to booking) so lower tiers are not starved
+    PRIORITY_AGING_SECONDS: float = 2.0
+
+    # Async job mode for appointment booking / triage (/patients/appointment/jobs, /patients/triage/jobs).
+    # JOB_WORKERS chains run at once, JOB_MAX_PENDING more may queue (then 503); finished results are
+    # kept JOB_RESULT_TTL_SECONDS, at most JOB_MAX_RETAINED jobs in total. Jobs and Idempotency-Key
+    # dedupe are per process: with several workers, polling must reach the worker that accepted the job.
+    # On shutdown, queued and running jobs get JOB_SHUTDOWN_GRACE_SECONDS to finish before being cancelled
+    JOB_WORKERS: int = 8
+    JOB_MAX_PENDING: int = 200
+    JOB_RESULT_TTL_SECONDS: float = 900.0
+    JOB_MAX_RETAINED: int = 2000
+    JOB_SHUTDOWN_GRACE_SECONDS: float = 10.0
+    # Webhooks: POSTed the finished job; signed (X-MediFlow-Signature: sha256=<hmac>) when a secret is
+    # set. Comma-separated host allowlist ("*" = any host); empty disables webhooks. Hosts must resolve
+    # to public addresses unless JOB_WEBHOOK_ALLOW_PRIVATE (receivers on the internal network)
+    JOB_WEBHOOK_TIMEOUT_SECONDS: float = 5.0
+    JOB_WEBHOOK_MAX_ATTEMPTS: int = 3
+    JOB_WEBHOOK_SECRET: str = ""
+    JOB_WEBHOOK_ALLOWED_HOSTS: str = ""
+    JOB_WEBHOOK_ALLOW_PRIVATE: bool = False
+
+    # SOP QnA answer cache (in-process LRU)
+    ANSWER_CACHE_MAX_ENTRIES: int = 2048
+    ANSWER_CACHE_TTL_SECONDS: int = 3600
+    # Persistent answer store behind the in-process cache (SQLite in WAL mode), shared by all workers
+    # on this disk and kept across restarts. SOP answers live ANSWER_STORE_TTL_SECONDS, medication
+    # answers (stock changes) ANSWER_STORE_MEDICATION_TTL_SECONDS; LRU eviction over the caps.
+    # A relative ANSWER_STORE_PATH is taken relative to backend/. Purges bump a per-clinic generation
+    # that every worker checks at most every ANSWER_STORE_REVALIDATE_SECONDS to drop its in-process copies
+    ANSWER_STORE_ENABLED: bool = True
+    ANSWER_STORE_PATH: str = os.path.join(BACKEND_DIR, "data", "answer_store.sqlite3")
+    ANSWER_STORE_REVALIDATE_SECONDS: float = 2.0
+    ANSWER_STORE_TTL_SECONDS: int = 86400
+    ANSWER_STORE_MEDICATION_TTL_SECONDS: int = 300
+    ANSWER_STORE_MAX_ENTRIES: int = 50000
+    ANSWER_STORE_MAX_MB: float = 64.0
+    ANSWER_STORE_SWEEP_EVERY: int = 200
+
+    # FAQ warm-up: precompute SOP answers for each clinic's starter questions (app/data/faq_questions.json
+    # or FAQ_QUESTIONS_PATH, plus the clinic's faq_questions and the most asked questions from traffic)
+    # at startup, every FAQ_WARM_INTERVAL_SECONDS and after knowledge uploads. Scheduled runs call JamAI
+    # from one worker (a lease in the answer store); the others load its answers. Keep
+    # FAQ_WARM_STALE_SECONDS + FAQ_WARM_INTERVAL_SECONDS below ANSWER_CACHE_TTL_SECONDS so answers never go cold
+    FAQ_WARM_ENABLED: bool = True
+    FAQ_QUESTIONS_PATH: str = ""
+    FAQ_WARM_LANGUAGES: str = "BM,EN"
+    FAQ_WARM_MAX_QUESTIONS: int = 20
+    FAQ_WARM_MINED_TOP_N: int = 10
+    FAQ_WARM_MINED_MIN_COUNT: int = 3
+    FAQ_WARM_MINED_MAX_TRACKED: int = 500
+    FAQ_WARM_INTERVAL_SECONDS: float = 900.0
+    FAQ_WARM_STALE_SECONDS: float = 2400.0
+    FAQ_WARM_AFTER_UPLOAD_DELAY_SECONDS: float = 30.0
     
+    # Clinic registry (empty path uses the bundled app/data/clinics.json)
+    CLINIC_REGISTRY_PATH: str = ""
+    CLINIC_REGISTRY_RELOAD_SECONDS: float = 5.0
+    CLINIC_CACHE_MAX_AGE_SECONDS: int = 60  # Cache-Control max-age for clinic list/detail responses
+
+    # Directory with the medication CSVs uploaded to KNOWLEDGE_TABLE_MEDS (indexed locally for stock lookups).
+    # Defaults to the app's bundled assets/; a relative path is taken relative to backend/
+    MEDICATION_DATA_DIR: str = os.path.join(os.path.dirname(BACKEND_DIR), "assets")
+    # Drug name resolver: synonym table (empty uses app/data/drug_synonyms.json) and min trigram similarity
+    DRUG_SYNONYMS_PATH: str = ""
+    DRUG_RESOLVER_MIN_SCORE: float = 0.5
+
+    # Prometheus /metrics endpoint and request timing middleware
+    METRICS_ENABLED: bool = True
+
+    # Per-request spans: Server-Timing response header, and OTLP/JSON export of a sampled
+    # fraction of requests to a JSON-lines file and/or an OTLP/HTTP collector (e.g. http://localhost:4318)
+    SERVER_TIMING_ENABLED: bool = True
+    TRACE_SAMPLE_RATE: float = 0.01
+    TRACE_EXPORT_FILE: str = ""
+    TRACE_EXPORT_ENDPOINT: str = ""
+
+    # Response compression negotiated from Accept-Encoding (brotli preferred, gzip fallback).
+    # Bodies under COMPRESSION_MIN_SIZE bytes are never compressed; SSE streams are never compressed
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+
     # Security
     CLINIC_SECRET_CODE: str = "MEDIFLOW2025"
 
     class Config:
         env_file = ".env"
-    
-    def get_all_clinic_ids(self):
-        """Return list of configured clinic IDs"""
-        return ["cid_01_public", "cid_02_private", "cid_03_specialist"]
 
 settings = Settings()
\ No newline at end of file
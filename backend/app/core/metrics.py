@@ -0,0 +1,176 @@
+# Prometheus metrics: API latency per route and clinic, JamAI Action Table latency and errors
+from contextvars import ContextVar
+from typing import Dict, Optional
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Spans cache hits (~1ms) up to slow LLM chains (tens of seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "mediflow_http_request_duration_seconds",
+    "API request latency by route template, method and status code.",
+    ["route", "method", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+CLINIC_REQUEST_SECONDS = Histogram(
+    "mediflow_clinic_request_duration_seconds",
+    "API request latency by route template and the clinic the request resolved to.",
+    ["route", "clinic_id"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_IN_FLIGHT = Gauge(
+    "mediflow_http_requests_in_flight",
+    "API requests currently being served.",
+)
+JAMAI_CALL_SECONDS = Histogram(
+    "mediflow_jamai_call_duration_seconds",
+    "JamAI add_table_rows latency per Action Table (mode is batch or stream).",
+    ["table", "mode"],
+    buckets=LATENCY_BUCKETS,
+)
+JAMAI_ERRORS = Counter(
+    "mediflow_jamai_errors_total",
+    "Failed JamAI calls per Action Table and exception type.",
+    ["table", "error"],
+)
+JAMAI_ROWS = Counter(
+    "mediflow_jamai_rows_total",
+    "Rows sent to each Action Table.",
+    ["table"],
+)
+JAMAI_IN_FLIGHT = Gauge(
+    "mediflow_jamai_calls_in_flight",
+    "JamAI calls currently running per Action Table.",
+    ["table"],
+)
+JAMAI_MISSING_COLUMNS = Counter(
+    "mediflow_jamai_missing_columns_total",
+    "Expected output columns missing from JamAI responses.",
+    ["table", "column"],
+)
+JAMAI_EXTRA_CALLS = Counter(
+    "mediflow_jamai_extra_calls_total",
+    "Hedged and retried JamAI calls per Action Table (kind: hedge, hedge_won, retry, or *_denied by the budget).",
+    ["table", "kind"],
+)
+JAMAI_BREAKER_STATE = Gauge(
+    "mediflow_jamai_circuit_state",
+    "Circuit breaker state per Action Table (0 closed, 1 half-open, 2 open).",
+    ["table"],
+)
+JAMAI_BREAKER_TRANSITIONS = Counter(
+    "mediflow_jamai_circuit_transitions_total",
+    "Circuit breaker state changes per Action Table, by the state entered.",
+    ["table", "state"],
+)
+JAMAI_BREAKER_REJECTIONS = Counter(
+    "mediflow_jamai_circuit_rejections_total",
+    "Requests answered with a fallback because the table's circuit was open.",
+    ["table"],
+)
+ADMISSION_REJECTIONS = Counter(
+    "mediflow_admission_rejections_total",
+    "JamAI-bound requests rejected by admission control (reason: rate_limited, queue_full, queue_timeout).",
+    ["clinic_id", "reason"],
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "mediflow_admission_wait_seconds",
+    "Time JamAI-bound requests waited in their clinic's queue for a shared slot.",
+    ["clinic_id"],
+    buckets=LATENCY_BUCKETS,
+)
+ADMISSION_PRIORITY_WAIT_SECONDS = Histogram(
+    "mediflow_admission_priority_wait_seconds",
+    "Time JamAI-bound requests waited for a shared slot, by priority (emergency, booking, staff_lookup, faq).",
+    ["priority"],
+    buckets=LATENCY_BUCKETS,
+)
+
+# Per-request labels filled in by handlers (e.g. the resolved clinic); a dict so that
+# updates made deeper in the call stack are visible to the middleware
+_request_labels: ContextVar[Optional[Dict[str, str]]] = ContextVar("mediflow_request_labels", default=None)
+
+
+def tag_request_clinic(clinic_id: str):
+    """Attribute the current request to a clinic for the per-clinic latency histogram."""
+    labels = _request_labels.get()
+    if labels is not None:
+        labels["clinic_id"] = clinic_id
+
+
+class TableMetrics:
+    """Label-bound metric children for one Action Table, resolved once so recording is a plain method call."""
+
+    def __init__(self, table_id: str):
+        self.table_id = table_id
+        self.batch_seconds = JAMAI_CALL_SECONDS.labels(table_id, "batch")
+        self.stream_seconds = JAMAI_CALL_SECONDS.labels(table_id, "stream")
+        self.rows = JAMAI_ROWS.labels(table_id)
+        self.in_flight = JAMAI_IN_FLIGHT.labels(table_id)
+
+    def error(self, exc: BaseException):
+        JAMAI_ERRORS.labels(self.table_id, type(exc).__name__).inc()
+
+    def missing_column(self, column: str):
+        JAMAI_MISSING_COLUMNS.labels(self.table_id, column).inc()
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware timing every HTTP request, labelled by route template (not raw path,
+    so clinic ids in URLs do not explode cardinality). Streaming responses are timed until
+    the last chunk is sent.
+    """
+
+    def __init__(self, app, excluded_paths=("/metrics",)):
+        self.app = app
+        self.excluded_paths = set(excluded_paths)
+        # Label-bound children by label values; skips prometheus_client's locked labels() lookup
+        self._request_children: Dict[tuple, object] = {}
+        self._clinic_children: Dict[tuple, object] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+
+        labels: Dict[str, str] = {}
+        token = _request_labels.set(labels)
+        status = "500"  # Reported if the app raises before sending a response
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec()
+            _request_labels.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            key = (route_path, scope["method"], status)
+            child = self._request_children.get(key)
+            if child is None:
+                child = self._request_children[key] = HTTP_REQUEST_SECONDS.labels(*key)
+            child.observe(elapsed)
+
+            clinic_id = labels.get("clinic_id")
+            if clinic_id:
+                key = (route_path, clinic_id)
+                child = self._clinic_children.get(key)
+                if child is None:
+                    child = self._clinic_children[key] = CLINIC_REQUEST_SECONDS.labels(*key)
+                child.observe(elapsed)
+
+
+def render_metrics():
+    """Current metrics in the Prometheus text exposition format, with its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,367 @@
+# Per-request tracing: Server-Timing header plus optional OTLP/JSON trace export
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import functools
+import json
+import logging
+import queue
+import random
+import re
+import threading
+import time
+
+import httpx
+from fastapi.routing import APIRoute
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("mediflow_trace", default=None)
+_current_span_id: ContextVar[Optional[str]] = ContextVar("mediflow_span_id", default=None)
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+MAX_SERVER_TIMING_SPANS = 32  # Keeps the header small when a request makes many calls
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Trace:
+    """Spans recorded for one request. Timestamps are perf_counter_ns, anchored to wall time at start."""
+
+    def __init__(self, name: str, sampled: bool, trace_id: str = None, parent_span_id: str = None):
+        self.name = name
+        self.sampled = sampled
+        # Ids only matter for export; unsampled traces just feed the Server-Timing header
+        self.trace_id = trace_id or (_new_id(128) if sampled else None)
+        self.root_span_id = _new_id(64) if sampled else None
+        self.parent_span_id = parent_span_id
+        self.start_unix_ns = time.time_ns()
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns = None
+        self.attributes: Dict[str, object] = {}
+        # (name, span_id, parent_span_id, start_ns, end_ns, attributes)
+        self.spans: List[Tuple[str, str, str, int, int, Dict[str, object]]] = []
+        # Set by TracedRoute to split parsing / endpoint / serialization
+        self.route_started_ns = None
+        self.endpoint_finished_ns = None
+
+    def add_span(self, name: str, start_ns: int, end_ns: int, attributes: Dict[str, object] = None,
+                 span_id: str = None, parent_span_id: str = None):
+        if self.sampled:
+            span_id = span_id or _new_id(64)
+            parent_span_id = parent_span_id or self.root_span_id
+        self.spans.append((name, span_id, parent_span_id, start_ns, end_ns, attributes or {}))
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, e.g. 'parse;dur=0.4, jamai;dur=812.3;desc="SOP QnA", total;dur=815.0'."""
+        parts = []
+        for name, _, _, start_ns, end_ns, attributes in self.spans[:MAX_SERVER_TIMING_SPANS]:
+            entry = f"{name};dur={(end_ns - start_ns) / 1e6:.1f}"
+            desc = attributes.get("desc")
+            if desc:
+                entry += f';desc="{str(desc).replace(chr(34), "")}"'
+            parts.append(entry)
+        parts.append(f"total;dur={(time.perf_counter_ns() - self.start_ns) / 1e6:.1f}")
+        return ", ".join(parts)
+
+
+class _Span:
+    __slots__ = ("trace", "name", "attributes", "span_id", "parent_span_id", "start_ns", "_token")
+
+    def __init__(self, trace: Trace, name: str, attributes: Dict[str, object]):
+        self.trace = trace
+        self.name = name
+        self.attributes = attributes
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.span_id = self.parent_span_id = self._token = None
+        if self.trace.sampled:
+            # Parent/child links are only needed in exported traces
+            self.span_id = _new_id(64)
+            self.parent_span_id = _current_span_id.get()
+            self._token = _current_span_id.set(self.span_id)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end_ns = time.perf_counter_ns()
+        if self._token is not None:
+            try:
+                _current_span_id.reset(self._token)
+            except ValueError:
+                # Generator closed from another context (e.g. a disconnected stream); nothing to restore
+                pass
+        if exc_type is not None and exc_type is not GeneratorExit:
+            self.attributes["error"] = exc_type.__name__
+        self.trace.add_span(self.name, self.start_ns, end_ns, self.attributes, self.span_id, self.parent_span_id)
+        return False
+
+
+class _NullSpan:
+    """Returned when the request is not traced, so instrumented code costs one ContextVar lookup."""
+
+    def set(self, key: str, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, **attributes):
+    """
+    Time a block as a child span of the current request:
+        with span("jamai", desc=table_id):
+            ...
+    `desc` is shown in the Server-Timing header; every attribute goes to exported traces.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NULL_SPAN
+    return _Span(trace, name, attributes)
+
+
+class TracedRoute(APIRoute):
+    """
+    APIRoute that splits each request into `parse` (body reading and validation),
+    the endpoint itself and `serialize` (response model validation and JSON encoding).
+    """
+
+    def get_route_handler(self):
+        endpoint = self.dependant.call
+        if asyncio.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def traced_endpoint(**values):
+                trace = _current_trace.get()
+                if trace is None:
+                    return await endpoint(**values)
+                entered_ns = time.perf_counter_ns()
+                if trace.route_started_ns is not None:
+                    trace.add_span("parse", trace.route_started_ns, entered_ns)
+                try:
+                    return await endpoint(**values)
+                finally:
+                    trace.endpoint_finished_ns = time.perf_counter_ns()
+
+            self.dependant.call = traced_endpoint
+
+        handler = super().get_route_handler()
+
+        async def traced_handler(request):
+            trace = _current_trace.get()
+            if trace is None:
+                return await handler(request)
+            trace.route_started_ns = time.perf_counter_ns()
+            response = await handler(request)
+            if trace.endpoint_finished_ns is not None:
+                trace.add_span("serialize", trace.endpoint_finished_ns, time.perf_counter_ns())
+            return response
+
+        return traced_handler
+
+
+class OTLPExporter:
+    """
+    Exports finished traces as OTLP/JSON from a background thread, so requests never wait on I/O.
+    Writes one ExportTraceServiceRequest per line to `file_path` (readable by the OpenTelemetry
+    Collector's otlpjsonfile receiver) and/or POSTs batches to `endpoint`/v1/traces.
+    Traces are dropped, not queued without bound, when the exporter falls behind.
+    """
+
+    def __init__(self, file_path: str = "", endpoint: str = "", service_name: str = "mediflow-backend",
+                 max_queue: int = 2048, batch_size: int = 64, flush_seconds: float = 2.0):
+        self.file_path = file_path
+        self.endpoint = endpoint.rstrip("/")
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._queue: "queue.Queue[Trace]" = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self.exported = 0
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.file_path or self.endpoint)
+
+    def export(self, trace: Trace):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        client = httpx.Client(timeout=5.0) if self.endpoint else None
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            try:
+                self._write(client, self.to_otlp(batch))
+                self.exported += len(batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                logger.warning(f"Trace export failed, dropped {len(batch)} traces: {str(e)}")
+
+    def _write(self, client: Optional[httpx.Client], payload: dict):
+        if self.file_path:
+            with open(self.file_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(payload, separators=(",", ":")) + "\n")
+        if client is not None:
+            client.post(f"{self.endpoint}/v1/traces", json=payload).raise_for_status()
+
+    def to_otlp(self, traces: List[Trace]) -> dict:
+        spans = []
+        for trace in traces:
+            def unix_ns(perf_ns: int) -> str:
+                return str(trace.start_unix_ns + perf_ns - trace.start_ns)
+
+            status_code = trace.attributes.get("http.status_code", 0)
+            root = {
+                "traceId": trace.trace_id,
+                "spanId": trace.root_span_id,
+                "name": trace.name,
+                "kind": 2,  # SERVER
+                "startTimeUnixNano": unix_ns(trace.start_ns),
+                "endTimeUnixNano": unix_ns(trace.end_ns or trace.start_ns),
+                "attributes": _otlp_attributes(trace.attributes),
+                "status": {"code": 2 if isinstance(status_code, int) and status_code >= 500 else 1},
+            }
+            if trace.parent_span_id:
+                root["parentSpanId"] = trace.parent_span_id
+            spans.append(root)
+            for name, span_id, parent_span_id, start_ns, end_ns, attributes in trace.spans:
+                child = {
+                    "traceId": trace.trace_id,
+                    "spanId": span_id,
+                    "parentSpanId": parent_span_id,
+                    "name": name,
+                    "kind": 3 if name == "jamai" else 1,  # CLIENT for outbound JamAI calls, else INTERNAL
+                    "startTimeUnixNano": unix_ns(start_ns),
+                    "endTimeUnixNano": unix_ns(end_ns),
+                    "attributes": _otlp_attributes(attributes),
+                }
+                if "error" in attributes:
+                    child["status"] = {"code": 2, "message": str(attributes["error"])}
+                spans.append(child)
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": self.service_name})},
+                "scopeSpans": [{"scope": {"name": "app.core.tracing"}, "spans": spans}],
+            }]
+        }
+
+    def stats(self) -> Dict[str, int]:
+        return {"exported": self.exported, "dropped": self.dropped, "queued": self._queue.qsize()}
+
+
+def _otlp_attributes(attributes: Dict[str, object]) -> List[dict]:
+    encoded = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            encoded.append({"key": key, "value": {"boolValue": value}})
+        elif isinstance(value, int):
+            encoded.append({"key": key, "value": {"intValue": str(value)}})
+        elif isinstance(value, float):
+            encoded.append({"key": key, "value": {"doubleValue": value}})
+        else:
+            encoded.append({"key": key, "value": {"stringValue": str(value)}})
+    return encoded
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware that opens a Trace per request, adds a Server-Timing header with the
+    spans recorded before the response starts, and hands sampled traces to the exporter.
+    Sampling follows an incoming W3C traceparent header when present, else `sample_rate`.
+    Streaming responses send headers first, so their later spans only appear in exported traces.
+    """
+
+    def __init__(self, app, exporter: OTLPExporter, sample_rate: float = 0.0, server_timing: bool = True,
+                 excluded_paths=("/metrics",)):
+        self.app = app
+        self.exporter = exporter
+        self.sample_rate = sample_rate if exporter.enabled else 0.0
+        self.server_timing = server_timing
+        self.excluded_paths = set(excluded_paths)
+
+    def _sampling(self, scope) -> Tuple[bool, Optional[str], Optional[str]]:
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                match = _TRACEPARENT.match(value.decode("latin-1").strip().lower())
+                if match:
+                    sampled = self.exporter.enabled and int(match.group(3), 16) & 1 == 1
+                    return sampled, match.group(1), match.group(2)
+                break
+        return self.sample_rate > 0 and random.random() < self.sample_rate, None, None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+
+        sampled, trace_id, parent_span_id = self._sampling(scope)
+        if not sampled and not self.server_timing:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(f"{scope['method']} {scope['path']}", sampled, trace_id, parent_span_id)
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span_id.set(trace.root_span_id) if sampled else None
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    message = dict(message)
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", trace.server_timing().encode("latin-1")),
+                        (b"timing-allow-origin", b"*"),
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            trace.end_ns = time.perf_counter_ns()
+            if span_token is not None:
+                _current_span_id.reset(span_token)
+            _current_trace.reset(trace_token)
+            if sampled:
+                route = scope.get("route")
+                if route is not None:
+                    trace.name = f"{scope['method']} {route.path}"
+                trace.attributes.update({
+                    "http.method": scope["method"],
+                    "http.route": getattr(route, "path", ""),
+                    "url.path": scope["path"],
+                    "http.status_code": status,
+                })
+                self.exporter.export(trace)
+
+
+trace_exporter = OTLPExporter(
+    file_path=settings.TRACE_EXPORT_FILE,
+    endpoint=settings.TRACE_EXPORT_ENDPOINT,
+)
@@ -1,17 +1,37 @@
 # Entry point (FastAPI app initialization)
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
 # Import the routers we planned
 # Note: Ensure you have created the files in app/api/v1/ as discussed previously
 from app.api.v1 import patients, staff, clinics
+from app.core.compression import CompressionMiddleware
 from app.core.config import settings
+from app.core.metrics import MetricsMiddleware, render_metrics
+from app.core.tracing import TracingMiddleware, trace_exporter
+from app.services.clinic_registry import clinic_registry
+from app.services.faq_warmup import faq_warmer
+from app.services.jobs import job_manager
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Precompute starter FAQ answers in the background (startup + schedule)
+    faq_warmer.start()
+    yield
+    await faq_warmer.stop()
+    # Let queued/running jobs finish (bounded), then close the webhook client
+    await job_manager.close()
 
 app = FastAPI(
     title="MediFlow AI Backend",
     description="Multilingual AI Nurse API for JamAI Base Hackathon",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson instead of the stdlib json encoder for every route that returns plain data
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # --- CORS CONFIGURATION ---
@@ -25,6 +45,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- COMPRESSION ---
+# brotli/gzip for JSON and text bodies of COMPRESSION_MIN_SIZE bytes or more (never for SSE)
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY
+    )
+
+# --- TRACING ---
+# Server-Timing header on every response; sampled OTLP traces when an export target is configured
+if settings.SERVER_TIMING_ENABLED or trace_exporter.enabled:
+    app.add_middleware(
+        TracingMiddleware,
+        exporter=trace_exporter,
+        sample_rate=settings.TRACE_SAMPLE_RATE,
+        server_timing=settings.SERVER_TIMING_ENABLED
+    )
+
+# --- METRICS ---
+# Request latency per route and clinic, plus JamAI Action Table metrics, scraped from /metrics
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        body, content_type = render_metrics()
+        return Response(content=body, headers={"Content-Type": content_type})
+
 # --- REGISTER ROUTERS ---
 # 1. Patient Routes (Public: FAQs, Triage, SOPs)
 app.include_router(
@@ -64,7 +114,7 @@ async def health_check():
             "Medication Quick Lookup (Staff Only)",
             "Multilingual Support"
         ],
-        "configured_clinics": settings.get_all_clinic_ids(),
+        "configured_clinics": clinic_registry.clinic_ids(),
         "version": "2.0.0"
     }
 
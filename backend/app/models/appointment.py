@@ -0,0 +1,42 @@
+# Schemas for structured Appointment Booking responses
+from pydantic import BaseModel, ConfigDict
+from typing import Any, Dict, List, Literal, Optional
+
+APPOINTMENT_SCHEMA_VERSION = 2
+
+class TimeSlot(BaseModel):
+    # LLM output may carry extra keys (e.g. "clinic"); keep them rather than fail
+    model_config = ConfigDict(extra="allow")
+
+    date: str  # YYYY-MM-DD
+    time: str  # HH:MM
+    doctor: Optional[str] = None
+
+class CaseType(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    case_type: str = "ROUTINE"  # EMERGENCY, URGENT or ROUTINE
+    booking_needed: bool = True
+    response_template: str = ""
+
+class RecommendedTime(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    slot_found: bool = False
+    display_date: Optional[str] = None
+    display_time: Optional[str] = None
+    doctor: Optional[str] = None
+
+class AppointmentResponse(BaseModel):
+    """
+    Appointment Booking output with every Action Table column decoded into real objects.
+    Columns the LLM returned as malformed JSON fall back to defaults and are listed in parse_errors.
+    """
+    schema_version: Literal[2] = APPOINTMENT_SCHEMA_VERSION
+    clinic_name: str
+    available_time_slots: List[TimeSlot] = []
+    case_type: CaseType
+    recommended_time: RecommendedTime
+    refined_user_message: str
+    booking_record: Dict[str, Any] = {}
+    parse_errors: List[str] = []
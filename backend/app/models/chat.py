@@ -1,7 +1,7 @@
 # Schemas for Chat/FAQ 
 from pydantic import BaseModel
 from typing import Optional
-from typing import Optional
+from typing import List, Optional
 
 class ChatRequest(BaseModel):
     clinic_id: str  # Required clinic identifier
@@ -11,4 +11,22 @@ class ChatRequest(BaseModel):
 
 class ChatResponse(BaseModel):
     reply: str
-    source_document: Optional[str] = None  # To show which PDF the answer came from
\ No newline at end of file
+    source_document: Optional[str] = None  # To show which PDF the answer came from
+
+class ChatBatchRequest(BaseModel):
+    clinic_id: str
+    clinic_name: Optional[str] = None
+    questions: List[str]  # e.g. the suggested questions on the FAQ tab
+    language: str = "BM"
+    stream: bool = False  # Server-Sent Events, one `result` event per question as it is answered
+
+class ChatBatchItem(BaseModel):
+    index: int  # Position in `questions`
+    question: str
+    reply: str
+    source_document: Optional[str] = None
+    cached: bool = False
+    error: Optional[str] = None  # Set when this question failed; `reply` then holds the fallback message
+
+class ChatBatchResponse(BaseModel):
+    results: List[ChatBatchItem]
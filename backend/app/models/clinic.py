@@ -1,9 +1,21 @@
 # Clinic management models
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict
+from typing import Dict, Optional, List
 from datetime import datetime
 
+class ClinicCapacity(BaseModel):
+    """Per-clinic share of JamAI capacity; unset fields fall back to the ADMISSION_* settings."""
+    model_config = ConfigDict(frozen=True)
+
+    weight: Optional[float] = None  # Relative share when clinics compete for JamAI slots
+    rate_per_second: Optional[float] = None  # Sustained JamAI-bound requests per second (0 = unlimited)
+    burst: Optional[int] = None
+    max_queue: Optional[int] = None  # Requests allowed to wait for a slot before 503s
+
 class Clinic(BaseModel):
+    # Registry entries are shared across requests, so they must not be mutated
+    model_config = ConfigDict(frozen=True)
+
     clinic_id: str
     name: str
     address: str
@@ -13,6 +25,13 @@ class Clinic(BaseModel):
     languages_supported: List[str] = ["BM", "EN"]
     services: List[str] = []
     is_active: bool = True
+    aliases: List[str] = []  # Legacy ids that resolve to this clinic
+    capacity: Optional[ClinicCapacity] = None  # Admission control overrides (not exposed publicly)
+    faq_questions: Dict[str, List[str]] = {}  # Starter questions to precompute, by language (e.g. {"EN": [...]})
+
+    def public_dump(self) -> dict:
+        """Only the ClinicResponse fields, so registry-internal settings never reach patients."""
+        return self.model_dump(include=set(ClinicResponse.model_fields))
     
 class ClinicResponse(BaseModel):
     clinic_id: str
@@ -0,0 +1,31 @@
+# Schemas for asynchronous appointment booking / triage jobs
+from pydantic import BaseModel
+from typing import Any, Dict, Literal, Optional
+from app.models.chat import ChatRequest
+from app.models.triage import TriageRequest
+
+class AppointmentJobRequest(ChatRequest):
+    webhook_url: Optional[str] = None  # POSTed the finished job (same body as GET /jobs/{job_id})
+
+class TriageJobRequest(TriageRequest):
+    webhook_url: Optional[str] = None
+
+class JobError(BaseModel):
+    status_code: int
+    detail: Any
+
+class JobWebhook(BaseModel):
+    status: Optional[str] = None  # pending, delivered, failed
+    attempts: int = 0
+
+class JobStatus(BaseModel):
+    job_id: str
+    kind: str  # appointment or triage
+    clinic_id: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    created_at: float  # Unix timestamps
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None  # AppointmentResponse (appointment) or the /triage body (triage)
+    error: Optional[JobError] = None
+    webhook: Optional[JobWebhook] = None
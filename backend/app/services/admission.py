@@ -0,0 +1,424 @@
+# Admission control for shared JamAI capacity: per-clinic token buckets, priority tiers and weighted fair queuing
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Deque, Dict, List
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import time
+import logging
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.metrics import ADMISSION_PRIORITY_WAIT_SECONDS, ADMISSION_REJECTIONS, ADMISSION_WAIT_SECONDS
+from app.services.clinic_registry import clinic_name_key, clinic_registry
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_CLINIC = "unknown"
+# Unregistered clinic names each get their own bucket ("unknown:<name>"); idle ones are dropped past this
+MAX_UNKNOWN_CLINICS = 256
+
+# Outbound JamAI work by urgency; lower value is served first
+PRIORITY_EMERGENCY = 0  # Triage flagged is_emergency
+PRIORITY_BOOKING = 1  # Appointment booking / triage
+PRIORITY_STAFF = 2  # Staff medication lookups
+PRIORITY_FAQ = 3  # FAQ / SOP chat
+PRIORITY_NAMES = ("emergency", "booking", "staff_lookup", "faq")
+
+
+class AdmissionRejected(HTTPException):
+    """429 when a clinic is over its rate, 503 when JamAI capacity is saturated; both carry Retry-After."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(status_code=status_code, detail=detail, headers={"Retry-After": str(self.retry_after)})
+
+
+@dataclass(frozen=True)
+class ClinicLimits:
+    weight: float
+    rate_per_second: float
+    burst: float
+    max_queue: int
+
+
+def parse_clinic_limits(raw: str) -> Dict[str, dict]:
+    """ADMISSION_CLINIC_LIMITS: JSON object of clinic_id -> {weight, rate_per_second, burst, max_queue}."""
+    if not raw:
+        return {}
+    try:
+        limits = json.loads(raw)
+        if not isinstance(limits, dict):
+            raise ValueError("expected a JSON object keyed by clinic_id")
+        return {clinic_id: dict(values) for clinic_id, values in limits.items()}
+    except (ValueError, TypeError) as e:
+        logger.error(f"Ignoring invalid ADMISSION_CLINIC_LIMITS: {str(e)}")
+        return {}
+
+
+class _TokenBucket:
+    def __init__(self, rate_per_second: float, burst: float):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.tokens = burst
+        self.refilled_at = time.monotonic()
+
+    def resize(self, rate_per_second: float, burst: float):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.tokens = min(self.tokens, burst)
+
+    def take(self, now: float) -> float:
+        """Spend one token; returns 0 on success, else the seconds until a token is available."""
+        rate = self.rate_per_second
+        if rate <= 0:
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * rate)
+        self.refilled_at = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / rate
+
+
+class _ClinicState:
+    def __init__(self, clinic_id: str, limits: ClinicLimits, emergency: ClinicLimits):
+        self.clinic_id = clinic_id
+        self.limits = limits
+        self.bucket = _TokenBucket(limits.rate_per_second, limits.burst)
+        # Emergencies draw on their own bucket and queue bound, so FAQ traffic cannot crowd them out
+        self.emergency_bucket = _TokenBucket(emergency.rate_per_second, emergency.burst)
+        self.last_tags = [0.0] * len(PRIORITY_NAMES)  # WFQ finish tag per priority tier
+        self.queued = 0
+        self.emergency_queued = 0
+        self.in_flight = 0
+        self.admitted = 0
+        self.waited = 0.0
+        self.rejected = {"rate_limited": 0, "queue_full": 0, "queue_timeout": 0}
+        # Unregistered names share one metric label so arbitrary input cannot create new series
+        self.metric_label = UNKNOWN_CLINIC if clinic_id.startswith(f"{UNKNOWN_CLINIC}:") else clinic_id
+        self.wait_seconds = ADMISSION_WAIT_SECONDS.labels(self.metric_label)
+
+    def set_limits(self, limits: ClinicLimits):
+        self.limits = limits
+        self.bucket.resize(limits.rate_per_second, limits.burst)
+
+    def queued_at(self, priority: int) -> int:
+        return self.emergency_queued if priority == PRIORITY_EMERGENCY else self.queued - self.emergency_queued
+
+
+class _Waiter:
+    __slots__ = ("state", "priority", "enqueued_at", "future")
+
+    def __init__(self, state: _ClinicState, priority: int, enqueued_at: float, future: asyncio.Future):
+        self.state = state
+        self.priority = priority
+        self.enqueued_at = enqueued_at
+        self.future = future
+
+
+class _Tier:
+    """Waiters of one priority: a WFQ heap across clinics plus arrival order for the aging check."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.heap: List[tuple] = []  # (finish tag, seq, waiter)
+        self.arrivals: Deque[_Waiter] = deque()
+        self.virtual_time = 0.0
+        self.queued = 0
+        self.admitted = 0
+        self.promoted = 0
+        self.waited = 0.0
+        self.wait_seconds = ADMISSION_PRIORITY_WAIT_SECONDS.labels(name)
+
+    def oldest(self):
+        # Entries already granted or abandoned are dropped lazily from both structures
+        while self.arrivals and self.arrivals[0].future.done():
+            self.arrivals.popleft()
+        return self.arrivals[0] if self.arrivals else None
+
+    def pop_fair(self):
+        while self.heap:
+            tag, _, waiter = heapq.heappop(self.heap)
+            if not waiter.future.done():
+                self.virtual_time = tag
+                return waiter
+        return None
+
+
+class AdmissionController:
+    """
+    Gatekeeper and scheduler for JamAI-bound work, shared by all clinics on one API key.
+    - Each clinic has a token bucket (rate_per_second, burst); an empty bucket is a 429.
+      Emergency triage uses a separate, generous bucket and queue bound (`emergency` limits;
+      its weight is unused), so it is never refused because of a clinic's other traffic, but a
+      client flagging everything as an emergency still cannot take unbounded capacity.
+    - At most `max_concurrent` requests hold a slot. Waiting work is served by priority
+      (emergency, booking, staff lookup, FAQ) and, within a priority, by weighted fair
+      queuing across clinics, so a busy clinic cannot starve the others.
+    - A waiting tier is promoted one priority per `aging_seconds` (up to booking), so staff
+      lookups and FAQ traffic still move while bookings are heavy.
+    - A full clinic queue or a wait over `max_wait_seconds` is a 503.
+    Limits come from ADMISSION_CLINIC_LIMITS, then the registry's "capacity", then defaults.
+    Runs on the event loop only, so no locking is needed.
+    """
+
+    def __init__(self, max_concurrent: int, max_wait_seconds: float, defaults: ClinicLimits,
+                 overrides: Dict[str, dict] = None, aging_seconds: float = 2.0, enabled: bool = True,
+                 emergency: ClinicLimits = None):
+        self.enabled = enabled
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_wait_seconds = max_wait_seconds
+        self.aging_seconds = aging_seconds
+        self.defaults = defaults
+        self.overrides = overrides or {}
+        self.emergency = emergency or defaults
+        self.in_use = 0
+        self.waiting = 0
+        self._clinics: Dict[str, _ClinicState] = {}
+        self._tiers = [_Tier(name) for name in PRIORITY_NAMES]
+        self._seq = itertools.count()
+        self._avg_hold_seconds = 1.0  # EWMA of slot hold time, for Retry-After estimates
+
+    def limits_for(self, clinic_id: str) -> ClinicLimits:
+        values = {}
+        clinic = clinic_registry.get(clinic_id)
+        if clinic is not None and clinic.capacity is not None:
+            values.update(clinic.capacity.model_dump(exclude_none=True))
+        values.update(self.overrides.get(clinic_id, {}))
+        return ClinicLimits(
+            weight=max(0.01, float(values.get("weight", self.defaults.weight))),
+            rate_per_second=float(values.get("rate_per_second", self.defaults.rate_per_second)),
+            burst=max(1.0, float(values.get("burst", self.defaults.burst))),
+            max_queue=int(values.get("max_queue", self.defaults.max_queue)),
+        )
+
+    def _state(self, clinic_id: str) -> _ClinicState:
+        # Limits are re-resolved per request so registry hot reloads apply without a restart
+        limits = self.limits_for(clinic_id)
+        state = self._clinics.get(clinic_id)
+        if state is None:
+            if clinic_id.startswith(f"{UNKNOWN_CLINIC}:"):
+                self._drop_idle_unknown()
+            state = self._clinics[clinic_id] = _ClinicState(clinic_id, limits, self.emergency)
+        elif state.limits != limits:
+            state.set_limits(limits)
+        return state
+
+    def _drop_idle_unknown(self):
+        unknown = [s for s in self._clinics.values() if s.clinic_id.startswith(f"{UNKNOWN_CLINIC}:")]
+        if len(unknown) < MAX_UNKNOWN_CLINICS:
+            return
+        for state in unknown:
+            if state.queued == 0 and state.in_flight == 0:
+                del self._clinics[state.clinic_id]
+
+    def _reject(self, state: _ClinicState, reason: str, status_code: int, detail: str, retry_after: float):
+        state.rejected[reason] += 1
+        ADMISSION_REJECTIONS.labels(state.metric_label, reason).inc()
+        raise AdmissionRejected(status_code, detail, retry_after)
+
+    def _retry_estimate(self) -> float:
+        """Rough time until the current backlog drains."""
+        return self._avg_hold_seconds * (self.waiting / self.max_concurrent + 1)
+
+    def _next_waiter(self, now: float):
+        # Starvation guard: a tier moves up one priority per `aging_seconds` its oldest waiter
+        # has waited (never above booking, so emergencies are always first); equal priorities
+        # go to the tier that has waited longest
+        best = None
+        for index, tier in enumerate(self._tiers):
+            oldest = tier.oldest()
+            if oldest is None:
+                continue
+            effective = index
+            if index > PRIORITY_BOOKING and self.aging_seconds > 0:
+                effective = max(PRIORITY_BOOKING, index - int((now - oldest.enqueued_at) / self.aging_seconds))
+            key = (effective, oldest.enqueued_at)
+            if best is None or key < best[0]:
+                best = (key, tier, effective < index)
+        if best is None:
+            return None
+        _, tier, aged = best
+        if aged:
+            tier.promoted += 1
+        # Within the chosen tier clinics still take turns by fair share
+        return tier.pop_fair()
+
+    def _dispatch(self):
+        """Hand free slots to queued waiters."""
+        now = time.monotonic()
+        while self.waiting and self.in_use < self.max_concurrent:
+            waiter = self._next_waiter(now)
+            if waiter is None:
+                break
+            self.waiting -= 1
+            self._dequeued(waiter.state, waiter.priority)
+            self.in_use += 1
+            waiter.state.in_flight += 1
+            waiter.future.set_result(None)
+
+    def _dequeued(self, state: _ClinicState, priority: int):
+        state.queued -= 1
+        if priority == PRIORITY_EMERGENCY:
+            state.emergency_queued -= 1
+        self._tiers[priority].queued -= 1
+
+    def _admitted(self, state: _ClinicState, priority: int, waited: float):
+        tier = self._tiers[priority]
+        state.admitted += 1
+        state.waited += waited
+        state.wait_seconds.observe(waited)
+        tier.admitted += 1
+        tier.waited += waited
+        tier.wait_seconds.observe(waited)
+
+    async def acquire(self, clinic_id: str, priority: int = PRIORITY_FAQ) -> _ClinicState:
+        state = self._state(clinic_id)
+        now = time.monotonic()
+        emergency = priority == PRIORITY_EMERGENCY
+        wait = (state.emergency_bucket if emergency else state.bucket).take(now)
+        if wait:
+            self._reject(state, "rate_limited", 429,
+                         f"Clinic {clinic_id} is sending requests faster than its share of AI capacity", wait)
+
+        if self.in_use < self.max_concurrent and not self.waiting:
+            self.in_use += 1
+            state.in_flight += 1
+            self._admitted(state, priority, 0.0)
+            return state
+
+        max_queue = self.emergency.max_queue if emergency else state.limits.max_queue
+        if state.queued_at(priority) >= max_queue:
+            self._reject(state, "queue_full", 503,
+                         f"Too many requests from clinic {clinic_id} are waiting for AI capacity", self._retry_estimate())
+
+        # Weighted fair queuing within the tier: heavier clinics advance their finish tag more slowly
+        tier = self._tiers[priority]
+        tag = max(tier.virtual_time, state.last_tags[priority]) + 1.0 / state.limits.weight
+        state.last_tags[priority] = tag
+        waiter = _Waiter(state, priority, now, asyncio.get_running_loop().create_future())
+        heapq.heappush(tier.heap, (tag, next(self._seq), waiter))
+        tier.arrivals.append(waiter)
+        tier.queued += 1
+        state.queued += 1
+        if emergency:
+            state.emergency_queued += 1
+        self.waiting += 1
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.max_wait_seconds)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done():
+                # The slot was granted just as we gave up; hand it on
+                self.release(state, 0.0)
+            else:
+                waiter.future.cancel()
+                self._dequeued(state, priority)
+                self.waiting -= 1
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._reject(state, "queue_timeout", 503,
+                         f"Timed out waiting for AI capacity for clinic {clinic_id}", self._retry_estimate())
+
+        self._admitted(state, priority, time.monotonic() - now)
+        return state
+
+    def release(self, state: _ClinicState, held_seconds: float):
+        self.in_use -= 1
+        state.in_flight -= 1
+        if held_seconds:
+            self._avg_hold_seconds += 0.1 * (held_seconds - self._avg_hold_seconds)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def admit(self, clinic_id: str, priority: int = PRIORITY_FAQ):
+        """Hold one shared JamAI slot for `clinic_id` (raises AdmissionRejected when refused)."""
+        if not self.enabled:
+            yield
+            return
+        state = await self.acquire(clinic_id, priority)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(state, time.monotonic() - start)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "enabled": self.enabled,
+            "max_concurrent": self.max_concurrent,
+            "in_use": self.in_use,
+            "queued": self.waiting,
+            "aging_seconds": self.aging_seconds,
+            "emergency_limits": {
+                "rate_per_second": self.emergency.rate_per_second,
+                "burst": self.emergency.burst,
+                "max_queue": self.emergency.max_queue,
+            },
+            "avg_hold_seconds": round(self._avg_hold_seconds, 3),
+            "priorities": {
+                tier.name: {
+                    "queued": tier.queued,
+                    "admitted": tier.admitted,
+                    "promoted_by_aging": tier.promoted,
+                    "avg_wait_ms": round(tier.waited / tier.admitted * 1000, 1) if tier.admitted else 0.0,
+                }
+                for tier in self._tiers
+            },
+            "clinics": {
+                clinic_id: {
+                    "weight": state.limits.weight,
+                    "rate_per_second": state.limits.rate_per_second,
+                    "burst": state.limits.burst,
+                    "max_queue": state.limits.max_queue,
+                    "tokens": round(state.bucket.tokens, 2),
+                    "emergency_tokens": round(state.emergency_bucket.tokens, 2),
+                    "queued": state.queued,
+                    "in_flight": state.in_flight,
+                    "admitted": state.admitted,
+                    "avg_wait_ms": round(state.waited / state.admitted * 1000, 1) if state.admitted else 0.0,
+                    "rejected": dict(state.rejected),
+                }
+                for clinic_id, state in self._clinics.items()
+            },
+        }
+
+
+def clinic_id_for_name(clinic_name: str) -> str:
+    """
+    Registry clinic_id for a JamAI clinic_name. Unregistered names are keyed by their normalized
+    name, so one unregistered clinic cannot use up the rate and queue of every other one.
+    """
+    clinic = clinic_registry.get_by_name(clinic_name)
+    if clinic is not None:
+        return clinic.clinic_id
+    name = clinic_name_key(clinic_name or "")
+    return f"{UNKNOWN_CLINIC}:{name}" if name else UNKNOWN_CLINIC
+
+
+admission_controller = AdmissionController(
+    max_concurrent=settings.ADMISSION_MAX_CONCURRENT,
+    max_wait_seconds=settings.ADMISSION_MAX_WAIT_SECONDS,
+    defaults=ClinicLimits(
+        weight=settings.ADMISSION_WEIGHT,
+        rate_per_second=settings.ADMISSION_RATE_PER_SECOND,
+        burst=settings.ADMISSION_BURST,
+        max_queue=settings.ADMISSION_MAX_QUEUE,
+    ),
+    overrides=parse_clinic_limits(settings.ADMISSION_CLINIC_LIMITS),
+    aging_seconds=settings.PRIORITY_AGING_SECONDS,
+    enabled=settings.ADMISSION_ENABLED,
+    emergency=ClinicLimits(
+        weight=settings.ADMISSION_WEIGHT,
+        rate_per_second=settings.ADMISSION_EMERGENCY_RATE_PER_SECOND,
+        burst=settings.ADMISSION_EMERGENCY_BURST,
+        max_queue=settings.ADMISSION_EMERGENCY_MAX_QUEUE,
+    ),
+)
@@ -0,0 +1,124 @@
+# In-process answer cache for SOP QnA responses
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import re
+import time
+import logging
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, str, str]
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.,;:]+$")
+
+
+def normalize_query(text: str) -> str:
+    """
+    Normalize free text so trivially different phrasings share a key.
+    "Waktu operasi?" and "  waktu  OPERASI " both become "waktu operasi".
+    """
+    text = _WHITESPACE.sub(" ", text.casefold()).strip()
+    return _TRAILING_PUNCTUATION.sub("", text)
+
+
+class AnswerCache:
+    """
+    Size-bounded LRU cache with per-entry TTL, keyed on (clinic_name, question, language).
+    Entries can be dropped per clinic when that clinic's knowledge changes.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Dict[str, str]]]" = OrderedDict()
+        self._keys_by_clinic: Dict[str, set] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(clinic_name: str, question: str, language: str) -> CacheKey:
+        return (clinic_name.casefold().strip(), normalize_query(question), language.upper())
+
+    def get(self, clinic_name: str, question: str, language: str) -> Optional[Dict[str, str]]:
+        key = self.make_key(clinic_name, question, language)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(value)
+
+    def age(self, clinic_name: str, question: str, language: str) -> Optional[float]:
+        """Seconds since an entry was stored, or None if absent/expired. Does not count as a lookup."""
+        entry = self._entries.get(self.make_key(clinic_name, question, language))
+        if entry is None:
+            return None
+        remaining = entry[0] - time.monotonic()
+        return self.ttl_seconds - remaining if remaining > 0 else None
+
+    def set(self, clinic_name: str, question: str, language: str, value: Dict[str, str]):
+        if self.max_entries <= 0:
+            return
+        key = self.make_key(clinic_name, question, language)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, dict(value))
+        self._entries.move_to_end(key)
+        self._keys_by_clinic.setdefault(key[0], set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def invalidate_clinic(self, clinic_name: str) -> int:
+        """Drop every cached answer for one clinic. Returns the number of entries removed."""
+        keys = self._keys_by_clinic.pop(clinic_name.casefold().strip(), set())
+        for key in keys:
+            self._entries.pop(key, None)
+        if keys:
+            logger.info(f"Answer cache invalidated {len(keys)} entries for clinic {clinic_name}")
+        return len(keys)
+
+    def clear(self) -> int:
+        removed = len(self._entries)
+        self._entries.clear()
+        self._keys_by_clinic.clear()
+        return removed
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "clinics": len(self._keys_by_clinic),
+        }
+
+    def _remove(self, key: CacheKey):
+        self._entries.pop(key, None)
+        clinic_keys = self._keys_by_clinic.get(key[0])
+        if clinic_keys is not None:
+            clinic_keys.discard(key)
+            if not clinic_keys:
+                del self._keys_by_clinic[key[0]]
+
+
+sop_answer_cache = AnswerCache(
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+)
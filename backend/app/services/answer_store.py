@@ -0,0 +1,347 @@
+# Persistent answer store (SQLite, WAL) shared by every uvicorn worker and replica on the same disk
+from typing import Any, Dict, Optional, Tuple
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import zlib
+import logging
+
+import orjson
+
+from app.core.config import BACKEND_DIR, settings
+from app.services.answer_cache import AnswerCache
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE_SOP = "sop"
+NAMESPACE_MEDICATION = "medication"
+
+# Values shorter than this are stored uncompressed (zlib overhead outweighs the savings)
+COMPRESS_MIN_BYTES = 256
+# A hit refreshes last_access (the eviction order) at most this often, to keep reads mostly read-only
+TOUCH_INTERVAL_SECONDS = 60.0
+# The WAL file is truncated back to this size after checkpoints (it otherwise keeps its peak size)
+WAL_SIZE_LIMIT_BYTES = 4 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    clinic TEXT NOT NULL,
+    query TEXT NOT NULL,
+    language TEXT NOT NULL,
+    value BLOB NOT NULL,
+    compressed INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    UNIQUE (namespace, clinic, query, language)
+);
+CREATE INDEX IF NOT EXISTS answers_expires_at ON answers (expires_at);
+CREATE INDEX IF NOT EXISTS answers_last_access ON answers (last_access);
+CREATE INDEX IF NOT EXISTS answers_clinic ON answers (clinic, namespace);
+CREATE TABLE IF NOT EXISTS generations (
+    clinic TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+# generations row bumped by clear(); purge_clinic() bumps the clinic's own row
+ALL_CLINICS = "*"
+
+
+class AnswerStore:
+    """
+    Second answer tier behind the in-process caches, persisted in one SQLite file (WAL mode) so
+    every worker process and restart shares the same answers.
+    - Keys are (namespace, clinic, normalized query, language), normalized like AnswerCache.
+    - Values are orjson, zlib-compressed when larger than COMPRESS_MIN_BYTES.
+    - Entries expire after their TTL; every `sweep_every` writes, expired entries are deleted and the
+      least recently used ones are evicted while over `max_entries` or `max_bytes`.
+    - SQLite calls run in worker threads (one connection per thread), never on the event loop.
+      Store errors are logged and treated as misses: the store can never fail a request.
+    - purge_clinic() and clear() bump a generation row. revalidate() compares the rows at most every
+      `revalidate_seconds` and drops the changed clinics from an in-process cache, so a purge on one
+      worker reaches every worker's AnswerCache shortly after.
+    - acquire_lease() elects one worker for work that should not be repeated by every process.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int, max_bytes: int,
+                 sweep_every: int = 200, enabled: bool = True, revalidate_seconds: float = 2.0):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sweep_every = max(1, sweep_every)
+        self.enabled = enabled
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._writes_since_sweep = 0
+        self.revalidate_seconds = revalidate_seconds
+        self._revalidated_at = float("-inf")
+        # Nothing seen yet: the first revalidate() treats every existing generation as new
+        self._generations_seen: Dict[str, int] = {}
+
+        # Metrics (this process only)
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.writes = 0
+        self.evictions = 0
+        self.errors = 0
+
+    @staticmethod
+    def make_key(clinic_name: str, query: str, language: str) -> Tuple[str, str, str]:
+        return AnswerCache.make_key(clinic_name, query, language)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")  # WAL: durable across app crashes, not power loss
+        conn.execute(f"PRAGMA journal_size_limit={WAL_SIZE_LIMIT_BYTES}")
+        with self._schema_lock:
+            if not self._schema_ready:
+                # Only takes effect on a new file; lets sweeps return freed pages to the OS
+                conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.executescript(_SCHEMA)
+                self._schema_ready = True
+        self._local.conn = conn
+        return conn
+
+    async def _run(self, fn, *args, default=None):
+        if not self.enabled:
+            return default
+        try:
+            return await asyncio.to_thread(fn, *args)
+        except (sqlite3.Error, OSError, ValueError, zlib.error) as e:
+            self.errors += 1
+            logger.warning(f"Answer store error ({fn.__name__}): {str(e)}")
+            return default
+
+    # --- reads ---
+
+    async def get_entry(self, namespace: str, clinic_name: str, query: str,
+                        language: str = "") -> Optional[Tuple[Dict[str, Any], float]]:
+        """(value, stored_at Unix time) or None when absent or expired."""
+        entry = await self._run(self._get, namespace, self.make_key(clinic_name, query, language))
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    async def get(self, namespace: str, clinic_name: str, query: str, language: str = "") -> Optional[Dict[str, Any]]:
+        entry = await self.get_entry(namespace, clinic_name, query, language)
+        return entry[0] if entry is not None else None
+
+    def _get(self, namespace: str, key: Tuple[str, str, str]):
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT id, value, compressed, created_at, expires_at, last_access FROM answers "
+            "WHERE namespace = ? AND clinic = ? AND query = ? AND language = ?",
+            (namespace, *key)
+        ).fetchone()
+        if row is None:
+            return None
+        row_id, value, compressed, created_at, expires_at, last_access = row
+        now = time.time()
+        if expires_at <= now:
+            conn.execute("DELETE FROM answers WHERE id = ?", (row_id,))
+            self.expired += 1
+            return None
+        if now - last_access > TOUCH_INTERVAL_SECONDS:
+            conn.execute("UPDATE answers SET last_access = ? WHERE id = ?", (now, row_id))
+        return orjson.loads(zlib.decompress(value) if compressed else value), created_at
+
+    # --- writes ---
+
+    async def set(self, namespace: str, clinic_name: str, query: str, language: str, value: Dict[str, Any],
+                  ttl_seconds: Optional[float] = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if ttl <= 0:
+            return
+        await self._run(self._set, namespace, self.make_key(clinic_name, query, language), value, ttl)
+
+    def _set(self, namespace: str, key: Tuple[str, str, str], value: Dict[str, Any], ttl: float):
+        data = orjson.dumps(value)
+        compressed = 0
+        if len(data) >= COMPRESS_MIN_BYTES:
+            packed = zlib.compress(data, 6)
+            if len(packed) < len(data):
+                data, compressed = packed, 1
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT INTO answers (namespace, clinic, query, language, value, compressed, size, "
+            "created_at, expires_at, last_access) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (namespace, clinic, query, language) DO UPDATE SET value = excluded.value, "
+            "compressed = excluded.compressed, size = excluded.size, created_at = excluded.created_at, "
+            "expires_at = excluded.expires_at, last_access = excluded.last_access",
+            (namespace, *key, data, compressed, len(data), now, now + ttl, now)
+        )
+        self.writes += 1
+        self._writes_since_sweep += 1
+        if self._writes_since_sweep >= self.sweep_every:
+            self._writes_since_sweep = 0
+            self._sweep(conn)
+
+    def _sweep(self, conn: sqlite3.Connection):
+        """Delete expired entries, then evict least recently used ones down to the size caps."""
+        conn.execute("DELETE FROM answers WHERE expires_at <= ?", (time.time(),))
+        count, total_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM answers").fetchone()
+        excess_entries = max(0, count - self.max_entries)
+        excess_bytes = max(0, total_bytes - self.max_bytes)
+        if excess_entries or excess_bytes:
+            victims, freed = [], 0
+            for row_id, size in conn.execute("SELECT id, size FROM answers ORDER BY last_access"):
+                if len(victims) >= excess_entries and freed >= excess_bytes:
+                    break
+                victims.append((row_id,))
+                freed += size
+            conn.executemany("DELETE FROM answers WHERE id = ?", victims)
+            self.evictions += len(victims)
+            logger.info(f"Answer store evicted {len(victims)} entries ({freed} bytes)")
+        conn.execute("PRAGMA incremental_vacuum")
+
+    async def sweep(self):
+        await self._run(lambda: self._sweep(self._connect()))
+
+    def _delete(self, sql: str, args: tuple, clinic: str) -> int:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        with conn:  # commits (or rolls back) the delete and the generation bump together
+            removed = conn.execute(sql, args).rowcount
+            conn.execute(
+                "INSERT INTO generations (clinic, generation) VALUES (?, 1) "
+                "ON CONFLICT (clinic) DO UPDATE SET generation = generation + 1",
+                (clinic,)
+            )
+        return removed
+
+    async def purge_clinic(self, clinic_name: str, namespace: Optional[str] = None) -> int:
+        """Drop every stored answer for one clinic (optionally one namespace). Returns entries removed."""
+        clinic = self.make_key(clinic_name, "", "")[0]
+        if namespace:
+            sql, args = "DELETE FROM answers WHERE clinic = ? AND namespace = ?", (clinic, namespace)
+        else:
+            sql, args = "DELETE FROM answers WHERE clinic = ?", (clinic,)
+        removed = await self._run(self._delete, sql, args, clinic, default=0)
+        if removed:
+            logger.info(f"Answer store purged {removed} entries for clinic {clinic_name}")
+        return removed
+
+    async def clear(self, namespace: Optional[str] = None) -> int:
+        if namespace:
+            sql, args = "DELETE FROM answers WHERE namespace = ?", (namespace,)
+        else:
+            sql, args = "DELETE FROM answers", ()
+        return await self._run(self._delete, sql, args, ALL_CLINICS, default=0)
+
+    # --- cross-worker invalidation ---
+
+    def _generations(self) -> Dict[str, int]:
+        return dict(self._connect().execute("SELECT clinic, generation FROM generations"))
+
+    async def revalidate(self, cache: AnswerCache):
+        """Drop `cache` entries of clinics purged (by any worker) since the last check."""
+        now = time.monotonic()
+        if not self.enabled or now - self._revalidated_at < self.revalidate_seconds:
+            return
+        self._revalidated_at = now
+        generations = await self._run(self._generations)
+        if generations is None:
+            return
+        changed = [clinic for clinic, generation in generations.items()
+                   if self._generations_seen.get(clinic) != generation]
+        self._generations_seen = generations
+        if ALL_CLINICS in changed:
+            cache.clear()
+        else:
+            for clinic in changed:
+                cache.invalidate_clinic(clinic)
+
+    # --- cross-worker leases ---
+
+    def _acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        with conn:
+            now = time.time()
+            row = conn.execute("SELECT owner, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+            if row is not None and row[0] != owner and row[1] > now:
+                return False
+            conn.execute(
+                "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at",
+                (name, owner, now + ttl)
+            )
+        return True
+
+    async def acquire_lease(self, name: str, owner: str, ttl_seconds: float) -> bool:
+        """
+        Take or renew the named lease for `ttl_seconds`; False while another owner holds it.
+        Always True when the store is disabled or failing, since nothing is shared then.
+        """
+        return await self._run(self._acquire_lease, name, owner, ttl_seconds, default=True)
+
+    # --- stats ---
+
+    def _table_stats(self) -> Dict[str, Any]:
+        conn = self._connect()
+        namespaces = {
+            namespace: {"entries": count, "bytes": size}
+            for namespace, count, size in conn.execute(
+                "SELECT namespace, COUNT(*), COALESCE(SUM(size), 0) FROM answers GROUP BY namespace"
+            )
+        }
+        file_bytes = sum(
+            os.path.getsize(self.path + suffix)
+            for suffix in ("", "-wal") if os.path.exists(self.path + suffix)
+        )
+        return {"namespaces": namespaces, "file_bytes": file_bytes}
+
+    async def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        table = await self._run(self._table_stats, default={}) or {}
+        return {
+            "enabled": self.enabled,
+            "path": self.path,
+            "ttl_seconds": self.ttl_seconds,
+            "revalidate_seconds": self.revalidate_seconds,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            **table,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "errors": self.errors,
+        }
+
+
+answer_store = AnswerStore(
+    path=os.path.join(BACKEND_DIR, settings.ANSWER_STORE_PATH),
+    ttl_seconds=settings.ANSWER_STORE_TTL_SECONDS,
+    max_entries=settings.ANSWER_STORE_MAX_ENTRIES,
+    max_bytes=int(settings.ANSWER_STORE_MAX_MB * 1024 * 1024),
+    sweep_every=settings.ANSWER_STORE_SWEEP_EVERY,
+    enabled=settings.ANSWER_STORE_ENABLED,
+    revalidate_seconds=settings.ANSWER_STORE_REVALIDATE_SECONDS,
+)
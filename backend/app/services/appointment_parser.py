@@ -0,0 +1,124 @@
+# Decode Appointment Booking column outputs (JSON strings written by the LLM) into typed models
+from typing import Any, Dict, List
+import logging
+
+import orjson
+from pydantic import ValidationError
+
+from app.core.tracing import span
+from app.models.appointment import AppointmentResponse, CaseType, RecommendedTime, TimeSlot
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def loads_llm_json(text: str) -> Any:
+    """
+    Parse JSON written by an LLM. Tolerates markdown code fences and prose around the value.
+    Raises ValueError if no JSON value can be recovered.
+    """
+    if not text or not text.strip():
+        raise ValueError("empty column")
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        pass
+
+    candidate = text.strip()
+    if candidate.startswith("```"):
+        # ```json\n{...}\n```
+        candidate = candidate.split("\n", 1)[1] if "\n" in candidate else ""
+        candidate = candidate.rsplit("```", 1)[0]
+    # Outermost object or array, whichever starts first
+    starts = [i for i in (candidate.find("{"), candidate.find("[")) if i >= 0]
+    if starts:
+        start = min(starts)
+        end = candidate.rfind("}" if candidate[start] == "{" else "]")
+        if end > start:
+            candidate = candidate[start:end + 1]
+    try:
+        return orjson.loads(candidate)
+    except orjson.JSONDecodeError as e:
+        raise ValueError(str(e)) from None
+
+
+def _parse_column(name: str, text: str, errors: List[str]) -> Any:
+    try:
+        return loads_llm_json(text)
+    except ValueError as e:
+        logger.warning(f"Malformed JSON in appointment column '{name}': {str(e)}")
+        errors.append(name)
+        return _MISSING
+
+
+def _parse_slots(text: str, errors: List[str]) -> List[TimeSlot]:
+    raw = _parse_column("available_time_slots", text, errors)
+    if raw is _MISSING:
+        return []
+    if isinstance(raw, dict):
+        # Some prompts wrap the list, e.g. {"slots": [...]}
+        raw = next((value for value in raw.values() if isinstance(value, list)), [])
+    if not isinstance(raw, list):
+        errors.append("available_time_slots")
+        return []
+
+    slots = []
+    dropped = 0
+    for item in raw:
+        try:
+            slots.append(TimeSlot.model_validate(item))
+        except ValidationError:
+            dropped += 1
+    if dropped:
+        logger.warning(f"Dropped {dropped} invalid entries from available_time_slots")
+        errors.append("available_time_slots")
+    return slots
+
+
+def _parse_object(name: str, text: str, model, default, errors: List[str]):
+    raw = _parse_column(name, text, errors)
+    if raw is _MISSING:
+        return default
+    try:
+        return model.model_validate(raw)
+    except ValidationError as e:
+        logger.warning(f"Invalid '{name}' in appointment response: {e.error_count()} errors")
+        errors.append(name)
+        return default
+
+
+def parse_appointment(booking_result: Dict[str, str], clinic_name: str) -> AppointmentResponse:
+    """
+    Build the typed response from JamAIService.appointment_booking output.
+    Each column is parsed exactly once; malformed columns fall back to defaults.
+    """
+    errors: List[str] = []
+    refined_message = booking_result.get("refined_user_message", "") or "Appointment processed"
+    with span("json", desc="appointment_columns"):
+        slots = _parse_slots(booking_result.get("available_time_slots", "[]"), errors)
+        case_type = _parse_object(
+            "case_type", booking_result.get("case_type", "{}"), CaseType,
+            CaseType(response_template=refined_message), errors
+        )
+        if not case_type.response_template:
+            # Missing column or no template from the LLM: reply with the refined message instead of nothing
+            case_type.response_template = refined_message
+        recommended_time = _parse_object(
+            "recommended_time", booking_result.get("recommended_time", "{}"), RecommendedTime,
+            RecommendedTime(), errors
+        )
+        record = _parse_column("booking_record", booking_result.get("booking_record", "{}"), errors)
+        if record is not _MISSING and not isinstance(record, dict):
+            errors.append("booking_record")
+        booking_record = record if isinstance(record, dict) else {}
+
+    return AppointmentResponse(
+        clinic_name=clinic_name,
+        available_time_slots=slots,
+        case_type=case_type,
+        recommended_time=recommended_time,
+        refined_user_message=refined_message,
+        booking_record=booking_record,
+        parse_errors=list(dict.fromkeys(errors)),
+    )
@@ -0,0 +1,112 @@
+# Micro-batching of concurrent Action Table rows into multi-row add_table_rows calls
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# JamAI accepts at most 100 rows per add_table_rows request
+JAMAI_MAX_ROWS_PER_REQUEST = 100
+
+
+class RowBatcher:
+    """
+    Collects rows submitted concurrently for one Action Table and sends them as a single
+    multi-row request. A batch is flushed when `max_batch_size` rows are waiting or
+    `window_seconds` after its first row arrived, whichever comes first.
+
+    `send_batch(rows)` must return one result per input row, in the same order.
+    """
+
+    def __init__(
+        self,
+        table_id: str,
+        send_batch: Callable[[List[Dict[str, Any]]], Awaitable[List[Any]]],
+        max_batch_size: int,
+        window_seconds: float,
+    ):
+        self.table_id = table_id
+        self.send_batch = send_batch
+        self.max_batch_size = max(1, min(max_batch_size, JAMAI_MAX_ROWS_PER_REQUEST))
+        self.window_seconds = window_seconds
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future, float]] = []
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self._in_flight: set = set()
+
+        # Metrics
+        self.batches_sent = 0
+        self.rows_sent = 0
+        self.max_batch_seen = 0
+        self.batch_size_counts: Dict[int, int] = {}
+        self.total_queue_delay = 0.0
+        self.max_queue_delay = 0.0
+
+    async def submit(self, row: Dict[str, Any]) -> Any:
+        """Queue one row and wait for its result from the batched call."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((row, future, time.monotonic()))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_timer is None:
+            self._flush_timer = loop.call_later(self.window_seconds, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        task = asyncio.get_running_loop().create_task(self._send(batch))
+        # Keep a reference so the task is not garbage collected mid-flight
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, batch: List[Tuple[Dict[str, Any], asyncio.Future, float]]):
+        sent_at = time.monotonic()
+        self._record_batch(len(batch), [sent_at - queued_at for _, _, queued_at in batch])
+
+        try:
+            results = await self.send_batch([row for row, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        if len(results) != len(batch):
+            logger.warning(
+                f"Batch for table {self.table_id} sent {len(batch)} rows but got {len(results)} back."
+            )
+        for index, (_, future, _) in enumerate(batch):
+            if not future.done():
+                future.set_result(results[index] if index < len(results) else None)
+
+    def _record_batch(self, size: int, queue_delays: List[float]):
+        self.batches_sent += 1
+        self.rows_sent += size
+        self.max_batch_seen = max(self.max_batch_seen, size)
+        self.batch_size_counts[size] = self.batch_size_counts.get(size, 0) + 1
+        self.total_queue_delay += sum(queue_delays)
+        self.max_queue_delay = max(self.max_queue_delay, max(queue_delays))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "table_id": self.table_id,
+            "max_batch_size": self.max_batch_size,
+            "window_ms": round(self.window_seconds * 1000, 3),
+            "batches_sent": self.batches_sent,
+            "rows_sent": self.rows_sent,
+            "avg_batch_size": round(self.rows_sent / self.batches_sent, 3) if self.batches_sent else 0.0,
+            "max_batch_size_seen": self.max_batch_seen,
+            "batch_size_counts": dict(sorted(self.batch_size_counts.items())),
+            "avg_queue_delay_ms": round(self.total_queue_delay / self.rows_sent * 1000, 3) if self.rows_sent else 0.0,
+            "max_queue_delay_ms": round(self.max_queue_delay * 1000, 3),
+            "pending_rows": len(self._pending),
+        }
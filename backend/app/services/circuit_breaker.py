@@ -0,0 +1,137 @@
+# Circuit breakers for JamAI Action Tables: fail fast while a table is down, probe to recover
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+import time
+import logging
+
+from app.core.metrics import JAMAI_BREAKER_REJECTIONS, JAMAI_BREAKER_STATE, JAMAI_BREAKER_TRANSITIONS
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a table whose breaker is open."""
+
+
+class ActionTableTimeout(TimeoutError):
+    """A JamAI call did not finish within the table's deadline."""
+
+
+class CircuitBreaker:
+    """
+    Per-table breaker with the usual three states:
+    - closed: calls go through; `failure_threshold` consecutive failures open it.
+    - open: calls are rejected with CircuitOpenError for `recovery_seconds`.
+    - half_open: up to `half_open_probes` calls are let through; a success closes the
+      breaker, a failure opens it again for another `recovery_seconds`.
+    `is_failure` decides which errors count (default: all). Errors it rejects, such as a 400
+    for one bad request, say nothing about the table's health and are treated like `release`.
+    Runs on the event loop only, so no locking is needed.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_seconds: float = 30.0,
+                 half_open_probes: int = 1, history: int = 20,
+                 is_failure: Optional[Callable[[BaseException], bool]] = None):
+        self.name = name
+        self.is_failure = is_failure
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_seconds = recovery_seconds
+        self.half_open_probes = max(1, half_open_probes)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.rejected = 0
+        self.transitions: Deque[Dict[str, object]] = deque(maxlen=history)
+        self._state_gauge = JAMAI_BREAKER_STATE.labels(name)
+        self._state_gauge.set(_STATE_VALUES[CLOSED])
+        self._rejections = JAMAI_BREAKER_REJECTIONS.labels(name)
+
+    def check(self):
+        """Raise CircuitOpenError if a call would be rejected right now; used before queueing."""
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.recovery_seconds:
+                self._reject()
+            self._transition(HALF_OPEN, "recovery period elapsed")
+        if self.state == HALF_OPEN and self.probes_in_flight >= self.half_open_probes:
+            self._reject()
+
+    def before_call(self):
+        """
+        Admit one JamAI call or raise CircuitOpenError.
+        Every admitted call must end in record_success, record_failure or release.
+        """
+        self.check()
+        if self.state == HALF_OPEN:
+            self.probes_in_flight += 1
+
+    def release(self):
+        """An admitted call ended without an outcome (e.g. cancelled by a disconnecting client)."""
+        if self.state == HALF_OPEN:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        if self.state == HALF_OPEN:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+            self._transition(CLOSED, "probe succeeded")
+
+    def record_failure(self, error: BaseException):
+        if self.is_failure is not None and not self.is_failure(error):
+            self.release()
+            return
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+            self._open(f"probe failed: {type(error).__name__}")
+        elif self.state == CLOSED and self.consecutive_failures >= self.failure_threshold:
+            self._open(f"{self.consecutive_failures} consecutive failures, last {type(error).__name__}")
+
+    def reset(self):
+        """Force the breaker closed (staff override)."""
+        self.consecutive_failures = 0
+        self.probes_in_flight = 0
+        if self.state != CLOSED:
+            self._transition(CLOSED, "manual reset")
+
+    def _reject(self):
+        self.rejected += 1
+        self._rejections.inc()
+        raise CircuitOpenError(f"JamAI table '{self.name}' is unavailable (circuit {self.state})")
+
+    def _open(self, reason: str):
+        self.opened_at = time.monotonic()
+        self.probes_in_flight = 0
+        self._transition(OPEN, reason)
+
+    def _transition(self, state: str, reason: str):
+        previous, self.state = self.state, state
+        self._state_gauge.set(_STATE_VALUES[state])
+        JAMAI_BREAKER_TRANSITIONS.labels(self.name, state).inc()
+        self.transitions.append({"at": time.time(), "from": previous, "to": state, "reason": reason})
+        log = logger.warning if state == OPEN else logger.info
+        log(f"Circuit breaker for '{self.name}': {previous} -> {state} ({reason})")
+
+    def stats(self) -> Dict[str, object]:
+        retry_in = 0.0
+        if self.state == OPEN:
+            retry_in = max(0.0, self.recovery_seconds - (time.monotonic() - self.opened_at))
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "retry_in_seconds": round(retry_in, 1),
+            "rejected": self.rejected,
+            "transitions": list(self.transitions),
+        }
+
+
+def breaker_stats(breakers: Dict[str, CircuitBreaker]) -> Dict[str, Dict[str, object]]:
+    return {name: breaker.stats() for name, breaker in breakers.items()}
+
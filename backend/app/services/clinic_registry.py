@@ -0,0 +1,158 @@
+# Clinic registry: single source of truth for clinic ids, names and details
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import List, Mapping, Optional, Tuple
+import hashlib
+import json
+import os
+import time
+import logging
+
+from app.core.config import settings
+from app.core.metrics import tag_request_clinic
+from app.core.tracing import span
+from app.models.clinic import Clinic
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REGISTRY_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "clinics.json"
+)
+
+
+def clinic_name_key(name: str) -> str:
+    return " ".join(name.casefold().split())
+
+
+@dataclass(frozen=True)
+class ClinicSnapshot:
+    """
+    Immutable view of the registry at one version.
+    Lookups by id (including legacy aliases) and by name are O(1).
+    """
+    version: str
+    clinics: Tuple[Clinic, ...]
+    active_clinics: Tuple[Clinic, ...]
+    by_id: Mapping[str, Clinic]
+    by_name: Mapping[str, Clinic]
+
+    def get(self, clinic_id: str) -> Optional[Clinic]:
+        return self.by_id.get(clinic_id)
+
+    def get_by_name(self, name: str) -> Optional[Clinic]:
+        return self.by_name.get(clinic_name_key(name))
+
+
+def load_snapshot(path: str) -> ClinicSnapshot:
+    """Parse and index a clinics JSON file. Raises OSError or ValueError if it is unusable."""
+    with open(path, "rb") as f:
+        raw = f.read()
+
+    data = json.loads(raw)
+    clinics = tuple(Clinic.model_validate(entry) for entry in data.get("clinics", []))
+
+    by_id = {}
+    by_name = {}
+    for clinic in clinics:
+        for key in (clinic.clinic_id, *clinic.aliases):
+            if key in by_id:
+                raise ValueError(f"Duplicate clinic id or alias '{key}' in {path}")
+            by_id[key] = clinic
+        by_name.setdefault(clinic_name_key(clinic.name), clinic)
+
+    return ClinicSnapshot(
+        version=hashlib.sha256(raw).hexdigest()[:16],
+        clinics=clinics,
+        active_clinics=tuple(c for c in clinics if c.is_active),
+        by_id=MappingProxyType(by_id),
+        by_name=MappingProxyType(by_name),
+    )
+
+
+class ClinicRegistry:
+    """
+    Loads clinics once from a JSON file and swaps in a new snapshot when the file changes.
+    The file's mtime is checked at most every `reload_interval` seconds (0 disables hot reload).
+    """
+
+    def __init__(self, path: str, reload_interval: float = 5.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._snapshot = load_snapshot(path)
+        self._mtime = os.stat(path).st_mtime_ns
+        self._checked_at = time.monotonic()
+
+    @property
+    def snapshot(self) -> ClinicSnapshot:
+        if self.reload_interval > 0 and time.monotonic() - self._checked_at >= self.reload_interval:
+            self.reload_if_changed()
+        return self._snapshot
+
+    def reload_if_changed(self) -> bool:
+        self._checked_at = time.monotonic()
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            logger.warning(f"Clinic registry file unavailable, keeping version {self._snapshot.version}: {str(e)}")
+            return False
+        if mtime == self._mtime:
+            return False
+        return self.reload()
+
+    def reload(self) -> bool:
+        """Re-read the registry file. Returns True if the clinic data changed."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            snapshot = load_snapshot(self.path)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to reload clinic registry, keeping version {self._snapshot.version}: {str(e)}")
+            return False
+
+        changed = snapshot.version != self._snapshot.version
+        self._snapshot = snapshot
+        self._mtime = mtime
+        if changed:
+            logger.info(f"Clinic registry reloaded: version {snapshot.version}, {len(snapshot.clinics)} clinics")
+        return changed
+
+    def get(self, clinic_id: str) -> Optional[Clinic]:
+        return self.snapshot.get(clinic_id)
+
+    def get_by_name(self, name: str) -> Optional[Clinic]:
+        return self.snapshot.get_by_name(name)
+
+    def all_clinics(self) -> Tuple[Clinic, ...]:
+        return self.snapshot.clinics
+
+    def active_clinics(self) -> Tuple[Clinic, ...]:
+        return self.snapshot.active_clinics
+
+    def clinic_ids(self) -> List[str]:
+        return [c.clinic_id for c in self.snapshot.clinics]
+
+
+clinic_registry = ClinicRegistry(
+    path=settings.CLINIC_REGISTRY_PATH or DEFAULT_REGISTRY_PATH,
+    reload_interval=settings.CLINIC_REGISTRY_RELOAD_SECONDS,
+)
+
+
+def get_clinic_name_from_id(clinic_id: str, clinic_name: str = None) -> str:
+    """
+    Get clinic name for JamAI action tables.
+    If clinic_name is provided, use it (canonicalized when it matches a registered clinic).
+    Otherwise resolve clinic_id (or a legacy alias) through the registry.
+    """
+    with span("clinic") as resolve_span:
+        snapshot = clinic_registry.snapshot
+        clinic = snapshot.get_by_name(clinic_name) if clinic_name else snapshot.get(clinic_id)
+        # Unregistered ids share one label so arbitrary input cannot create new metric series
+        resolved_id = clinic.clinic_id if clinic else "unknown"
+        tag_request_clinic(resolved_id)
+        resolve_span.set("desc", resolved_id)
+
+    if clinic_name:
+        return clinic.name if clinic else clinic_name
+    if clinic:
+        return clinic.name
+    return clinic_id.replace('-', ' ').title()
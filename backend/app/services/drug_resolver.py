@@ -0,0 +1,151 @@
+# Typo- and brand-tolerant drug name resolution (trigram index + BM/EN synonym table)
+from typing import Dict, List, Optional, Set, Tuple
+import json
+import os
+import logging
+
+from app.core.config import settings
+from app.services.medication_index import MedicationIndex, medication_index, normalize_drug_name
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYNONYMS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "drug_synonyms.json"
+)
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class DrugNameResolver:
+    """
+    Maps what staff type ("panadol", "pcm", "paracetmol", "chlorphen") to canonical generic
+    drug names with a similarity score in [0, 1].
+
+    Vocabulary = every english/malay/generic name in the medication index plus the synonym
+    table. Exact and synonym hits score 1.0; everything else is ranked by trigram Dice similarity.
+    Fuzzy candidates are suggestions only: lookups substitute exact and synonym hits, never a
+    near miss ("medicine" is closer to "Mebendazole" than "panadl" is to "Paracetamol").
+    The index is rebuilt automatically when the medication index reloads.
+    """
+
+    def __init__(self, index: MedicationIndex, synonyms_path: str, min_score: float):
+        self.index = index
+        self.synonyms_path = synonyms_path
+        self.min_score = min_score
+        self._built_for_version = None
+        self._canonical: Dict[str, str] = {}  # normalized name -> canonical generic name
+        self._names: List[str] = []
+        self._name_trigrams: List[Set[str]] = []
+        self._postings: Dict[str, List[int]] = {}
+        self.max_name_words = 0
+
+    def _ensure_built(self):
+        if self._built_for_version == self.index.version:
+            return
+
+        canonical: Dict[str, str] = {}
+        for record in self.index.all_records():
+            generic = record.generic_name or record.english_name
+            for name in (record.english_name, record.malay_name, record.generic_name):
+                key = normalize_drug_name(name)
+                if key:
+                    canonical.setdefault(key, generic)
+
+        # Synonyms resolve to the generic's spelling as it appears in the CSVs when known
+        display = {normalize_drug_name(generic): generic for generic in canonical.values()}
+        for alias, generic in self._load_synonyms().items():
+            key = normalize_drug_name(alias)
+            if key:
+                canonical[key] = display.get(normalize_drug_name(generic), generic)
+
+        self._canonical = canonical
+        self._names = list(canonical)
+        self._name_trigrams = [_trigrams(name) for name in self._names]
+        self._postings = {}
+        for i, grams in enumerate(self._name_trigrams):
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(i)
+        self.max_name_words = max((len(name.split()) for name in self._names), default=0)
+        self._built_for_version = self.index.version
+        logger.info(f"Drug name resolver indexed {len(self._names)} names")
+
+    def _load_synonyms(self) -> Dict[str, str]:
+        try:
+            with open(self.synonyms_path, encoding="utf-8") as f:
+                return json.load(f).get("synonyms", {})
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load drug synonyms from {self.synonyms_path}: {str(e)}")
+            return {}
+
+    def resolve(self, query: str, limit: int = 5) -> List[Tuple[str, float]]:
+        """Ranked (canonical_name, score) candidates for a drug name, best first."""
+        self._ensure_built()
+        key = normalize_drug_name(query)
+        if not key:
+            return []
+
+        exact = self._canonical.get(key)
+        if exact is not None:
+            return [(exact, 1.0)]
+
+        query_grams = _trigrams(key)
+        shared: Dict[int, int] = {}
+        for gram in query_grams:
+            for i in self._postings.get(gram, ()):
+                shared[i] = shared.get(i, 0) + 1
+
+        best: Dict[str, float] = {}
+        for i, count in shared.items():
+            score = 2 * count / (len(query_grams) + len(self._name_trigrams[i]))
+            name = self._canonical[self._names[i]]
+            if score >= self.min_score and score > best.get(name, 0.0):
+                best[name] = score
+
+        ranked = sorted(best.items(), key=lambda item: (-item[1], item[0]))
+        return [(name, round(score, 3)) for name, score in ranked[:limit]]
+
+    def best_match(self, query: str) -> Optional[str]:
+        candidates = self.resolve(query, limit=1)
+        return candidates[0][0] if candidates else None
+
+    def exact_match(self, query: str) -> Optional[str]:
+        """Canonical name when `query` is a known name or synonym ("pcm", "panadol"), else None."""
+        self._ensure_built()
+        return self._canonical.get(normalize_drug_name(query))
+
+    def canonicalize(self, text: str) -> str:
+        """
+        Rewrite known names and synonyms in free text to their canonical name,
+        e.g. "pcm stok tinggal berapa" -> "Paracetamol stok tinggal berapa".
+        Misspellings and everyday words are left alone; used for local index lookups and answer keys.
+        """
+        self._ensure_built()
+        words = normalize_drug_name(text).split()
+        output = []
+        i = 0
+        while i < len(words):
+            canonical, size = self._exact_at(words, i)
+            if canonical is not None:
+                output.append(canonical)
+                i += size
+            else:
+                output.append(words[i])
+                i += 1
+        return " ".join(output)
+
+    def _exact_at(self, words: List[str], i: int) -> Tuple[Optional[str], int]:
+        # Longest exact name starting at word i ("vitamin c" over "vitamin")
+        for size in range(min(self.max_name_words, len(words) - i), 0, -1):
+            canonical = self._canonical.get(" ".join(words[i:i + size]))
+            if canonical is not None:
+                return canonical, size
+        return None, 0
+
+
+drug_resolver = DrugNameResolver(
+    index=medication_index,
+    synonyms_path=settings.DRUG_SYNONYMS_PATH or DEFAULT_SYNONYMS_PATH,
+    min_score=settings.DRUG_RESOLVER_MIN_SCORE,
+)
@@ -0,0 +1,385 @@
+# FAQ warm-up: precompute SOP QnA answers for each clinic's starter questions (configured + mined from traffic)
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import json
+import os
+import time
+import uuid
+import logging
+
+from app.core.config import settings
+from app.models.clinic import Clinic
+from app.services.answer_cache import normalize_query, sop_answer_cache
+from app.services.answer_store import NAMESPACE_SOP, answer_store
+from app.services.clinic_registry import clinic_registry
+from app.services.jamai_services import jamai_service
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUESTIONS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "faq_questions.json"
+)
+
+WarmKey = Tuple[str, str, str]  # (clinic_id, language, normalized question)
+
+# Answer store lease held by the worker that runs scheduled warm-ups for all workers
+WARMUP_LEASE = "faq-warmup"
+
+
+def load_default_questions(path: str) -> Dict[str, List[str]]:
+    """Starter questions for every clinic, by language ({"BM": [...], "EN": [...]})."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not load FAQ questions from {path}: {str(e)}")
+        return {}
+    return {language.upper(): [q for q in questions if q.strip()] for language, questions in data.items()}
+
+
+@dataclass
+class WarmEntry:
+    question: str
+    source: str  # "configured" or "mined"
+    warmed_at: Optional[float] = None  # Unix time of the last successful precompute
+    attempted_at: Optional[float] = None
+    error: Optional[str] = None
+
+
+class QuestionMiner:
+    """
+    Counts patient questions per (clinic_id, language) to find the most frequent ones.
+    At most `max_tracked` distinct questions are kept per clinic and language (the least
+    frequent is dropped first); counts are halved every scheduled interval so recent traffic wins.
+    """
+
+    def __init__(self, max_tracked: int):
+        self.max_tracked = max_tracked
+        self._counts: Dict[Tuple[str, str], Dict[str, List]] = {}  # normalized -> [count, first phrasing]
+
+    def record(self, clinic_id: str, question: str, language: str):
+        normalized = normalize_query(question)
+        if not normalized or self.max_tracked <= 0:
+            return
+        counts = self._counts.setdefault((clinic_id, language.upper()), {})
+        entry = counts.get(normalized)
+        if entry is not None:
+            entry[0] += 1
+            return
+        if len(counts) >= self.max_tracked:
+            del counts[min(counts, key=lambda k: counts[k][0])]
+        counts[normalized] = [1, question.strip()]
+
+    def top(self, clinic_id: str, language: str, n: int, min_count: int) -> List[str]:
+        counts = self._counts.get((clinic_id, language.upper()), {})
+        ranked = sorted(counts.values(), key=lambda entry: entry[0], reverse=True)
+        return [question for count, question in ranked[:n] if count >= min_count]
+
+    def decay(self):
+        for counts in self._counts.values():
+            for normalized in [k for k, entry in counts.items() if entry[0] <= 1]:
+                del counts[normalized]
+            for entry in counts.values():
+                entry[0] //= 2
+
+
+class FaqWarmer:
+    """
+    Keeps the SOP answer cache warm for each active clinic's starter questions so /patients/chat
+    answers them without a cold Action Table call.
+    - Questions: the defaults file plus the clinic's `faq_questions`, then the most frequent
+      questions from live traffic; capped at `max_questions` per clinic and language.
+    - Runs at startup, every `interval_seconds`, and `after_upload_delay_seconds` after a clinic's
+      knowledge is updated. Each clinic/language is answered with one multi-row SOP QnA call.
+    - An answer is stale once older than `stale_seconds` or older than the clinic's last knowledge
+      update; stale and missing answers are recomputed on the next run.
+    - Scheduled runs call JamAI only in the worker holding the WARMUP_LEASE in the shared answer
+      store; the other workers copy the answers it stored instead of recomputing them.
+    """
+
+    def __init__(
+        self,
+        default_questions: Dict[str, List[str]],
+        languages: List[str],
+        max_questions: int,
+        mined_top_n: int,
+        mined_min_count: int,
+        miner: QuestionMiner,
+        interval_seconds: float,
+        stale_seconds: float,
+        after_upload_delay_seconds: float,
+        enabled: bool = True,
+    ):
+        self.default_questions = default_questions
+        self.languages = [language.upper() for language in languages]
+        self.max_questions = max(1, min(max_questions, 100))
+        self.mined_top_n = mined_top_n
+        self.mined_min_count = mined_min_count
+        self.miner = miner
+        self.interval_seconds = interval_seconds
+        self.stale_seconds = stale_seconds
+        self.after_upload_delay_seconds = after_upload_delay_seconds
+        self.enabled = enabled
+
+        self._entries: Dict[WarmKey, WarmEntry] = {}
+        self._knowledge_updated_at: Dict[str, float] = {}
+        self._lock = asyncio.Lock()
+        self._scheduler: Optional[asyncio.Task] = None
+        self._pending: Dict[str, asyncio.Task] = {}  # Debounced post-upload runs, by clinic_id ("*" = all)
+        self._triggered: set = set()
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.leader: Optional[bool] = None  # Whether the last scheduled run held the warm-up lease
+
+        # Metrics
+        self.runs = 0
+        self.questions_warmed = 0
+        self.questions_failed = 0
+        self.last_run_at: Optional[float] = None
+        self.last_run_seconds: Optional[float] = None
+        self.next_run_at: Optional[float] = None
+
+    def record(self, clinic_name: str, question: str, language: str):
+        """Count a patient question towards the mined starter questions."""
+        clinic = clinic_registry.get_by_name(clinic_name)
+        if clinic is not None:
+            self.miner.record(clinic.clinic_id, question, language)
+
+    def questions_for(self, clinic: Clinic, language: str) -> List[Tuple[str, str]]:
+        """(question, source) pairs to keep warm, configured first, deduplicated after normalization."""
+        configured = self.default_questions.get(language, []) + clinic.faq_questions.get(language, [])
+        mined = self.miner.top(clinic.clinic_id, language, self.mined_top_n, self.mined_min_count)
+        questions, seen = [], set()
+        for question, source in [(q, "configured") for q in configured] + [(q, "mined") for q in mined]:
+            normalized = normalize_query(question)
+            if normalized and normalized not in seen:
+                seen.add(normalized)
+                questions.append((question, source))
+        return questions[:self.max_questions]
+
+    def _languages_for(self, clinic: Clinic) -> List[str]:
+        supported = {language.upper() for language in clinic.languages_supported}
+        return [language for language in self.languages if language in supported]
+
+    def _is_fresh(self, clinic: Clinic, entry: WarmEntry, language: str) -> bool:
+        if entry.warmed_at is None or sop_answer_cache.age(clinic.name, entry.question, language) is None:
+            return False
+        if time.time() - entry.warmed_at > self.stale_seconds:
+            return False
+        return entry.warmed_at >= self._knowledge_updated_at.get(clinic.clinic_id, 0.0)
+
+    async def _load_stored(self, clinic: Clinic, entry: WarmEntry, language: str) -> bool:
+        """Reuse a fresh answer another worker (or an earlier run) put in the shared store."""
+        stored = await answer_store.get_entry(NAMESPACE_SOP, clinic.name, entry.question, language)
+        if stored is None:
+            return False
+        answer, stored_at = stored
+        if time.time() - stored_at > self.stale_seconds or \
+                stored_at < self._knowledge_updated_at.get(clinic.clinic_id, 0.0):
+            return False
+        sop_answer_cache.set(clinic.name, entry.question, language, answer)
+        entry.warmed_at = stored_at
+        entry.error = None
+        return True
+
+    async def warm_clinic(self, clinic: Clinic, force: bool = False, load_only: bool = False) -> Dict[str, int]:
+        """
+        Precompute missing or stale answers for one clinic; force=True recomputes all of them.
+        load_only=True only copies fresh answers from the shared store (no JamAI calls).
+        """
+        summary = {"warmed": 0, "failed": 0, "fresh": 0}
+        for language in self._languages_for(clinic):
+            to_warm = []
+            for question, source in self.questions_for(clinic, language):
+                key = (clinic.clinic_id, language, normalize_query(question))
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = self._entries[key] = WarmEntry(question=question, source=source)
+                entry.source = source
+                if not force and (self._is_fresh(clinic, entry, language) or
+                                  await self._load_stored(clinic, entry, language)):
+                    summary["fresh"] += 1
+                elif not load_only:
+                    to_warm.append(entry)
+            if not to_warm:
+                continue
+
+            attempted_at = time.time()
+            try:
+                results = await jamai_service.batch_pdf_sop_answering(
+                    clinic.name, [entry.question for entry in to_warm], language, use_cache=False
+                )
+            except Exception as e:
+                # e.g. AdmissionRejected while the clinic is busy; retried on the next run
+                detail = getattr(e, "detail", None) or str(e)
+                logger.warning(f"FAQ warm-up for {clinic.clinic_id}/{language} failed: {detail}")
+                results = [{"error": str(detail)}] * len(to_warm)
+
+            for entry, result in zip(to_warm, results):
+                entry.attempted_at = attempted_at
+                entry.error = result.get("error")
+                if entry.error is None:
+                    entry.warmed_at = attempted_at
+                    summary["warmed"] += 1
+                else:
+                    summary["failed"] += 1
+        self.questions_warmed += summary["warmed"]
+        self.questions_failed += summary["failed"]
+        return summary
+
+    async def warm(self, clinic_id: Optional[str] = None, force: bool = False,
+                   load_only: bool = False) -> Dict[str, Dict[str, int]]:
+        """Warm one clinic, or every active clinic; runs never overlap."""
+        async with self._lock:
+            start = time.time()
+            if clinic_id:
+                clinic = clinic_registry.get(clinic_id)
+                clinics = [clinic] if clinic is not None else []
+            else:
+                clinics = list(clinic_registry.active_clinics())
+            results = {}
+            for clinic in clinics:
+                results[clinic.clinic_id] = await self.warm_clinic(clinic, force, load_only)
+            self._drop_unused()
+            self.runs += 1
+            self.last_run_at = start
+            self.last_run_seconds = round(time.time() - start, 3)
+            warmed = sum(r["warmed"] for r in results.values())
+            failed = sum(r["failed"] for r in results.values())
+            logger.info(f"FAQ warm-up: {warmed} answers precomputed, {failed} failed for {len(results)} clinics")
+            return results
+
+    def knowledge_updated(self, clinic_id: Optional[str] = None):
+        """
+        Mark a clinic's (or every clinic's) answers stale after a knowledge upload and schedule a
+        re-warm. Repeated calls within the delay are debounced into a single run.
+        """
+        now = time.time()
+        if clinic_id:
+            self._knowledge_updated_at[clinic_id] = now
+        else:
+            for clinic in clinic_registry.all_clinics():
+                self._knowledge_updated_at[clinic.clinic_id] = now
+        if not self.enabled:
+            return
+        pending_key = clinic_id or "*"
+        previous = self._pending.get(pending_key)
+        if previous is not None and not previous.done():
+            previous.cancel()
+        self._pending[pending_key] = asyncio.get_running_loop().create_task(self._warm_after_upload(clinic_id))
+
+    async def _warm_after_upload(self, clinic_id: Optional[str]):
+        # Give the knowledge table time to embed the new documents before asking questions
+        await asyncio.sleep(self.after_upload_delay_seconds)
+        try:
+            await self.warm(clinic_id)
+        except Exception as e:
+            logger.error(f"FAQ warm-up after upload failed: {str(e)}")
+
+    def trigger(self, clinic_id: Optional[str] = None, force: bool = False) -> asyncio.Task:
+        """Run warm() in the background (staff-triggered)."""
+        task = asyncio.get_running_loop().create_task(self.warm(clinic_id, force))
+        # Keep a reference so the task is not garbage collected mid-flight
+        self._triggered.add(task)
+        task.add_done_callback(self._triggered.discard)
+        return task
+
+    def start(self):
+        """Start the startup + periodic warm-up loop (call from the app's lifespan)."""
+        if self.enabled and self._scheduler is None:
+            self._scheduler = asyncio.get_running_loop().create_task(self._run_periodically())
+
+    async def stop(self):
+        tasks = [task for task in [self._scheduler, *self._pending.values(), *self._triggered] if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._scheduler = None
+        self._pending.clear()
+
+    async def scheduled_warm(self) -> Dict[str, Dict[str, int]]:
+        """
+        One startup/periodic run. Only the lease holder calls JamAI; the lease outlives the interval
+        so the same worker keeps it, and another worker takes over if the holder stops renewing it.
+        """
+        self.leader = await answer_store.acquire_lease(WARMUP_LEASE, self._owner, self.interval_seconds * 1.5)
+        return await self.warm(load_only=not self.leader)
+
+    async def _run_periodically(self):
+        while True:
+            try:
+                await self.scheduled_warm()
+            except Exception as e:
+                logger.error(f"Scheduled FAQ warm-up failed: {str(e)}")
+            self.next_run_at = time.time() + self.interval_seconds
+            await asyncio.sleep(self.interval_seconds)
+            self.miner.decay()
+
+    def _drop_unused(self):
+        """Forget entries for questions no longer selected (e.g. mined questions that fell out of the top N)."""
+        selected = set()
+        for clinic in clinic_registry.active_clinics():
+            for language in self._languages_for(clinic):
+                for question, _ in self.questions_for(clinic, language):
+                    selected.add((clinic.clinic_id, language, normalize_query(question)))
+        for key in [key for key in self._entries if key not in selected]:
+            del self._entries[key]
+
+    def status(self, clinic_id: Optional[str] = None) -> Dict:
+        """What is warm: per clinic and language, each question's state and answer age."""
+        now = time.time()
+        clinics: Dict[str, Dict] = {}
+        for (entry_clinic_id, language, _), entry in self._entries.items():
+            if clinic_id and entry_clinic_id != clinic_id:
+                continue
+            clinic = clinic_registry.get(entry_clinic_id)
+            if clinic is None:
+                continue
+            if self._is_fresh(clinic, entry, language):
+                state = "warm"
+            elif entry.warmed_at is not None and sop_answer_cache.age(clinic.name, entry.question, language) is not None:
+                state = "stale"
+            elif entry.error:
+                state = "failed"
+            else:
+                state = "cold"
+            clinic_status = clinics.setdefault(entry_clinic_id, {
+                "knowledge_updated_at": self._knowledge_updated_at.get(entry_clinic_id),
+                "counts": {"warm": 0, "stale": 0, "failed": 0, "cold": 0},
+                "languages": {}
+            })
+            clinic_status["counts"][state] += 1
+            clinic_status["languages"].setdefault(language, []).append({
+                "question": entry.question,
+                "source": entry.source,
+                "state": state,
+                "age_seconds": round(now - entry.warmed_at, 1) if entry.warmed_at else None,
+                "error": entry.error,
+            })
+        return {
+            "enabled": self.enabled,
+            "leader": self.leader,
+            "interval_seconds": self.interval_seconds,
+            "stale_seconds": self.stale_seconds,
+            "runs": self.runs,
+            "last_run_at": self.last_run_at,
+            "last_run_seconds": self.last_run_seconds,
+            "next_run_at": self.next_run_at,
+            "questions_warmed": self.questions_warmed,
+            "questions_failed": self.questions_failed,
+            "clinics": clinics,
+        }
+
+
+faq_warmer = FaqWarmer(
+    default_questions=load_default_questions(settings.FAQ_QUESTIONS_PATH or DEFAULT_QUESTIONS_PATH),
+    languages=[language.strip() for language in settings.FAQ_WARM_LANGUAGES.split(",") if language.strip()],
+    max_questions=settings.FAQ_WARM_MAX_QUESTIONS,
+    mined_top_n=settings.FAQ_WARM_MINED_TOP_N,
+    mined_min_count=settings.FAQ_WARM_MINED_MIN_COUNT,
+    miner=QuestionMiner(max_tracked=settings.FAQ_WARM_MINED_MAX_TRACKED),
+    interval_seconds=settings.FAQ_WARM_INTERVAL_SECONDS,
+    stale_seconds=settings.FAQ_WARM_STALE_SECONDS,
+    after_upload_delay_seconds=settings.FAQ_WARM_AFTER_UPLOAD_DELAY_SECONDS,
+    enabled=settings.FAQ_WARM_ENABLED,
+)
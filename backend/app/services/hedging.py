@@ -0,0 +1,230 @@
+# Hedged requests and jittered retries for Action Table calls, paid for from a shared budget
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+import asyncio
+import random
+import time
+import logging
+
+import httpx
+from jamaibase.exceptions import ServerBusyError, UnexpectedError
+
+from app.core.metrics import JAMAI_EXTRA_CALLS
+from app.services.circuit_breaker import HALF_OPEN, CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+# The SDK raises a plain RuntimeError for every non-404 HTTP error and drops the status code,
+# so overload and upstream failures can only be told apart from 400/401/403 by the message
+_TRANSIENT_MESSAGES = (
+    "rate limit", "too many requests", "overloaded", "server busy", "temporarily", "try again",
+    "timed out", "timeout", "bad gateway", "service unavailable", "gateway timeout", "internal server error",
+)
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Errors worth retrying, and the only ones that count against a table's circuit breaker:
+    timeouts, network failures and server-side errors. A bare RuntimeError (any non-404 HTTP
+    error) only counts when its message says overload or an upstream failure; bad input, auth
+    and permission errors are never retried.
+    """
+    if isinstance(error, (TimeoutError, httpx.TransportError, ServerBusyError, UnexpectedError)):
+        return True
+    if type(error) is RuntimeError:
+        message = str(error).lower()
+        return any(hint in message for hint in _TRANSIENT_MESSAGES)
+    return False
+
+
+def is_unsent(error: BaseException) -> bool:
+    """The request never reached JamAI, so even a write is safe to send again."""
+    return isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout))
+
+
+class ExtraCallBudget:
+    """
+    Global token bucket for hedges and retries: every primary call deposits `ratio` tokens
+    (up to `burst`), every extra call spends one. Extra JamAI load therefore stays below
+    ratio * calls + burst no matter how degraded JamAI is.
+    """
+
+    def __init__(self, ratio: float = 0.05, burst: float = 10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+        self.spent = 0
+        self.denied = 0
+
+    def deposit(self):
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            self.spent += 1
+            return True
+        self.denied += 1
+        return False
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "ratio": self.ratio,
+            "burst": self.burst,
+            "tokens": round(self.tokens, 2),
+            "spent": self.spent,
+            "denied": self.denied,
+        }
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies with a periodically refreshed percentile."""
+
+    def __init__(self, percentile: float = 95.0, window: int = 500, refresh_every: int = 20):
+        self.percentile = percentile
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.refresh_every = refresh_every
+        self._since_refresh = 0
+        self._value: Optional[float] = None
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+        self._since_refresh += 1
+        if self._value is None or self._since_refresh >= self.refresh_every:
+            ordered = sorted(self.samples)
+            index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+            self._value = ordered[index]
+            self._since_refresh = 0
+
+    def value(self, min_samples: int) -> Optional[float]:
+        """Current percentile, or None until enough samples have been seen."""
+        return self._value if len(self.samples) >= min_samples else None
+
+
+class Hedger:
+    """
+    Retry and (optionally) hedge one Action Table's calls.
+    A hedge is a duplicate call fired when the first has not returned by the table's
+    latency percentile; whichever finishes first wins and the other is cancelled.
+    Transient errors are retried with full-jitter exponential backoff.
+    Both hedges and retries draw from the shared ExtraCallBudget.
+    Tables that write (`idempotent=False`, e.g. bookings) are never hedged, and only calls that
+    never reached JamAI are retried. No extra calls are made while the table's breaker is
+    half-open, so a recovery probe stays a single call.
+    """
+
+    def __init__(self, table_id: str, budget: ExtraCallBudget, hedge: bool = False,
+                 percentile: float = 95.0, min_delay_seconds: float = 1.0, min_samples: int = 50,
+                 max_retries: int = 2, retry_base_seconds: float = 0.2, retry_max_seconds: float = 2.0,
+                 idempotent: bool = True, breaker: Optional[CircuitBreaker] = None):
+        self.table_id = table_id
+        self.budget = budget
+        if hedge and not idempotent:
+            logger.warning(f"Hedging is not used for '{table_id}': its calls are not idempotent")
+        self.hedge = hedge and idempotent
+        self.idempotent = idempotent
+        self.breaker = breaker
+        self.latency = LatencyTracker(percentile)
+        self.min_delay_seconds = min_delay_seconds
+        self.min_samples = min_samples
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.counts = {"hedges": 0, "hedges_won": 0, "hedges_denied": 0, "retries": 0, "retries_denied": 0}
+        self._counters = {
+            kind: JAMAI_EXTRA_CALLS.labels(table_id, kind)
+            for kind in ("hedge", "hedge_won", "hedge_denied", "retry", "retry_denied")
+        }
+
+    def _probing(self) -> bool:
+        return self.breaker is not None and self.breaker.state == HALF_OPEN
+
+    def should_retry(self, error: BaseException) -> bool:
+        if self._probing():
+            return False
+        return is_transient(error) if self.idempotent else is_unsent(error)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while hedging is off or still warming up."""
+        if not self.hedge or self._probing():
+            return None
+        threshold = self.latency.value(self.min_samples)
+        if threshold is None:
+            return None
+        return max(self.min_delay_seconds, threshold)
+
+    def backoff(self, retry: int) -> float:
+        return random.uniform(0, min(self.retry_max_seconds, self.retry_base_seconds * (2 ** retry)))
+
+    async def call(self, attempt: Callable[[], Awaitable[T]]) -> T:
+        """Run `attempt` with hedging and retries (only unsent retries unless the table is idempotent)."""
+        self.budget.deposit()
+        retry = 0
+        while True:
+            try:
+                return await self._hedged(attempt)
+            except Exception as e:
+                if retry >= self.max_retries or not self.should_retry(e):
+                    raise
+                if not self.budget.try_spend():
+                    self._count("retries_denied", "retry_denied")
+                    raise
+                delay = self.backoff(retry)
+                retry += 1
+                self._count("retries", "retry")
+                logger.warning(f"Retrying '{self.table_id}' in {delay:.2f}s (retry {retry}) after {type(e).__name__}: {e}")
+                await asyncio.sleep(delay)
+
+    async def _timed(self, attempt: Callable[[], Awaitable[T]]) -> T:
+        start = time.perf_counter()
+        result = await attempt()
+        self.latency.observe(time.perf_counter() - start)
+        return result
+
+    async def _hedged(self, attempt: Callable[[], Awaitable[T]]) -> T:
+        delay = self.hedge_delay()
+        if delay is None:
+            return await self._timed(attempt)
+
+        primary = asyncio.ensure_future(self._timed(attempt))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+            if not self.budget.try_spend():
+                self._count("hedges_denied", "hedge_denied")
+                return await primary
+            self._count("hedges", "hedge")
+            hedge = asyncio.ensure_future(self._timed(attempt))
+            pending = {primary, hedge}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._count("hedges_won", "hedge_won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _count(self, key: str, kind: str):
+        self.counts[key] += 1
+        self._counters[kind].inc()
+
+    def stats(self) -> Dict[str, object]:
+        threshold = self.latency.value(self.min_samples)
+        return {
+            "hedging": self.hedge,
+            "idempotent": self.idempotent,
+            "hedge_after_seconds": round(max(self.min_delay_seconds, threshold), 3) if threshold is not None else None,
+            "latency_samples": len(self.latency.samples),
+            **self.counts,
+        }
@@ -1,45 +1,327 @@
-from jamaibase import JamAI, protocol as p
+from jamaibase import JamAIAsync, protocol as p
 from app.core.config import settings
-from typing import Dict, List
+from app.core.metrics import TableMetrics
+from app.core.tracing import span
+from app.services.admission import (
+    PRIORITY_BOOKING, PRIORITY_EMERGENCY, PRIORITY_FAQ, PRIORITY_STAFF,
+    AdmissionRejected, admission_controller, clinic_id_for_name
+)
+from app.services.answer_cache import sop_answer_cache, normalize_query
+from app.services.answer_store import NAMESPACE_MEDICATION, NAMESPACE_SOP, answer_store
+from app.services.batching import RowBatcher
+from app.services.circuit_breaker import ActionTableTimeout, CircuitBreaker, breaker_stats
+from app.services.hedging import ExtraCallBudget, Hedger, is_transient
+from app.services.single_flight import SingleFlight
+from app.services.medication_index import medication_index, normalize_drug_name
+from app.services.drug_resolver import drug_resolver
+from typing import Dict, List, Optional
+import asyncio
+import time
 import logging
 
 logger = logging.getLogger(__name__)
 
+def jamai_api_base(base_url: str) -> str:
+    """JamAI clients expect the API root ("https://api.jamaibase.com/api"); settings hold the host."""
+    base_url = base_url.rstrip("/")
+    return base_url if base_url.endswith("/api") else f"{base_url}/api"
+
 class JamAIService:
-    def __init__(self):
-        self.client = JamAI(
+    def __init__(self, client: JamAIAsync = None):
+        # Async client so a slow LLM chain never blocks the uvicorn event loop.
+        # Pass a client (e.g. scripts/fake_jamai.py) or set JAMAI_BASE_URL to run against a stand-in.
+        self.client = client or JamAIAsync(
             project_id=settings.JAMAI_PROJECT_ID, 
-            token=settings.JAMAI_API_KEY
+            token=settings.JAMAI_API_KEY,
+            api_base=jamai_api_base(settings.JAMAI_BASE_URL)
+        )
+        # Per-table concurrency limits; extra callers wait here instead of piling onto JamAI
+        self._table_limits = {
+            settings.ACTION_TABLE_TRIAGE: asyncio.Semaphore(settings.ACTION_TABLE_TRIAGE_CONCURRENCY),
+            settings.ACTION_TABLE_SOP_QNA: asyncio.Semaphore(settings.ACTION_TABLE_SOP_QNA_CONCURRENCY),
+            settings.ACTION_TABLE_LOOKUP: asyncio.Semaphore(settings.ACTION_TABLE_LOOKUP_CONCURRENCY),
+        }
+        # Micro-batchers merge concurrent single-row calls per table (disabled when window is 0)
+        self._batchers: Dict[str, RowBatcher] = {}
+        if settings.ACTION_TABLE_BATCH_WINDOW_MS > 0:
+            for table_id in self._table_limits:
+                self._batchers[table_id] = RowBatcher(
+                    table_id=table_id,
+                    send_batch=lambda rows, table_id=table_id: self._add_action_rows(table_id, rows),
+                    max_batch_size=settings.ACTION_TABLE_MAX_BATCH_SIZE,
+                    window_seconds=settings.ACTION_TABLE_BATCH_WINDOW_MS / 1000
+                )
+        # Identical queries already in flight share one Action Table call. Booking rows write a
+        # booking_record for one patient, so two patients with the same symptoms must never share one
+        # (and a booking is never hedged or resent once JamAI may have received it)
+        self._single_flight = SingleFlight()
+        self._read_only_tables = {settings.ACTION_TABLE_SOP_QNA, settings.ACTION_TABLE_LOOKUP}
+        # Prometheus latency/error/in-flight metrics per Action Table
+        self._metrics = {table_id: TableMetrics(table_id) for table_id in self._table_limits}
+        # Per-table deadlines and circuit breakers bound how long callers wait on a degraded JamAI
+        self._deadlines = {
+            settings.ACTION_TABLE_TRIAGE: settings.ACTION_TABLE_TRIAGE_TIMEOUT_SECONDS,
+            settings.ACTION_TABLE_SOP_QNA: settings.ACTION_TABLE_SOP_QNA_TIMEOUT_SECONDS,
+            settings.ACTION_TABLE_LOOKUP: settings.ACTION_TABLE_LOOKUP_TIMEOUT_SECONDS,
+        }
+        self._breakers = {
+            table_id: CircuitBreaker(
+                table_id,
+                failure_threshold=settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+                recovery_seconds=settings.CIRCUIT_BREAKER_RECOVERY_SECONDS,
+                half_open_probes=settings.CIRCUIT_BREAKER_HALF_OPEN_PROBES,
+                # Only timeouts, connection and server errors: bad input must not open the breaker
+                is_failure=is_transient
+            )
+            for table_id in self._table_limits
+        }
+        # Retries of transient errors (all tables) and hedging (opt-in), sharing one extra-call budget
+        self._extra_call_budget = ExtraCallBudget(
+            ratio=settings.EXTRA_CALL_BUDGET_RATIO,
+            burst=settings.EXTRA_CALL_BUDGET_BURST
+        )
+        hedging = {
+            settings.ACTION_TABLE_TRIAGE: settings.ACTION_TABLE_TRIAGE_HEDGING,
+            settings.ACTION_TABLE_SOP_QNA: settings.ACTION_TABLE_SOP_QNA_HEDGING,
+            settings.ACTION_TABLE_LOOKUP: settings.ACTION_TABLE_LOOKUP_HEDGING,
+        }
+        self._hedgers = {
+            table_id: Hedger(
+                table_id,
+                self._extra_call_budget,
+                hedge=hedging[table_id],
+                percentile=settings.HEDGE_PERCENTILE,
+                min_delay_seconds=settings.HEDGE_MIN_DELAY_SECONDS,
+                min_samples=settings.HEDGE_MIN_SAMPLES,
+                max_retries=settings.RETRY_MAX_ATTEMPTS,
+                retry_base_seconds=settings.RETRY_BASE_DELAY_SECONDS,
+                retry_max_seconds=settings.RETRY_MAX_DELAY_SECONDS,
+                idempotent=table_id in self._read_only_tables,
+                breaker=self._breakers[table_id]
+            )
+            for table_id in self._table_limits
+        }
+
+    async def _add_action_rows(self, table_id: str, rows: List[Dict[str, str]]):
+        """
+        Add rows to an Action Table in one request without blocking the event loop.
+        Calls are bounded by the per-table concurrency limit, deadline and circuit breaker.
+        Transient errors are retried and slow calls may be hedged within the same deadline;
+        a hedge runs inside its primary call's concurrency slot.
+        Returns the generated rows in input order.
+        """
+        metrics = self._metrics[table_id]
+        breaker = self._breakers[table_id]
+        timeout = self._deadlines[table_id]
+        request = p.RowAddRequest(
+            table_id=table_id,
+            data=rows,
+            stream=False
         )
+        async with self._table_limits[table_id]:
+            # Checked after the concurrency wait so queued callers fail fast once the breaker opens
+            breaker.before_call()
+            metrics.in_flight.inc()
+            start = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(
+                    self._hedgers[table_id].call(
+                        lambda: self.client.table.add_table_rows(table_type='action', request=request)
+                    ),
+                    timeout
+                )
+            except asyncio.TimeoutError:
+                e = ActionTableTimeout(f"'{table_id}' did not respond within {timeout:g}s")
+                metrics.error(e)
+                breaker.record_failure(e)
+                raise e from None
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception as e:
+                metrics.error(e)
+                breaker.record_failure(e)
+                raise
+            finally:
+                metrics.in_flight.dec()
+                metrics.batch_seconds.observe(time.perf_counter() - start)
+        breaker.record_success()
+        metrics.rows.inc(len(rows))
+        return response.rows or []
+
+    async def _add_action_row(self, table_id: str, row: Dict[str, str]):
+        """
+        Add a single row to an Action Table and return the generated row (or None).
+        Concurrent rows for the same table are micro-batched into one request when enabled.
+        """
+        batcher = self._batchers.get(table_id)
+        if batcher is not None:
+            return await batcher.submit(row)
+
+        rows = await self._add_action_rows(table_id, [row])
+        return rows[0] if rows else None
 
-    async def appointment_booking(self, clinic_name: str, user_input: str, language: str = "BM"):
+    async def _stream_action_row(self, table_id: str, row: Dict[str, str], priority: int = PRIORITY_FAQ):
+        """
+        Streaming variant of _add_action_row.
+        Yields GenTableStreamChatCompletionChunk objects as JamAI generates each output column.
+        The per-table concurrency slot is held until the stream is exhausted or closed.
+        The table deadline covers the whole stream, not each chunk.
+        """
+        metrics = self._metrics[table_id]
+        breaker = self._breakers[table_id]
+        timeout = self._deadlines[table_id]
+        breaker.check()
+        with span("jamai", desc=table_id, mode="stream"):
+            async with admission_controller.admit(clinic_id_for_name(row.get("clinic_name", "")), priority), \
+                    self._table_limits[table_id]:
+                breaker.before_call()
+                metrics.in_flight.inc()
+                metrics.rows.inc()
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + timeout
+                start = time.perf_counter()
+                stream = None
+                try:
+                    stream = await asyncio.wait_for(
+                        self.client.table.add_table_rows(
+                            table_type='action',
+                            request=p.RowAddRequest(
+                                table_id=table_id,
+                                data=[row],
+                                stream=True
+                            )
+                        ),
+                        timeout
+                    )
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(stream.__anext__(), deadline - loop.time())
+                        except StopAsyncIteration:
+                            break
+                        # Reference chunks carry RAG context only, not column text
+                        if isinstance(chunk, p.GenTableStreamChatCompletionChunk):
+                            yield chunk
+                except asyncio.TimeoutError:
+                    e = ActionTableTimeout(f"'{table_id}' stream did not finish within {timeout:g}s")
+                    metrics.error(e)
+                    breaker.record_failure(e)
+                    raise e from None
+                except (asyncio.CancelledError, GeneratorExit):
+                    # Client went away mid-stream; says nothing about JamAI's health
+                    breaker.release()
+                    raise
+                except Exception as e:
+                    metrics.error(e)
+                    breaker.record_failure(e)
+                    raise
+                else:
+                    breaker.record_success()
+                finally:
+                    if stream is not None and hasattr(stream, "aclose"):
+                        await stream.aclose()
+                    metrics.in_flight.dec()
+                    metrics.stream_seconds.observe(time.perf_counter() - start)
+
+    async def _add_action_row_once(self, table_id: str, row: Dict[str, str], language: str = "",
+                                   priority: int = PRIORITY_FAQ, coalesce_row: Dict[str, str] = None):
+        """
+        _add_action_row with single-flight coalescing (read-only tables only, not bookings).
+        Rows with the same table, language and normalized column values share one call;
+        its result or exception is delivered to every waiter. `coalesce_row` replaces the
+        row values in that key when differently worded rows ask the same thing.
+        The call queues for a shared JamAI slot at `priority` (followers spend no tokens or
+        slots); raises AdmissionRejected when the clinic is over its share of JamAI capacity.
+        """
+        # Open breaker: fail before queueing so the caller's fallback is immediate
+        self._breakers[table_id].check()
+        clinic_id = clinic_id_for_name(row.get("clinic_name", ""))
+
+        async def admitted_call():
+            # Per-clinic fair share of JamAI capacity; cache and local index hits never get here
+            async with admission_controller.admit(clinic_id, priority):
+                return await self._add_action_row(table_id, row)
+
+        # Timed from the caller's side, so admission, batching and concurrency waits are included
+        with span("jamai", desc=table_id):
+            if table_id not in self._read_only_tables:
+                return await admitted_call()
+            key = (
+                table_id,
+                language.upper(),
+                tuple(sorted((column, normalize_query(value)) for column, value in (coalesce_row or row).items()))
+            )
+            return await self._single_flight.do(key, admitted_call)
+
+    async def _cached_sop_answer(self, clinic_name: str, question: str, language: str) -> Optional[Dict[str, str]]:
+        """In-process cache first, then the shared answer store (hits are copied into the process cache)."""
+        # Another worker may have purged answers this process still holds
+        await answer_store.revalidate(sop_answer_cache)
+        cached = sop_answer_cache.get(clinic_name, question, language)
+        if cached is not None:
+            return cached
+        stored = await answer_store.get(NAMESPACE_SOP, clinic_name, question, language)
+        if stored is not None:
+            sop_answer_cache.set(clinic_name, question, language, stored)
+        return stored
+
+    async def _remember_sop_answer(self, clinic_name: str, question: str, language: str, answer: Dict[str, str]):
+        sop_answer_cache.set(clinic_name, question, language, answer)
+        await answer_store.set(NAMESPACE_SOP, clinic_name, question, language, answer)
+
+    def batching_stats(self) -> Dict[str, dict]:
+        """Batch size and queueing delay metrics per Action Table."""
+        return {table_id: batcher.stats() for table_id, batcher in self._batchers.items()}
+
+    def single_flight_stats(self) -> Dict[str, int]:
+        """How many Action Table calls were started vs. coalesced onto an in-flight call."""
+        return self._single_flight.stats()
+
+    def hedging_stats(self) -> Dict[str, dict]:
+        """Hedge/retry counts and current hedge threshold per Action Table, plus the shared budget."""
+        return {
+            "budget": self._extra_call_budget.stats(),
+            "tables": {table_id: hedger.stats() for table_id, hedger in self._hedgers.items()}
+        }
+
+    def circuit_breaker_stats(self) -> Dict[str, dict]:
+        """Breaker state, consecutive failures and recent transitions per Action Table."""
+        return breaker_stats(self._breakers)
+
+    def reset_circuit_breakers(self, table_id: str = None) -> List[str]:
+        """Close one table's breaker (or all of them); returns the tables reset."""
+        tables = [table_id] if table_id else list(self._breakers)
+        for name in tables:
+            self._breakers[name].reset()
+        return tables
+
+    async def appointment_booking(self, clinic_name: str, user_input: str, language: str = "BM", *,
+                                  emergency: bool = False):
         """
         A. Appointment Booking Action Table
         Strict Input: user_input (str), clinic_name (str)
         Strict Output: available_time_slots, case_type, recommended_time, refined_user_message, booking_record
+        Emergency triage is scheduled ahead of all other JamAI work.
         """
         try:
             # Add row to Action Table using the working pattern from test_action.py
-            response = self.client.table.add_table_rows(
-                table_type='action',
-                request=p.RowAddRequest(
-                    table_id=settings.ACTION_TABLE_TRIAGE,  # "Appointment Booking"
-                    data=[{
-                        "user_input": user_input,
-                        "clinic_name": clinic_name
-                    }],
-                    stream=False
-                )
+            row = await self._add_action_row_once(
+                settings.ACTION_TABLE_TRIAGE,  # "Appointment Booking"
+                {
+                    "user_input": user_input,
+                    "clinic_name": clinic_name
+                },
+                language,
+                priority=PRIORITY_EMERGENCY if emergency else PRIORITY_BOOKING
             )
             
             # Extract outputs using direct column access like test_action.py
-            if response.rows and len(response.rows) > 0:
-                row = response.rows[0]
-                
-                # Safely access columns with a helper function and log issues
+            if row is not None:
+                # Safely access columns with a helper function; misses are logged and counted
                 def get_col(name, default=""):
                     if name not in row.columns:
                         logger.warning(f"Column '{name}' not found in JamAI response.")
+                        self._metrics[settings.ACTION_TABLE_TRIAGE].missing_column(name)
                         return default
                     return row.columns[name].text
 
@@ -71,6 +353,8 @@ class JamAIService:
                 "booking_record": "{}"
             }
             
+        except AdmissionRejected:
+            raise
         except Exception as e:
             logger.error(f"Error in appointment_booking for clinic {clinic_name}: {str(e)}")
             fallback_message = "Maaf, sistem tempahan menghadapi masalah." if language == "BM" else "Sorry, appointment booking system is experiencing issues."
@@ -87,39 +371,44 @@ class JamAIService:
         B. SOP QnA Action Table
         Strict Input: question (str), clinic_name (str)
         Strict Output: response (str), source_document (str)
+        Successful answers are cached per (clinic, question, language), in process and in the shared store.
         """
+        cached = await self._cached_sop_answer(clinic_name, question, language)
+        if cached is not None:
+            return cached
+
         try:
             # Add row to Action Table using the working pattern from test_action.py
-            response = self.client.table.add_table_rows(
-                table_type='action',
-                request=p.RowAddRequest(
-                    table_id=settings.ACTION_TABLE_SOP_QNA,  # "SOP QnA"
-                    data=[{
-                        "question": question,
-                        "clinic_name": clinic_name
-                    }],
-                    stream=False
-                )
+            row = await self._add_action_row_once(
+                settings.ACTION_TABLE_SOP_QNA,  # "SOP QnA"
+                {
+                    "question": question,
+                    "clinic_name": clinic_name
+                },
+                language,
+                priority=PRIORITY_FAQ
             )
             
             # Extract outputs using direct column access like test_action.py
-            if response.rows and len(response.rows) > 0:
-                row = response.rows[0]
-                
+            if row is not None:
                 # Access columns directly as in working test
                 ai_response = row.columns["response"].text
                 source_doc = row.columns["source_doc"].text
                 
-                return {
+                result = {
                     "response": ai_response,
                     "source_document": source_doc
                 }
+                await self._remember_sop_answer(clinic_name, question, language, result)
+                return result
                         
             return {
                 "response": "No answer found in documents",
                 "source_document": ""
             }
             
+        except AdmissionRejected:
+            raise
         except Exception as e:
             logger.error(f"Error in pdf_sop_answering for clinic {clinic_name}: {str(e)}")
             fallback_message = "Maaf, pencarian dokumen menghadapi masalah." if language == "BM" else "Sorry, document search is experiencing issues."
@@ -128,49 +417,202 @@ class JamAIService:
                 "source_document": ""
             }
 
-    async def medication_lookup_staff(self, clinic_name: str, user_input: str):
+    async def stream_pdf_sop_answering(self, clinic_name: str, question: str, language: str = "BM"):
+        """
+        B. SOP QnA Action Table (streaming)
+        Strict Input: question (str), clinic_name (str)
+        Yields (event, text) tuples: ("response", chunk) while the answer is generated,
+        then ("source_document", full_text) once the row is complete.
+        On failure yields ("error", fallback_message) instead.
+        Cached answers are replayed as a single chunk.
+        """
+        cached = await self._cached_sop_answer(clinic_name, question, language)
+        if cached is not None:
+            yield "response", cached["response"]
+            yield "source_document", cached["source_document"]
+            return
+
+        response_parts = []
+        source_doc_parts = []
+        stream = self._stream_action_row(
+            settings.ACTION_TABLE_SOP_QNA,  # "SOP QnA"
+            {
+                "question": question,
+                "clinic_name": clinic_name
+            }
+        )
+        try:
+            async for chunk in stream:
+                text = chunk.text
+                if not text:
+                    continue
+                if chunk.output_column_name == "response":
+                    response_parts.append(text)
+                    yield "response", text
+                elif chunk.output_column_name == "source_doc":
+                    source_doc_parts.append(text)
+
+        except Exception as e:
+            logger.error(f"Error in stream_pdf_sop_answering for clinic {clinic_name}: {str(e)}")
+            fallback_message = "Maaf, pencarian dokumen menghadapi masalah." if language == "BM" else "Sorry, document search is experiencing issues."
+            yield "error", fallback_message
+            return
+        finally:
+            # Release the concurrency slot and breaker probe now if the client disconnects mid-stream
+            await stream.aclose()
+
+        source_doc = "".join(source_doc_parts)
+        if response_parts:
+            await self._remember_sop_answer(clinic_name, question, language, {
+                "response": "".join(response_parts),
+                "source_document": source_doc
+            })
+        yield "source_document", source_doc
+
+    async def iter_batch_pdf_sop_answering(self, clinic_name: str, questions: List[str], language: str = "BM",
+                                           use_cache: bool = True):
+        """
+        B. SOP QnA Action Table, many questions at once
+        Yields (index, result) per question as answers become available: cached answers first,
+        then every remaining question from one multi-row call (repeated questions share a row).
+        result: response, source_document, cached, and error when that question was not answered
+        (response then holds the fallback message).
+        use_cache=False re-answers every question (the cache is still updated).
+        Raises AdmissionRejected when the clinic is over its share of JamAI capacity.
+        """
+        table_id = settings.ACTION_TABLE_SOP_QNA
+        pending: Dict[str, List[int]] = {}
+        for index, question in enumerate(questions):
+            if not question.strip():
+                yield index, {"response": "", "source_document": "", "cached": False, "error": "Empty question"}
+                continue
+            cached = await self._cached_sop_answer(clinic_name, question, language) if use_cache else None
+            if cached is not None:
+                yield index, {**cached, "cached": True, "error": None}
+                continue
+            pending.setdefault(normalize_query(question), []).append(index)
+        if not pending:
+            return
+
+        unique_questions = [questions[indices[0]] for indices in pending.values()]
+        fallback_message = "Maaf, pencarian dokumen menghadapi masalah." if language == "BM" else "Sorry, document search is experiencing issues."
+        try:
+            self._breakers[table_id].check()
+            with span("jamai", desc=table_id, mode="batch"):
+                # One admission slot for the whole batch: it is a single Action Table request
+                async with admission_controller.admit(clinic_id_for_name(clinic_name), PRIORITY_FAQ):
+                    rows = await self._add_action_rows(
+                        table_id,
+                        [{"question": question, "clinic_name": clinic_name} for question in unique_questions]
+                    )
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            logger.error(f"Error in batch pdf_sop_answering for clinic {clinic_name}: {str(e)}")
+            for indices in pending.values():
+                for index in indices:
+                    yield index, {"response": fallback_message, "source_document": "", "cached": False,
+                                  "error": "Document search failed"}
+            return
+
+        for position, (question, indices) in enumerate(zip(unique_questions, pending.values())):
+            row = rows[position] if position < len(rows) else None
+            response = row.columns.get("response") if row is not None else None
+            if response is None or not response.text:
+                logger.warning(f"SOP QnA batch row {position} for clinic {clinic_name} has no response")
+                self._metrics[table_id].missing_column("response")
+                result = {"response": "No answer found in documents", "source_document": "", "cached": False,
+                          "error": "No answer generated"}
+            else:
+                source_doc = row.columns.get("source_doc")
+                answer = {"response": response.text, "source_document": source_doc.text if source_doc else ""}
+                await self._remember_sop_answer(clinic_name, question, language, answer)
+                result = {**answer, "cached": False, "error": None}
+            for index in indices:
+                yield index, result
+
+    async def batch_pdf_sop_answering(self, clinic_name: str, questions: List[str], language: str = "BM",
+                                      use_cache: bool = True):
+        """Collect iter_batch_pdf_sop_answering into a list of results in question order."""
+        results: List[Dict] = [None] * len(questions)
+        async for index, result in self.iter_batch_pdf_sop_answering(clinic_name, questions, language, use_cache):
+            results[index] = result
+        return results
+
+    async def medication_lookup_staff(self, clinic_name: str, user_input: str, drug_name: str = None):
         """
         C. Medical Lookup Action Table (Staff Only)
         Strict Input: user_input (str), clinic_name (str)
         Strict Output: drug_entry (str json format), medication_message (str)
+        Simple stock lookups are answered from the local medication index first;
+        pass drug_name when the caller already knows which drug is meant.
+        Brand names and abbreviations ("panadol", "pcm") are rewritten to the generic name for the
+        local index, the answer store key and single-flight, so "pcm" and "paracetamol" share one
+        Action Table call and one stored answer; misspellings are never rewritten.
+        The Action Table still receives the question as typed.
+        Action Table answers are kept in the shared answer store for ANSWER_STORE_MEDICATION_TTL_SECONDS.
         """
+        canonical_input = drug_resolver.canonicalize(user_input)
+        if drug_name:
+            record = medication_index.lookup(clinic_name, drug_name)
+            canonical = drug_resolver.exact_match(drug_name) if record is None else None
+            if canonical:
+                record = medication_index.lookup(clinic_name, canonical)
+        else:
+            # Try the text as typed first so brand names keep their specific product
+            record = medication_index.answer_question(clinic_name, user_input)
+            if record is None and canonical_input != normalize_drug_name(user_input):
+                record = medication_index.answer_question(clinic_name, canonical_input)
+        if record is not None:
+            return record.as_result()
+
+        stored = await answer_store.get(NAMESPACE_MEDICATION, clinic_name, canonical_input)
+        if stored is not None:
+            return {**stored, "answered_from": "answer_store"}
+
         try:
             # Add row to Action Table using the working pattern from test_action.py
-            response = self.client.table.add_table_rows(
-                table_type='action',
-                request=p.RowAddRequest(
-                    table_id=settings.ACTION_TABLE_LOOKUP,  # "Medical Lookup"
-                    data=[{
-                        "user_input": user_input,
-                        "clinic_name": clinic_name
-                    }],
-                    stream=False
-                )
+            row = await self._add_action_row_once(
+                settings.ACTION_TABLE_LOOKUP,  # "Medical Lookup"
+                {
+                    "user_input": user_input,
+                    "clinic_name": clinic_name
+                },
+                priority=PRIORITY_STAFF,
+                coalesce_row={"user_input": canonical_input, "clinic_name": clinic_name}
             )
             
             # Extract outputs using direct column access like test_action.py
-            if response.rows and len(response.rows) > 0:
-                row = response.rows[0]
-                
+            if row is not None:
                 # Access columns directly as in working test
                 drug_data = row.columns["drug_entry"].text
                 ai_message = row.columns["medication_message"].text
                 
+                await answer_store.set(
+                    NAMESPACE_MEDICATION, clinic_name, canonical_input, "",
+                    {"drug_entry": drug_data, "medication_message": ai_message},
+                    ttl_seconds=settings.ANSWER_STORE_MEDICATION_TTL_SECONDS
+                )
                 return {
                     "drug_entry": drug_data,
-                    "medication_message": ai_message
+                    "medication_message": ai_message,
+                    "answered_from": "action_table"
                 }
                         
             return {
                 "drug_entry": "{}",
-                "medication_message": "No medication information found"
+                "medication_message": "No medication information found",
+                "answered_from": "action_table"
             }
             
+        except AdmissionRejected:
+            raise
         except Exception as e:
             logger.error(f"Error in medication_lookup_staff for clinic {clinic_name}: {str(e)}")
             return {
                 "drug_entry": "{}",
-                "medication_message": f"Error checking medication: {str(e)}"
+                "medication_message": f"Error checking medication: {str(e)}",
+                "answered_from": "action_table"
             }
 
     # Legacy methods for backward compatibility
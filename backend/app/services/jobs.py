@@ -0,0 +1,374 @@
+# Background jobs for long Action Table chains: bounded worker pool, polling, webhooks, result retention
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import logging
+import math
+import socket
+import time
+import uuid
+
+import httpx
+import orjson
+from fastapi import HTTPException
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+def is_public_address(address: str) -> bool:
+    """False for private, loopback, link-local, reserved, multicast and unspecified addresses."""
+    ip = ipaddress.ip_address(address.split("%", 1)[0])  # drop an IPv6 zone id
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+@dataclass
+class Job:
+    job_id: str
+    kind: str
+    clinic_id: str
+    created_at: float
+    webhook_url: Optional[str] = None
+    idempotency_key: Optional[str] = None
+    status: str = JOB_QUEUED
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[Dict[str, Any]] = None
+    webhook_status: Optional[str] = None  # pending, delivered, failed
+    webhook_attempts: int = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JOB_SUCCEEDED, JOB_FAILED)
+
+    def view(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "clinic_id": self.clinic_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+            "webhook": {
+                "status": self.webhook_status,
+                "attempts": self.webhook_attempts,
+            } if self.webhook_url else None,
+        }
+
+
+class JobManager:
+    """
+    Runs submitted coroutines on `workers` background tasks so the HTTP request can return at once.
+    - At most `max_pending` jobs wait in the queue; beyond that submit() raises 503 with Retry-After.
+    - Finished jobs are kept for `result_ttl_seconds`, and at most `max_retained` jobs are held
+      in total (the oldest finished ones are evicted first; queued/running jobs are never evicted).
+    - A resubmission with the same idempotency key returns the existing job instead of running
+      the chain again (mobile clients retry after dropped connections).
+    - Webhooks receive the final job view as JSON, signed with HMAC-SHA256 when a secret is set,
+      and are retried on connection errors, 429 and 5xx. They are refused unless the host is in
+      `webhook_allowed_hosts` ("*" allows any host), and the host must resolve only to public
+      addresses (unless `webhook_allow_private`), checked on submit and again before each delivery.
+    - close() (app shutdown) lets queued and running jobs and pending webhooks finish for up to
+      `shutdown_grace_seconds`, then cancels the rest, fails their jobs and closes the webhook client.
+    Jobs and idempotency keys live in this process only: with several uvicorn workers or replicas,
+    GET /jobs/{job_id} must reach the process that accepted the job (sticky routing), or it is a 404.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_pending: int,
+        result_ttl_seconds: float,
+        max_retained: int,
+        webhook_timeout_seconds: float,
+        webhook_max_attempts: int,
+        webhook_secret: str = "",
+        webhook_allowed_hosts: str = "",
+        webhook_allow_private: bool = False,
+        shutdown_grace_seconds: float = 10.0,
+    ):
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.result_ttl_seconds = result_ttl_seconds
+        self.max_retained = max(self.workers + self.max_pending, max_retained)
+        self.webhook_timeout_seconds = webhook_timeout_seconds
+        self.webhook_max_attempts = max(1, webhook_max_attempts)
+        self.webhook_secret = webhook_secret
+        self.webhook_allowed_hosts = {h.strip().lower() for h in webhook_allowed_hosts.split(",") if h.strip()}
+        self.webhook_allow_private = webhook_allow_private
+        self.shutdown_grace_seconds = shutdown_grace_seconds
+
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._idempotency: Dict[str, str] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._webhook_tasks: set = set()
+        self._http: Optional[httpx.AsyncClient] = None
+
+        # Metrics
+        self.submitted = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.evicted = 0
+        self.webhooks_delivered = 0
+        self.webhooks_failed = 0
+        self.total_run_seconds = 0.0
+
+    async def validate_webhook_url(self, url: str):
+        """Raise ValueError unless `url` is an absolute http(s) URL on an allowed host with public addresses."""
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            raise ValueError("webhook_url must be an absolute http(s) URL")
+        if not self.webhook_allowed_hosts:
+            raise ValueError("Webhooks are not enabled on this server")
+        host = parsed.hostname.lower()
+        if "*" not in self.webhook_allowed_hosts and host not in self.webhook_allowed_hosts:
+            raise ValueError(f"webhook host '{parsed.hostname}' is not allowed")
+        if self.webhook_allow_private:
+            return
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        try:
+            addresses = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except (socket.gaierror, UnicodeError):
+            raise ValueError(f"webhook host '{parsed.hostname}' could not be resolved")
+        if not addresses or not all(is_public_address(info[4][0]) for info in addresses):
+            raise ValueError(f"webhook host '{parsed.hostname}' does not resolve to a public address")
+
+    async def submit(
+        self,
+        kind: str,
+        clinic_id: str,
+        run: Callable[[], Awaitable[Dict[str, Any]]],
+        webhook_url: Optional[str] = None,
+        idempotency_key: Optional[str] = None,
+    ) -> Job:
+        """Queue `run` and return its job; `run` returns the JSON-ready result dict."""
+        self._evict()
+        scoped_key = f"{kind}:{clinic_id}:{idempotency_key}" if idempotency_key else None
+        if scoped_key:
+            existing = self._jobs.get(self._idempotency.get(scoped_key, ""))
+            if existing is not None:
+                self.deduplicated += 1
+                return existing
+        if webhook_url:
+            await self.validate_webhook_url(webhook_url)
+
+        self._ensure_workers()
+        if self._queue.full():
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Job queue is full, please retry later",
+                headers={"Retry-After": str(self._retry_after())}
+            )
+
+        job = Job(
+            job_id=uuid.uuid4().hex,
+            kind=kind,
+            clinic_id=clinic_id,
+            created_at=time.time(),
+            webhook_url=webhook_url,
+            idempotency_key=scoped_key,
+            webhook_status="pending" if webhook_url else None,
+        )
+        self._jobs[job.job_id] = job
+        if scoped_key:
+            self._idempotency[scoped_key] = job.job_id
+        self._queue.put_nowait((job, run))
+        self.submitted += 1
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._evict()
+        return self._jobs.get(job_id)
+
+    def _ensure_workers(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._worker_tasks = [t for t in self._worker_tasks if not t.done()]
+        loop = asyncio.get_running_loop()
+        while len(self._worker_tasks) < self.workers:
+            self._worker_tasks.append(loop.create_task(self._worker()))
+
+    async def _worker(self):
+        while True:
+            job, run = await self._queue.get()
+            try:
+                await self._run(job, run)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job, run: Callable[[], Awaitable[Dict[str, Any]]]):
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = await run()
+            job.status = JOB_SUCCEEDED
+            self.succeeded += 1
+        except HTTPException as e:
+            job.error = {"status_code": e.status_code, "detail": e.detail}
+            job.status = JOB_FAILED
+            self.failed += 1
+        except Exception as e:
+            logger.error(f"Job {job.job_id} ({job.kind}) failed: {str(e)}")
+            job.error = {"status_code": 500, "detail": f"Error processing {job.kind}: {str(e)}"}
+            job.status = JOB_FAILED
+            self.failed += 1
+        finally:
+            job.finished_at = time.time()
+            self.total_run_seconds += job.finished_at - job.started_at
+
+        if job.webhook_url:
+            task = asyncio.get_running_loop().create_task(self._deliver_webhook(job))
+            # Keep a reference so the task is not garbage collected mid-flight
+            self._webhook_tasks.add(task)
+            task.add_done_callback(self._webhook_tasks.discard)
+
+    async def _deliver_webhook(self, job: Job):
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=self.webhook_timeout_seconds)
+        body = orjson.dumps(job.view())
+        headers = {"Content-Type": "application/json", "X-MediFlow-Job-Id": job.job_id}
+        if self.webhook_secret:
+            signature = hmac.new(self.webhook_secret.encode(), body, hashlib.sha256).hexdigest()
+            headers["X-MediFlow-Signature"] = f"sha256={signature}"
+
+        for attempt in range(self.webhook_max_attempts):
+            job.webhook_attempts = attempt + 1
+            try:
+                # DNS may have changed since submit; redirects are not followed
+                await self.validate_webhook_url(job.webhook_url)
+            except ValueError as e:
+                logger.warning(f"Webhook for job {job.job_id} refused: {str(e)}")
+                job.webhook_status = "failed"
+                break
+            try:
+                response = await self._http.post(job.webhook_url, content=body, headers=headers)
+                if response.status_code < 500 and response.status_code != 429:
+                    job.webhook_status = "delivered" if response.is_success else "failed"
+                    break
+                reason = f"HTTP {response.status_code}"
+            except httpx.HTTPError as e:
+                reason = type(e).__name__
+            logger.warning(f"Webhook for job {job.job_id} failed (attempt {attempt + 1}): {reason}")
+            if attempt + 1 < self.webhook_max_attempts:
+                await asyncio.sleep(min(2 ** attempt, 30))
+        else:
+            job.webhook_status = "failed"
+
+        if job.webhook_status == "delivered":
+            self.webhooks_delivered += 1
+        else:
+            self.webhooks_failed += 1
+
+    async def close(self):
+        """Drain the queue and webhooks for up to `shutdown_grace_seconds`, then cancel what is left."""
+        if self._queue is not None and self._worker_tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=self.shutdown_grace_seconds)
+            except asyncio.TimeoutError:
+                logger.warning(f"Job shutdown: cancelling {self._queue.qsize()} queued jobs and running ones")
+        if self._webhook_tasks:
+            _, pending = await asyncio.wait(set(self._webhook_tasks), timeout=self.shutdown_grace_seconds)
+            if pending:
+                logger.warning(f"Job shutdown: cancelling {len(pending)} webhook deliveries")
+
+        tasks = [*self._worker_tasks, *self._webhook_tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._webhook_tasks.clear()
+        self._queue = None
+        for job in self._jobs.values():
+            if not job.finished:
+                job.error = {"status_code": 503, "detail": "Server shut down before the job finished"}
+                job.status = JOB_FAILED
+                job.finished_at = time.time()
+                self.failed += 1
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def _evict(self):
+        """Drop finished jobs past their TTL, then the oldest finished jobs while over max_retained."""
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and now - job.finished_at > self.result_ttl_seconds
+        ]
+        for job_id in expired:
+            self._remove(job_id)
+        if len(self._jobs) >= self.max_retained:
+            for job_id in [job_id for job_id, job in self._jobs.items() if job.finished]:
+                if len(self._jobs) < self.max_retained:
+                    break
+                self._remove(job_id)
+
+    def _remove(self, job_id: str):
+        job = self._jobs.pop(job_id)
+        if job.idempotency_key and self._idempotency.get(job.idempotency_key) == job_id:
+            del self._idempotency[job.idempotency_key]
+        self.evicted += 1
+
+    def _retry_after(self) -> int:
+        finished = self.succeeded + self.failed
+        average = self.total_run_seconds / finished if finished else 5.0
+        return max(1, math.ceil(average * self._queue.qsize() / self.workers))
+
+    def stats(self) -> Dict[str, Any]:
+        statuses = {JOB_QUEUED: 0, JOB_RUNNING: 0, JOB_SUCCEEDED: 0, JOB_FAILED: 0}
+        for job in self._jobs.values():
+            statuses[job.status] += 1
+        finished = self.succeeded + self.failed
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "retained": len(self._jobs),
+            "max_retained": self.max_retained,
+            "result_ttl_seconds": self.result_ttl_seconds,
+            "by_status": statuses,
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "rejected": self.rejected,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "evicted": self.evicted,
+            "avg_run_seconds": round(self.total_run_seconds / finished, 3) if finished else None,
+            "webhooks_delivered": self.webhooks_delivered,
+            "webhooks_failed": self.webhooks_failed,
+        }
+
+
+job_manager = JobManager(
+    workers=settings.JOB_WORKERS,
+    max_pending=settings.JOB_MAX_PENDING,
+    result_ttl_seconds=settings.JOB_RESULT_TTL_SECONDS,
+    max_retained=settings.JOB_MAX_RETAINED,
+    webhook_timeout_seconds=settings.JOB_WEBHOOK_TIMEOUT_SECONDS,
+    webhook_max_attempts=settings.JOB_WEBHOOK_MAX_ATTEMPTS,
+    webhook_secret=settings.JOB_WEBHOOK_SECRET,
+    webhook_allowed_hosts=settings.JOB_WEBHOOK_ALLOWED_HOSTS,
+    webhook_allow_private=settings.JOB_WEBHOOK_ALLOW_PRIVATE,
+    shutdown_grace_seconds=settings.JOB_SHUTDOWN_GRACE_SECONDS,
+)
@@ -0,0 +1,293 @@
+# In-memory per-clinic medication inventory index (answers stock lookups without an LLM call)
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+import csv
+import json
+import os
+import re
+import logging
+
+from app.core.config import BACKEND_DIR, settings
+
+logger = logging.getLogger(__name__)
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+# Shortest query that may be resolved by prefix (avoids "pa" matching half the shelf)
+MIN_PREFIX_LENGTH = 3
+
+# Questions mentioning these need reasoning, so they go to the Medical Lookup Action Table
+OPEN_ENDED_WORDS = {
+    "alternative", "alternatives", "alternatif", "ganti", "pengganti", "substitute",
+    "side", "effect", "effects", "kesan", "sampingan",
+    "dose", "dosage", "dos", "interaction", "interactions", "interaksi",
+    "safe", "selamat", "pregnant", "hamil", "recommend", "cadang", "cadangan",
+    "why", "kenapa", "compare", "banding", "better", "lebih",
+    "allergic", "allergy", "alahan", "instead",
+}
+
+
+def normalize_drug_name(text: str) -> str:
+    """Lowercase and collapse punctuation so "Cold & Flu Tablets" matches "cold flu tablets"."""
+    return _NON_ALNUM.sub(" ", text.casefold()).strip()
+
+
+@dataclass(frozen=True)
+class DrugRecord:
+    """One inventory row for one clinic, with its API payloads prepared at load time."""
+    english_name: str
+    malay_name: str
+    generic_name: str
+    clinic: str
+    row: Dict[str, str] = field(compare=False, hash=False)
+    drug_entry: str = field(default="{}", compare=False, hash=False)
+    medication_message: str = field(default="", compare=False, hash=False)
+
+    def as_result(self) -> Dict[str, str]:
+        return {
+            "drug_entry": self.drug_entry,
+            "medication_message": self.medication_message,
+            "answered_from": "inventory_index",
+        }
+
+
+class ClinicInventory:
+    """Name index for one clinic: exact lookups via dict, prefix lookups via a sorted key list."""
+
+    def __init__(self, records: List[DrugRecord]):
+        self.records = records
+        self._by_name: Dict[str, List[DrugRecord]] = {}
+        self._brand_names: Dict[str, List[DrugRecord]] = {}
+        for record in records:
+            for name in (record.english_name, record.malay_name):
+                self._add(self._brand_names, name, record)
+            for name in (record.english_name, record.malay_name, record.generic_name):
+                self._add(self._by_name, name, record)
+        self._sorted_keys = sorted(self._by_name)
+        self.max_name_words = max((len(key.split()) for key in self._by_name), default=0)
+
+    @staticmethod
+    def _add(index: Dict[str, List[DrugRecord]], name: str, record: DrugRecord):
+        key = normalize_drug_name(name)
+        if key and record not in index.setdefault(key, []):
+            index[key].append(record)
+
+    def names(self) -> Iterable[str]:
+        return self._sorted_keys
+
+    def exact(self, key: str) -> Optional[DrugRecord]:
+        matches = self._by_name.get(key, [])
+        if len(matches) > 1:
+            # A generic shared by several products; a brand name match is unambiguous
+            matches = self._brand_names.get(key, [])
+        return matches[0] if len(matches) == 1 else None
+
+    def prefix(self, key: str) -> Optional[DrugRecord]:
+        if len(key) < MIN_PREFIX_LENGTH:
+            return None
+        matches = []
+        i = bisect_left(self._sorted_keys, key)
+        while i < len(self._sorted_keys) and self._sorted_keys[i].startswith(key):
+            for record in self._by_name[self._sorted_keys[i]]:
+                if record not in matches:
+                    matches.append(record)
+            i += 1
+        return matches[0] if len(matches) == 1 else None
+
+
+class MedicationIndex:
+    """
+    Per-clinic index over the medication CSVs that scripts/upload_knowledge.py sends to
+    KNOWLEDGE_TABLE_MEDS. Answers simple stock/price/location questions locally; anything
+    ambiguous or open-ended returns None so the caller can use the Medical Lookup chain.
+    """
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        self._clinics: Dict[str, ClinicInventory] = {}
+        self.files_loaded: List[str] = []
+        self.version = 0  # Bumped on every reload so dependent indexes know to rebuild
+        self.hits = 0
+        self.misses = 0
+        self.reload()
+
+    def reload(self) -> int:
+        """Rebuild the index from every CSV in data_dir. Returns the number of rows indexed."""
+        rows_by_clinic: Dict[str, List[Dict[str, str]]] = {}
+        files_loaded = []
+        if os.path.isdir(self.data_dir):
+            for filename in sorted(os.listdir(self.data_dir)):
+                if not filename.lower().endswith(".csv"):
+                    continue
+                file_path = os.path.join(self.data_dir, filename)
+                try:
+                    for row in _read_inventory_csv(file_path):
+                        rows_by_clinic.setdefault(_clinic_key(row["clinic"]), []).append(row)
+                    files_loaded.append(filename)
+                except (OSError, csv.Error, KeyError) as e:
+                    logger.error(f"Skipping medication CSV {filename}: {str(e)}")
+        else:
+            logger.warning(f"Medication data directory '{self.data_dir}' not found; all lookups use the Action Table.")
+
+        self._clinics = {
+            clinic: ClinicInventory(_build_records(rows))
+            for clinic, rows in rows_by_clinic.items()
+        }
+        self.files_loaded = files_loaded
+        self.version += 1
+        total = sum(len(inv.records) for inv in self._clinics.values())
+        if total:
+            logger.info(f"Medication index loaded {total} items for {len(self._clinics)} clinics")
+        elif os.path.isdir(self.data_dir):
+            logger.warning(f"Medication index loaded no items from '{self.data_dir}'; all lookups use the Action Table.")
+        return total
+
+    def all_records(self) -> Iterable[DrugRecord]:
+        for inventory in self._clinics.values():
+            yield from inventory.records
+
+    def inventory(self, clinic_name: str) -> Optional[ClinicInventory]:
+        return self._clinics.get(_clinic_key(clinic_name))
+
+    def lookup(self, clinic_name: str, drug_name: str) -> Optional[DrugRecord]:
+        """Exact, then unambiguous prefix match of a drug name for one clinic."""
+        inventory = self.inventory(clinic_name)
+        record = None
+        if inventory is not None:
+            key = normalize_drug_name(drug_name)
+            record = inventory.exact(key) or inventory.prefix(key)
+        self._count(record)
+        return record
+
+    def answer_question(self, clinic_name: str, question: str) -> Optional[DrugRecord]:
+        """
+        Find the single drug a free-text staff question is about, e.g. "Panadol stock tinggal berapa?".
+        Returns None for open-ended questions or when zero or several drugs are mentioned.
+        """
+        inventory = self.inventory(clinic_name)
+        words = normalize_drug_name(question).split()
+        if inventory is None or not words or OPEN_ENDED_WORDS.intersection(words):
+            self._count(None)
+            return None
+
+        found: List[DrugRecord] = []
+        i = 0
+        while i < len(words):
+            # Prefer the longest drug name starting at this word ("vitamin c" over "vitamin")
+            for size in range(min(inventory.max_name_words, len(words) - i), 0, -1):
+                record = inventory.exact(" ".join(words[i:i + size]))
+                if record is not None:
+                    if record not in found:
+                        found.append(record)
+                    i += size
+                    break
+            else:
+                i += 1
+
+        record = found[0] if len(found) == 1 else None
+        self._count(record)
+        return record
+
+    def _count(self, record: Optional[DrugRecord]):
+        if record is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "data_dir": self.data_dir,
+            "files_loaded": self.files_loaded,
+            "clinics": {inv.records[0].clinic: len(inv.records) for inv in self._clinics.values() if inv.records},
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def _clinic_key(clinic_name: str) -> str:
+    return " ".join(clinic_name.casefold().split())
+
+
+def _read_inventory_csv(file_path: str) -> Iterable[Dict[str, str]]:
+    with open(file_path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            if row.get("english_name") and row.get("clinic"):
+                yield {k.strip(): (v or "").strip() for k, v in row.items() if k}
+
+
+def _build_records(rows: List[Dict[str, str]]) -> List[DrugRecord]:
+    by_category: Dict[str, List[Dict[str, str]]] = {}
+    for row in rows:
+        by_category.setdefault(row.get("category", ""), []).append(row)
+
+    records = []
+    for row in rows:
+        alternatives = sorted(
+            (r for r in by_category[row.get("category", "")] if r is not row and _to_number(r.get("stock_quantity")) > 0),
+            key=lambda r: -_to_number(r.get("stock_quantity")),
+        )[:3]
+        records.append(DrugRecord(
+            english_name=row["english_name"],
+            malay_name=row.get("malay_name", ""),
+            generic_name=row.get("generic_name", ""),
+            clinic=row["clinic"],
+            row=row,
+            drug_entry=json.dumps(_drug_entry(row, alternatives), ensure_ascii=False),
+            medication_message=_medication_message(row),
+        ))
+    return records
+
+
+def _drug_entry(row: Dict[str, str], alternatives: List[Dict[str, str]]) -> Dict[str, object]:
+    stock = _to_number(row.get("stock_quantity"))
+    reorder_level = _to_number(row.get("reorder_level"))
+    return {
+        "drug_name": row["english_name"],
+        "malay_name": row.get("malay_name", ""),
+        "generic_name": row.get("generic_name", ""),
+        "stock_quantity": stock,
+        "unit": row.get("unit", ""),
+        "price_rm": _to_number(row.get("price_rm")),
+        "reorder_level": reorder_level,
+        "low_stock": stock <= reorder_level,
+        "category": row.get("category", ""),
+        "common_uses": row.get("common_uses", ""),
+        "location": row.get("location", ""),
+        "supplier": row.get("supplier", ""),
+        "expiry_date": row.get("expiry_date", ""),
+        "clinic": row["clinic"],
+        "alternatives": [
+            {
+                "drug_name": alt["english_name"],
+                "generic_name": alt.get("generic_name", ""),
+                "stock_quantity": _to_number(alt.get("stock_quantity")),
+                "location": alt.get("location", ""),
+            }
+            for alt in alternatives
+        ],
+    }
+
+
+def _medication_message(row: Dict[str, str]) -> str:
+    name = row["english_name"]
+    if row.get("generic_name") and row["generic_name"].casefold() != name.casefold():
+        name += f" ({row['generic_name']})"
+    message = (
+        f"{name}: {row.get('stock_quantity', '?')} {row.get('unit', '')} in stock at "
+        f"{row.get('location', 'unknown location')}, RM{row.get('price_rm', '?')} each."
+    )
+    if _to_number(row.get("stock_quantity")) <= _to_number(row.get("reorder_level")):
+        message += f" Stock is at or below the reorder level ({row.get('reorder_level')}), please reorder."
+    return message
+
+
+def _to_number(value: Optional[str]) -> float:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0
+    return int(number) if number.is_integer() else number
+
+
+medication_index = MedicationIndex(os.path.join(BACKEND_DIR, settings.MEDICATION_DATA_DIR))
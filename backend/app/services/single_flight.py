@@ -0,0 +1,50 @@
+# Single-flight coalescing of identical in-flight JamAI calls
+from typing import Any, Awaitable, Callable, Dict, Hashable
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time. Callers arriving while a call with the
+    same key is in flight await that call's result (or exception) instead of starting
+    their own.
+
+    The shared call runs in its own task, so one waiter disconnecting does not cancel
+    it for everybody else.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.get_running_loop().create_task(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda finished, key=key: self._forget(key, finished))
+        else:
+            self.followers += 1
+
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, finished: asyncio.Task):
+        if self._calls.get(key) is finished:
+            del self._calls[key]
+        # Mark the exception as retrieved if every waiter went away before it was raised
+        if not finished.cancelled():
+            finished.exception()
+
+    def stats(self) -> Dict[str, int]:
+        calls = self.leaders + self.followers
+        return {
+            "in_flight": len(self._calls),
+            "calls_started": self.leaders,
+            "calls_coalesced": self.followers,
+            "coalesce_rate": round(self.followers / calls, 4) if calls else 0.0,
+        }
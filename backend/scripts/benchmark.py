@@ -0,0 +1,378 @@
+# End-to-end load benchmark for the patient and staff APIs
+#
+# In-process against the offline JamAI stand-in (no network, no JamAI credits):
+#   python scripts/benchmark.py --concurrency 50 --duration 30 --jamai-profile realistic
+# Against a running server (e.g. one started with JAMAI_BASE_URL pointing at scripts/fake_jamai.py):
+#   python scripts/benchmark.py --url http://localhost:8000 --concurrency 20 --requests 2000
+# Compare with an earlier run:
+#   python scripts/benchmark.py --compare benchmark_results/bench-20250101T120000.json
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Dummy credentials so app settings load without a real .env
+os.environ.setdefault("JAMAI_API_KEY", "benchmark")
+os.environ.setdefault("JAMAI_PROJECT_ID", "benchmark")
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+STAFF_HEADERS = {"X-Clinic-Code": os.getenv("CLINIC_SECRET_CODE", "MEDIFLOW-ADMIN-2024")}
+CLINIC_IDS = ["clinic_001", "clinic_002", "clinic_003"]
+
+# Default traffic mix (relative weights), roughly what the app sees: mostly FAQ chat
+DEFAULT_MIX = {
+    "chat": 50,
+    "appointment": 15,
+    "triage": 10,
+    "clinics": 15,
+    "medication_lookup": 10,
+}
+
+_QUESTIONS = [
+    ("Pukul berapa klinik dibuka?", "BM"),
+    ("Adakah klinik buka pada hari Ahad?", "BM"),
+    ("Berapa kos konsultasi?", "BM"),
+    ("Perlu bawa dokumen apa untuk pendaftaran?", "BM"),
+    ("What are the clinic opening hours?", "EN"),
+    ("Do you accept walk-in patients?", "EN"),
+    ("Is there parking near the clinic?", "EN"),
+    ("Can I get a medical certificate?", "EN"),
+]
+_SYMPTOMS = [
+    "Demam dan batuk sejak 3 hari",
+    "Sakit kepala dan loya",
+    "Fever and sore throat since yesterday",
+    "Routine check-up for blood pressure",
+    "Chest pain and shortness of breath",
+    "Ruam kulit dan gatal",
+]
+_DRUGS = ["Panadol", "Paracetamol", "pcm", "panadl", "Ibuprofen", "Cough Syrup", "Vitamin C", "Piriton"]
+
+
+@dataclass
+class Scenario:
+    """One endpoint in the mix: builds a request (method, path, kwargs) for a given request number."""
+    name: str
+    build: Callable[[int, random.Random, float], Tuple[str, str, dict]]
+
+
+def _maybe_unique(text: str, n: int, rng: random.Random, unique_ratio: float) -> str:
+    # A share of requests carry a unique suffix so they miss every answer cache
+    return f"{text} (#{n})" if rng.random() < unique_ratio else text
+
+
+def _chat(n, rng, unique_ratio):
+    question, language = rng.choice(_QUESTIONS)
+    return "POST", "/api/v1/patients/chat", {"json": {
+        "clinic_id": rng.choice(CLINIC_IDS),
+        "message": _maybe_unique(question, n, rng, unique_ratio),
+        "language": language,
+    }}
+
+
+def _appointment(n, rng, unique_ratio):
+    return "POST", "/api/v1/patients/appointment", {"json": {
+        "clinic_id": rng.choice(CLINIC_IDS),
+        "message": _maybe_unique(rng.choice(_SYMPTOMS), n, rng, unique_ratio),
+        "language": rng.choice(["BM", "EN"]),
+    }}
+
+
+def _triage(n, rng, unique_ratio):
+    return "POST", "/api/v1/patients/triage", {"json": {
+        "clinic_id": rng.choice(CLINIC_IDS),
+        "symptoms": _maybe_unique(rng.choice(_SYMPTOMS), n, rng, unique_ratio),
+        "patient_age": rng.randint(1, 90),
+    }}
+
+
+def _clinics(n, rng, unique_ratio):
+    return "GET", "/api/v1/clinics", {}
+
+
+def _medication_lookup(n, rng, unique_ratio):
+    return "GET", "/api/v1/staff/medication-lookup", {
+        "params": {"clinic_id": rng.choice(CLINIC_IDS), "drug_name": rng.choice(_DRUGS)},
+        "headers": STAFF_HEADERS,
+    }
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "chat": Scenario("chat", _chat),
+    "appointment": Scenario("appointment", _appointment),
+    "triage": Scenario("triage", _triage),
+    "clinics": Scenario("clinics", _clinics),
+    "medication_lookup": Scenario("medication_lookup", _medication_lookup),
+}
+
+
+@dataclass
+class EndpointResult:
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    status_codes: Dict[str, int] = field(default_factory=dict)
+
+    def record(self, seconds: float, status: str, ok: bool):
+        self.latencies.append(seconds)
+        self.status_codes[status] = self.status_codes.get(status, 0) + 1
+        if not ok:
+            self.errors += 1
+
+    def summary(self, elapsed: float) -> Dict[str, object]:
+        ordered = sorted(self.latencies)
+        count = len(ordered)
+        return {
+            "requests": count,
+            "rps": round(count / elapsed, 2) if elapsed else 0.0,
+            "error_rate": round(self.errors / count, 4) if count else 0.0,
+            "p50_ms": _percentile_ms(ordered, 50),
+            "p95_ms": _percentile_ms(ordered, 95),
+            "p99_ms": _percentile_ms(ordered, 99),
+            "max_ms": round(ordered[-1] * 1000, 2) if ordered else None,
+            "status_codes": dict(sorted(self.status_codes.items())),
+        }
+
+
+def _percentile_ms(ordered: List[float], percentile: float) -> Optional[float]:
+    # Nearest-rank percentile over sorted samples
+    if not ordered:
+        return None
+    rank = max(1, -(-len(ordered) * percentile // 100))
+    return round(ordered[int(rank) - 1] * 1000, 2)
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """"chat=60,clinics=40" -> weights; unknown endpoints are rejected."""
+    if not spec:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown endpoint '{name}' in --mix (choose from {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def run_benchmark(client: httpx.AsyncClient, mix: Dict[str, float], concurrency: int,
+                        duration: float = None, total_requests: int = None, warmup: int = 0,
+                        unique_ratio: float = 0.3, seed: int = 42) -> Dict[str, object]:
+    """
+    Closed-loop load: `concurrency` workers each send one request at a time until the duration
+    or request budget runs out. Returns per-endpoint and overall results.
+    """
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    results = {name: EndpointResult() for name in names}
+    overall = EndpointResult()
+    counter = 0
+
+    async def send(n: int, name: str) -> Tuple[float, str, bool]:
+        method, path, kwargs = SCENARIOS[name].build(n, rng, unique_ratio)
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+            await response.aread()
+            status, ok = str(response.status_code), response.status_code < 400
+        except Exception as e:
+            status, ok = type(e).__name__, False
+        return time.perf_counter() - start, status, ok
+
+    # Warm-up requests fill caches and connection pools; they are not measured
+    for n in range(warmup):
+        await send(n, rng.choices(names, weights)[0])
+
+    deadline = time.perf_counter() + duration if duration else None
+
+    async def worker():
+        nonlocal counter
+        while True:
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            if total_requests is not None and counter >= total_requests:
+                return
+            counter += 1
+            name = rng.choices(names, weights)[0]
+            seconds, status, ok = await send(warmup + counter, name)
+            results[name].record(seconds, status, ok)
+            overall.record(seconds, status, ok)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "elapsed_seconds": round(elapsed, 3),
+        "overall": overall.summary(elapsed),
+        "endpoints": {name: result.summary(elapsed) for name, result in results.items() if result.latencies},
+    }
+
+
+def print_report(report: Dict[str, object], baseline: Dict[str, object] = None):
+    header = f"{'endpoint':<20}{'requests':>9}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}"
+    print(header)
+    print("-" * len(header))
+    rows = list(report["results"]["endpoints"].items()) + [("overall", report["results"]["overall"])]
+    base_rows = {}
+    if baseline:
+        base_rows = dict(baseline["results"]["endpoints"], overall=baseline["results"]["overall"])
+    for name, stats in rows:
+        print(
+            f"{name:<20}{stats['requests']:>9}{stats['rps']:>9.1f}{_fmt(stats['p50_ms']):>10}"
+            f"{_fmt(stats['p95_ms']):>10}{_fmt(stats['p99_ms']):>10}{stats['error_rate'] * 100:>8.1f}%"
+        )
+        base = base_rows.get(name)
+        if base:
+            print(
+                f"{'  vs baseline':<20}{'':>9}{_delta(stats['rps'], base['rps']):>9}"
+                f"{_delta(stats['p50_ms'], base['p50_ms']):>10}{_delta(stats['p95_ms'], base['p95_ms']):>10}"
+                f"{_delta(stats['p99_ms'], base['p99_ms']):>10}"
+            )
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+def _delta(current: Optional[float], previous: Optional[float]) -> str:
+    if not current or not previous:
+        return "-"
+    return f"{(current - previous) / previous * 100:+.0f}%"
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+async def main(args):
+    mix = parse_mix(args.mix)
+    config = {
+        "target": args.url or "in-process",
+        "mix": mix,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "requests": args.requests,
+        "warmup": args.warmup,
+        "unique_ratio": args.unique_ratio,
+        "seed": args.seed,
+    }
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout,
+                                   limits=httpx.Limits(max_connections=args.concurrency))
+    else:
+        # One in-process "clinic fleet" would spend most of its time on 429s from the per-clinic
+        # token buckets, which measures ADMISSION_RATE_PER_SECOND rather than the code path
+        os.environ["ADMISSION_ENABLED"] = "true" if args.admission else "false"
+        # Fresh answer store per run, outside backend/data: answers left by earlier runs would turn misses into hits
+        os.environ["ANSWER_STORE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="mediflow-bench-"), "answers.sqlite3")
+        # Real app, real JamAIService code path; only the JamAI HTTP API is replaced
+        from fake_jamai import PROFILES, fake_jamai_client
+        from app.main import app
+        from app.core.config import settings
+        from app.services.jamai_services import jamai_service
+
+        overrides = {}
+        if args.jamai_median is not None:
+            overrides["median_seconds"] = args.jamai_median
+        if args.jamai_error_rate is not None:
+            overrides["error_rate"] = args.jamai_error_rate
+        jamai_service.client = fake_jamai_client(profile=args.jamai_profile, **overrides)
+        config["jamai_profile"] = {"name": args.jamai_profile, **overrides}
+        config["settings"] = {
+            name: getattr(settings, name) for name in (
+                "ACTION_TABLE_TRIAGE_CONCURRENCY", "ACTION_TABLE_LOOKUP_CONCURRENCY",
+                "ACTION_TABLE_SOP_QNA_CONCURRENCY", "ACTION_TABLE_BATCH_WINDOW_MS",
+                "ACTION_TABLE_MAX_BATCH_SIZE", "ANSWER_CACHE_MAX_ENTRIES", "ADMISSION_ENABLED",
+                "ANSWER_STORE_ENABLED", "ANSWER_STORE_PATH",
+            )
+        }
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark",
+                                   timeout=args.timeout)
+
+    print(f"Benchmarking {config['target']} with {args.concurrency} workers "
+          f"({f'{args.duration}s' if args.duration else f'{args.requests} requests'})...")
+    if not args.url:
+        print(f"Admission control {'enabled' if settings.ADMISSION_ENABLED else 'disabled (pass --admission to enable)'}")
+        print(f"Answer store at {settings.ANSWER_STORE_PATH} (fresh for this run)")
+    async with client:
+        results = await run_benchmark(
+            client, mix, args.concurrency,
+            duration=args.duration, total_requests=args.requests, warmup=args.warmup,
+            unique_ratio=args.unique_ratio, seed=args.seed
+        )
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "config": config,
+        "results": results,
+    }
+    if not args.url:
+        fake_stats = jamai_service.client.fake_app.state.stats
+        report["jamai_calls"] = {"requests": fake_stats.requests, "rows": fake_stats.rows, "errors": fake_stats.errors}
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print()
+    print_report(report, baseline)
+    if "jamai_calls" in report:
+        calls = report["jamai_calls"]
+        print(f"\nJamAI calls: {calls['requests']} requests carrying {calls['rows']} rows ({calls['errors']} injected errors)")
+
+    output = args.output or os.path.join(
+        "benchmark_results", f"bench-{datetime.now().strftime('%Y%m%dT%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end load benchmark for the MediFlow API")
+    parser.add_argument("--url", help="Benchmark a running server instead of the app in-process")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent workers (default: 20)")
+    parser.add_argument("--duration", type=float, help="Seconds to run (default: 20 unless --requests is given)")
+    parser.add_argument("--requests", type=int, help="Total requests to send instead of a fixed duration")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured warm-up requests (default: 20)")
+    parser.add_argument("--mix", help='Endpoint weights, e.g. "chat=50,appointment=15,triage=10,clinics=15,medication_lookup=10"')
+    parser.add_argument("--unique-ratio", type=float, default=0.3,
+                        help="Share of chat/booking requests with unique text that bypass caches (default: 0.3)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for a reproducible request sequence")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--jamai-profile", default="realistic", help="Fake JamAI latency profile (in-process only)")
+    parser.add_argument("--jamai-median", type=float, help="Override the fake JamAI median latency in seconds")
+    parser.add_argument("--jamai-error-rate", type=float, help="Override the fake JamAI error rate (0-1)")
+    parser.add_argument("--admission", action="store_true",
+                        help="Keep per-clinic admission control on (in-process only; off by default)")
+    parser.add_argument("--output", help="Where to save the JSON results (default: benchmark_results/bench-<time>.json)")
+    parser.add_argument("--compare", help="Earlier results JSON to show deltas against")
+    args = parser.parse_args()
+    if args.duration is None and args.requests is None:
+        args.duration = 20.0
+    asyncio.run(main(args))
@@ -0,0 +1,132 @@
+# Serialization and compression micro-benchmark for representative response payloads
+#
+# Compares the stdlib JSON response class (the FastAPI default before ORJSONResponse) with orjson,
+# and the bytes on the wire for identity / gzip / brotli as sent by CompressionMiddleware:
+#   python scripts/benchmark_serialization.py
+#   python scripts/benchmark_serialization.py --iterations 5000 --output benchmark_results/serialization.json
+
+import os
+import sys
+import json
+import time
+import argparse
+from typing import Callable, Dict, List
+
+# Dummy credentials so app settings load without a real .env
+os.environ.setdefault("JAMAI_API_KEY", "benchmark")
+os.environ.setdefault("JAMAI_PROJECT_ID", "benchmark")
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from app.core.compression import _Encoder, brotli
+from app.core.config import settings
+from app.models.chat import ChatResponse
+from app.services.clinic_registry import clinic_registry
+
+# A typical multilingual SOP answer: BM first, then English, with the clinic's Chinese/Tamil notice
+CHAT_REPLY = (
+    "Untuk temujanji susulan selepas pembedahan kecil, sila datang ke kaunter pendaftaran 15 minit "
+    "lebih awal dan bawa kad pengenalan, kad temujanji serta senarai ubat semasa anda. Jika luka "
+    "menjadi merah, bengkak, bernanah atau anda demam melebihi 38°C, sila hubungi klinik dengan segera "
+    "atau pergi ke Jabatan Kecemasan yang terdekat. Pembalut perlu ditukar setiap 48 jam kecuali "
+    "diarahkan sebaliknya oleh doktor.\n\n"
+    "For a follow-up visit after minor surgery, please arrive at the registration counter 15 minutes "
+    "early and bring your IC, appointment card and a list of your current medications. If the wound "
+    "becomes red, swollen, discharges pus or you have a fever above 38°C, contact the clinic immediately "
+    "or go to the nearest Emergency Department. Dressings should be changed every 48 hours unless your "
+    "doctor advises otherwise.\n\n"
+    "小手术后复诊：请提前15分钟到登记柜台，并携带身份证、预约卡及目前服用的药物清单。"
+    "如伤口发红、肿胀、流脓或发烧超过38°C，请立即联系诊所或前往最近的急诊部。\n\n"
+    "சிறு அறுவை சிகிச்சைக்குப் பிறகு பின்தொடர் வருகைக்கு, 15 நிமிடங்கள் முன்னதாக பதிவு கவுண்டருக்கு "
+    "வந்து, அடையாள அட்டை மற்றும் சந்திப்பு அட்டையைக் கொண்டு வரவும்."
+)
+
+
+def chat_payload() -> ChatResponse:
+    return ChatResponse(reply=CHAT_REPLY, source_document="SOP-Post-Op-Wound-Care-v3.pdf")
+
+
+def clinics_payload() -> List[dict]:
+    return [clinic.public_dump() for clinic in clinic_registry.active_clinics()]
+
+
+def time_per_call(fn: Callable[[], object], iterations: int) -> float:
+    """Best-of-5 mean wall time per call in microseconds (single-threaded, so ~CPU time)."""
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        best = min(best, (time.perf_counter() - start) / iterations)
+    return best * 1e6
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    encoder = _Encoder(encoding, settings.COMPRESSION_GZIP_LEVEL, settings.COMPRESSION_BROTLI_QUALITY)
+    return encoder.compress(body) + encoder.finish()
+
+
+def bench_payload(name: str, content, iterations: int) -> Dict:
+    # Both response classes get the same jsonable_encoder output, as FastAPI does for route results
+    encoded = jsonable_encoder(content)
+    stdlib_body = JSONResponse(encoded).body
+    orjson_body = ORJSONResponse(encoded).body
+    assert json.loads(stdlib_body) == json.loads(orjson_body)
+
+    result = {
+        "payload": name,
+        "serialize_us": {
+            "stdlib_json": round(time_per_call(lambda: JSONResponse(encoded).body, iterations), 2),
+            "orjson": round(time_per_call(lambda: ORJSONResponse(encoded).body, iterations), 2),
+        },
+        "bytes": {"stdlib_json": len(stdlib_body), "identity": len(orjson_body)},
+        "compress_us": {},
+    }
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    for encoding in encodings:
+        result["bytes"][encoding] = len(compress(orjson_body, encoding))
+        result["compress_us"][encoding] = round(
+            time_per_call(lambda: compress(orjson_body, encoding), max(iterations // 10, 100)), 2
+        )
+    result["compressed_by_middleware"] = len(orjson_body) >= settings.COMPRESSION_MIN_SIZE
+    return result
+
+
+def print_result(result: Dict):
+    s, b, c = result["serialize_us"], result["bytes"], result["compress_us"]
+    print(f"\n{result['payload']}")
+    print(f"  serialize  stdlib json {s['stdlib_json']:8.2f} us   orjson {s['orjson']:8.2f} us   "
+          f"({s['stdlib_json'] / s['orjson']:.1f}x)")
+    print(f"  bytes      identity {b['identity']:6d}" + "".join(
+        f"   {enc} {b[enc]:6d} ({100 * b[enc] / b['identity']:.0f}%, {c[enc]:.1f} us)" for enc in c
+    ))
+    if not result["compressed_by_middleware"]:
+        print(f"  below COMPRESSION_MIN_SIZE ({settings.COMPRESSION_MIN_SIZE}): sent uncompressed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON serialization / compression benchmark")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    payloads = {
+        "/api/v1/patients/chat (ChatResponse)": chat_payload(),
+        "/api/v1/patients/clinics (clinic list)": clinics_payload(),
+    }
+    results = [bench_payload(name, content, args.iterations) for name, content in payloads.items()]
+    for result in results:
+        print_result(result)
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
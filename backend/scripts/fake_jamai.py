@@ -0,0 +1,342 @@
+# Offline stand-in for the JamAI Base table API, for load testing without the paid cloud
+#
+# Run it as a server and point the backend at it:
+#   python scripts/fake_jamai.py --port 9100 --profile realistic --error-rate 0.02
+#   JAMAI_BASE_URL=http://localhost:9100 uvicorn app.main:app
+# or inject it in-process:
+#   jamai_service.client = fake_jamai_client(profile="fast")
+
+import os
+import json
+import time
+import math
+import uuid
+import random
+import asyncio
+import argparse
+from dataclasses import dataclass, field, asdict, replace
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from jamaibase import JamAIAsync
+
+load_dotenv()
+
+FAKE_BASE_URL = "http://fake-jamai"
+
+# Same table ids as the backend (app/core/config.py), without needing JamAI credentials
+TABLE_TRIAGE = os.getenv("ACTION_TABLE_TRIAGE", "Appointment Booking")
+TABLE_LOOKUP = os.getenv("ACTION_TABLE_LOOKUP", "Medical Lookup")
+TABLE_SOP_QNA = os.getenv("ACTION_TABLE_SOP_QNA", "SOP QnA")
+
+
+@dataclass
+class LatencyProfile:
+    """
+    How long one Action Table call takes, plus failure behaviour.
+    distribution: "fixed" (always median), "uniform" (median +/- spread), "lognormal" (median, sigma=spread).
+    """
+    distribution: str = "lognormal"
+    median_seconds: float = 1.5
+    spread: float = 0.5
+    per_row_seconds: float = 0.05  # Extra time for each additional row in a batched request
+    max_seconds: float = 30.0
+    error_rate: float = 0.0
+    error_status: int = 500
+    stream_chunk_seconds: float = 0.03  # Gap between streamed chunks
+
+    def sample(self, rows: int = 1) -> float:
+        if self.distribution == "fixed":
+            seconds = self.median_seconds
+        elif self.distribution == "uniform":
+            seconds = random.uniform(self.median_seconds - self.spread, self.median_seconds + self.spread)
+        elif self.distribution == "lognormal":
+            seconds = random.lognormvariate(math.log(max(self.median_seconds, 1e-6)), self.spread)
+        else:
+            raise ValueError(f"Unknown latency distribution '{self.distribution}'")
+        seconds += self.per_row_seconds * max(rows - 1, 0)
+        return min(max(seconds, 0.0), self.max_seconds)
+
+
+PROFILES: Dict[str, LatencyProfile] = {
+    # Near-instant, for measuring backend overhead only
+    "fast": LatencyProfile(distribution="fixed", median_seconds=0.005, spread=0.0, per_row_seconds=0.0,
+                           stream_chunk_seconds=0.0),
+    # Roughly what the LLM chains take in production: ~1.5s median with a long tail
+    "realistic": LatencyProfile(),
+    "slow": LatencyProfile(median_seconds=4.0, spread=0.6),
+    "flaky": LatencyProfile(error_rate=0.05, error_status=503),
+}
+
+
+# --- Canned outputs with the real column shapes ---
+
+_DOCTORS = ["Dr. Aminah", "Dr. Lim", "Dr. Raj"]
+_TIMES = ["09:00 AM", "10:30 AM", "02:00 PM", "04:30 PM"]
+_EMERGENCY_WORDS = ("chest pain", "sakit dada", "bleeding", "berdarah", "pengsan", "faint", "sesak nafas", "breathing")
+_URGENT_WORDS = ("fever", "demam", "headache", "sakit kepala", "vomit", "muntah")
+
+
+def _booking_columns(row: Dict[str, str]) -> Dict[str, str]:
+    text = row.get("user_input", "").casefold()
+    if any(word in text for word in _EMERGENCY_WORDS):
+        case_type, message = "EMERGENCY", "Sila ke unit kecemasan terdekat dengan segera."
+    elif any(word in text for word in _URGENT_WORDS):
+        case_type, message = "URGENT", "Kami cadangkan temujanji hari ini."
+    else:
+        case_type, message = "ROUTINE", "Sila pilih masa temujanji yang sesuai."
+
+    start = date.today() + timedelta(days=1)
+    slots = [
+        {"date": (start + timedelta(days=i // 2)).isoformat(), "time": _TIMES[i % len(_TIMES)],
+         "doctor": _DOCTORS[i % len(_DOCTORS)]}
+        for i in range(4)
+    ]
+    first = slots[0]
+    return {
+        "available_time_slots": json.dumps(slots),
+        "case_type": json.dumps({
+            "case_type": case_type,
+            "booking_needed": case_type != "EMERGENCY",
+            "response_template": message
+        }),
+        "recommended_time": json.dumps({
+            "slot_found": True,
+            "display_date": first["date"],
+            "display_time": first["time"],
+            "doctor": first["doctor"]
+        }),
+        "refined_user_message": message,
+        "booking_record": json.dumps({
+            "clinic_name": row.get("clinic_name", ""),
+            "case_type": case_type,
+            "date": first["date"],
+            "time": first["time"],
+            "doctor": first["doctor"],
+            "status": "pending"
+        })
+    }
+
+
+def _sop_columns(row: Dict[str, str]) -> Dict[str, str]:
+    clinic = row.get("clinic_name", "Klinik")
+    return {
+        "response": (
+            f"{clinic} dibuka Isnin hingga Jumaat, 8:00 pagi hingga 10:00 malam, dan Sabtu 8:00 pagi hingga "
+            f"1:00 petang. Sila bawa kad pengenalan semasa pendaftaran."
+        ),
+        "source_doc": f"{clinic} - SOP Operasi Klinik.pdf (halaman 2)"
+    }
+
+
+def _lookup_columns(row: Dict[str, str]) -> Dict[str, str]:
+    clinic = row.get("clinic_name", "")
+    return {
+        "drug_entry": json.dumps({
+            "drug_name": "Panadol",
+            "generic_name": "Paracetamol",
+            "stock_quantity": 150,
+            "unit": "tablets",
+            "price_rm": 0.15,
+            "reorder_level": 30,
+            "low_stock": False,
+            "location": "SHELF-A1",
+            "clinic": clinic
+        }),
+        "medication_message": "Panadol (Paracetamol): 150 tablets in stock at SHELF-A1, RM0.15 each."
+    }
+
+
+def _output_columns(table_id: str, row: Dict[str, str]) -> Dict[str, str]:
+    """Pick the canned outputs for a table, by configured table id first, then by input columns."""
+    if table_id == TABLE_TRIAGE:
+        return _booking_columns(row)
+    if table_id == TABLE_SOP_QNA or "question" in row:
+        return _sop_columns(row)
+    if table_id == TABLE_LOOKUP:
+        return _lookup_columns(row)
+    return _booking_columns(row)
+
+
+def _completion(text: str, **extra) -> Dict[str, object]:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": extra.pop("object", "chat.completion"),
+        "created": int(time.time()),
+        "model": "fake-jamai/llm",
+        "usage": None,
+        "choices": [{"message": {"role": "assistant", "content": text}, "index": 0, "finish_reason": "stop"}],
+        **extra
+    }
+
+
+# --- Server ---
+
+@dataclass
+class FakeJamAIStats:
+    requests: int = 0
+    rows: int = 0
+    errors: int = 0
+    streams: int = 0
+    by_table: Dict[str, int] = field(default_factory=dict)
+
+
+def create_fake_jamai_app(profile: LatencyProfile = None, table_profiles: Dict[str, LatencyProfile] = None) -> FastAPI:
+    """
+    FastAPI app implementing the JamAI table endpoints JamAIAsync uses:
+    rows/add (normal and streaming) and rows/delete. Latency and errors follow `profile`,
+    or the entry in `table_profiles` for a specific table id.
+    """
+    app = FastAPI(title="Fake JamAI")
+    app.state.profile = profile or PROFILES["realistic"]
+    app.state.table_profiles = dict(table_profiles or {})
+    app.state.stats = FakeJamAIStats()
+
+    def profile_for(table_id: str) -> LatencyProfile:
+        return app.state.table_profiles.get(table_id, app.state.profile)
+
+    def maybe_fail(profile: LatencyProfile) -> Optional[JSONResponse]:
+        if profile.error_rate > 0 and random.random() < profile.error_rate:
+            app.state.stats.errors += 1
+            return JSONResponse(
+                status_code=profile.error_status,
+                content={"message": f"Fake JamAI injected error ({profile.error_status})"}
+            )
+        return None
+
+    @app.get("/api/health")
+    async def health():
+        return {"ok": True}
+
+    @app.post("/api/v1/gen_tables/{table_type}/rows/add")
+    async def add_rows(table_type: str, request: Request):
+        body = await request.json()
+        table_id = body.get("table_id", "")
+        rows: List[Dict[str, str]] = body.get("data", [])
+        profile = profile_for(table_id)
+        stats = app.state.stats
+        stats.requests += 1
+        stats.rows += len(rows)
+        stats.by_table[table_id] = stats.by_table.get(table_id, 0) + 1
+
+        if table_type != "action":
+            # Knowledge uploads: acknowledge with row ids, nothing is generated
+            await asyncio.sleep(profile.sample(len(rows)) / 10)
+            return {"object": "gen_table.completion.rows",
+                    "rows": [{"object": "gen_table.completion.chunks", "columns": {}, "row_id": uuid.uuid4().hex}
+                             for _ in rows]}
+
+        if body.get("stream"):
+            stats.streams += 1
+            # Time to first token; failures surface as an HTTP error before any chunk is sent
+            await asyncio.sleep(profile.sample(len(rows)) / 3)
+            failure = maybe_fail(profile)
+            if failure is not None:
+                return failure
+            return StreamingResponse(_stream_rows(table_id, rows, profile), media_type="text/event-stream")
+
+        await asyncio.sleep(profile.sample(len(rows)))
+        failure = maybe_fail(profile)
+        if failure is not None:
+            return failure
+        return {
+            "object": "gen_table.completion.rows",
+            "rows": [
+                {
+                    "object": "gen_table.completion.chunks",
+                    "columns": {name: _completion(text) for name, text in _output_columns(table_id, row).items()},
+                    "row_id": uuid.uuid4().hex
+                }
+                for row in rows
+            ]
+        }
+
+    @app.post("/api/v1/gen_tables/{table_type}/rows/delete")
+    async def delete_rows(table_type: str):
+        return {"ok": True}
+
+    @app.get("/fake/stats")
+    async def fake_stats():
+        return {"profile": asdict(app.state.profile), **asdict(app.state.stats)}
+
+    @app.put("/fake/profile")
+    async def set_profile(request: Request):
+        """Change latency/error settings of a running fake, e.g. {"error_rate": 0.1}."""
+        app.state.profile = replace(app.state.profile, **(await request.json()))
+        return asdict(app.state.profile)
+
+    return app
+
+
+async def _stream_rows(table_id: str, rows: List[Dict[str, str]], profile: LatencyProfile):
+    # One chunk per word, column by column, like the real SSE stream
+    for row in rows:
+        row_id = uuid.uuid4().hex
+        for column, text in _output_columns(table_id, row).items():
+            words = text.split(" ")
+            for i, word in enumerate(words):
+                chunk = _completion(
+                    word + (" " if i < len(words) - 1 else ""),
+                    object="gen_table.completion.chunk",
+                    output_column_name=column,
+                    row_id=row_id
+                )
+                yield f"data: {json.dumps(chunk)}\n\n"
+                if profile.stream_chunk_seconds:
+                    await asyncio.sleep(profile.stream_chunk_seconds)
+    yield "data: [DONE]\n\n"
+
+
+def fake_jamai_client(app: FastAPI = None, profile: str = "fast", **overrides) -> JamAIAsync:
+    """
+    A real JamAIAsync client wired to an in-process fake over httpx.ASGITransport,
+    so the backend's own JamAI code path (requests, parsing, streaming) is exercised.
+    """
+    if app is None:
+        app = create_fake_jamai_app(replace(PROFILES[profile], **overrides))
+    client = JamAIAsync(project_id="fake", token="fake", api_base=f"{FAKE_BASE_URL}/api")
+    http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), timeout=None)
+    for part in (client, client.admin, client.template, client.file, client.table):
+        part.http_client = http_client
+    client.fake_app = app
+    return client
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run an offline fake of the JamAI Base table API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="realistic")
+    parser.add_argument("--distribution", choices=["fixed", "uniform", "lognormal"])
+    parser.add_argument("--median", type=float, help="Median seconds per call")
+    parser.add_argument("--spread", type=float, help="Uniform half-width or lognormal sigma")
+    parser.add_argument("--error-rate", type=float, help="Fraction of calls that fail (0-1)")
+    parser.add_argument("--error-status", type=int, help="HTTP status for injected failures")
+    parser.add_argument("--table-profile", action="append", default=[], metavar="TABLE=PROFILE",
+                        help='Per-table profile, e.g. "SOP QnA=slow" (repeatable)')
+    args = parser.parse_args()
+
+    overrides = {
+        key: value for key, value in {
+            "distribution": args.distribution,
+            "median_seconds": args.median,
+            "spread": args.spread,
+            "error_rate": args.error_rate,
+            "error_status": args.error_status,
+        }.items() if value is not None
+    }
+    table_profiles = {}
+    for spec in args.table_profile:
+        table_id, _, name = spec.rpartition("=")
+        table_profiles[table_id] = PROFILES[name]
+
+    print(f"Fake JamAI on http://{args.host}:{args.port} (profile {args.profile}); "
+          f"set JAMAI_BASE_URL=http://{args.host}:{args.port}")
+    uvicorn.run(create_fake_jamai_app(replace(PROFILES[args.profile], **overrides), table_profiles),
+                host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,108 @@
+# Load test: concurrent /api/v1/patients/chat calls must not serialize on JamAI
+import os
+import sys
+import math
+import time
+import asyncio
+import argparse
+
+# Dummy credentials so app settings load without a real .env
+os.environ.setdefault("JAMAI_API_KEY", "load-test")
+os.environ.setdefault("JAMAI_PROJECT_ID", "load-test")
+# Every request must make its own Action Table call, so nothing may merge or answer them early:
+# no micro-batching, no answer cache or store, and no admission control (it would turn the burst into 429s)
+os.environ["ACTION_TABLE_BATCH_WINDOW_MS"] = "0"
+os.environ["ANSWER_CACHE_MAX_ENTRIES"] = "0"
+os.environ["ANSWER_STORE_ENABLED"] = "false"
+os.environ["ADMISSION_ENABLED"] = "false"
+
+import httpx
+from jamaibase import protocol as p
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.main import app
+from app.core.config import settings
+from app.services.jamai_services import jamai_service
+
+
+class _SlowTableClient:
+    """Stands in for JamAIAsync.table: every Action Table call takes `latency` seconds."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    async def add_table_rows(self, table_type, request):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        columns = {
+            name: p.ChatCompletionChunk(
+                id="load-test",
+                created=0,
+                model="load-test",
+                usage=None,
+                choices=[p.ChatCompletionChoice(message=p.ChatEntry.assistant(text), index=0)],
+            )
+            for name, text in {"response": "Klinik dibuka 8 pagi.", "source_doc": "sop.pdf"}.items()
+        }
+        return p.GenTableRowsChatCompletionChunks(
+            rows=[p.GenTableChatCompletionChunks(columns=columns, row_id=str(i)) for i in range(len(request.data))]
+        )
+
+
+class _SlowClient:
+    def __init__(self, latency: float):
+        self.table = _SlowTableClient(latency)
+
+
+_QUESTIONS = [
+    "Waktu operasi klinik?",
+    "Adakah klinik buka pada hari Ahad?",
+    "Berapa kos konsultasi?",
+    "What documents do I need to register?",
+    "Do you accept walk-in patients?",
+    "Is there parking near the clinic?",
+]
+
+
+async def run_load_test(concurrency: int, latency: float):
+    client_stub = _SlowClient(latency)
+    jamai_service.client = client_stub
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+        async def one_call(i: int):
+            response = await client.post("/api/v1/patients/chat", json={
+                "clinic_id": "clinic_001",
+                "message": f"{_QUESTIONS[i % len(_QUESTIONS)]} (patient {i})",
+                "language": "BM"
+            })
+            response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one_call(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    print(f"Concurrent calls : {concurrency}")
+    print(f"Single call      : {latency:.2f}s (simulated JamAI latency)")
+    print(f"Total wall time  : {elapsed:.2f}s")
+    print(f"Serialized would : {latency * concurrency:.2f}s")
+    print(f"JamAI calls made : {client_stub.table.calls} (batching, answer cache/store and admission disabled)")
+
+    if client_stub.table.calls != concurrency:
+        print("❌ Requests shared Action Table calls - the test does not measure concurrency.")
+        sys.exit(1)
+    # Calls overlap up to the SOP QnA concurrency limit, so each wave of that many takes one latency
+    waves = math.ceil(concurrency / settings.ACTION_TABLE_SOP_QNA_CONCURRENCY)
+    if elapsed > latency * (waves + 1):
+        print("❌ Requests were serialized - the event loop is being blocked.")
+        sys.exit(1)
+    print("✅ Requests ran concurrently.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent patient chat load test")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=1.0)
+    args = parser.parse_args()
+    asyncio.run(run_load_test(args.concurrency, args.latency))
@@ -1,9 +1,23 @@
-# Script to upload PDF/CSV to JamAI 
+# Script to upload PDF/CSV to JamAI
+# Incremental sync: a content-hash manifest in data/ skips unchanged files, replaces changed
+# ones and removes rows for deleted files. Uploads run in a bounded worker pool with retries.
+# With --csv-rows, medication CSVs are streamed in as one structured row per item instead of a single file.
 
 import os
 import sys
+import csv
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import httpx
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from jamaibase import JamAI, protocol as p
+from jamaibase.exceptions import ServerBusyError
 
 # Add the parent directory to sys.path to import config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -11,58 +25,616 @@ from app.core.config import settings
 
 load_dotenv()
 
-def upload_data():
-    jamai = JamAI(project_id=settings.JAMAI_PROJECT_ID, token=settings.JAMAI_API_KEY)
-    
-    data_dir = "data"
-    if not os.path.exists(data_dir):
-        print(f"Directory '{data_dir}' not found. Please create it and add your PDFs/CSVs.")
-        return
+MANIFEST_FILENAME = ".upload_manifest.json"
+MANIFEST_VERSION = 1
+
+def notify_backend(endpoint: str, params: dict = None) -> dict:
+    """
+    POST to a staff endpoint on the running backend. Returns the JSON body, or None if unreachable.
+    """
+    backend_url = os.getenv("MEDIFLOW_BACKEND_URL", "http://localhost:8000")
+    clinic_code = os.getenv("CLINIC_SECRET_CODE", "MEDIFLOW-ADMIN-2024")
+
+    try:
+        response = httpx.post(
+            f"{backend_url}/api/v1/staff/{endpoint}",
+            params=params or {},
+            headers={"X-Clinic-Code": clinic_code},
+            timeout=10.0
+        )
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        # Backend may not be running; it rebuilds caches and indexes on next boot anyway
+        print(f"Could not reach backend {endpoint} at {backend_url}: {str(e)}")
+        return None
+
+def invalidate_sop_cache(clinic_name: str = None):
+    """
+    Tell the running backend to drop cached SOP answers so new documents are used.
+    Scoped to one clinic when clinic_name is given, otherwise clears every clinic.
+    """
+    result = notify_backend("cache/invalidate", {"clinic_name": clinic_name} if clinic_name else None)
+    if result is not None:
+        print(f"Invalidated {result.get('entries_removed', 0)} cached SOP answers ({clinic_name or 'all clinics'})")
+
+def reload_medication_index():
+    """Tell the running backend to rebuild its local medication index from the CSVs."""
+    result = notify_backend("medication-index/reload")
+    if result is not None:
+        print(f"Backend medication index reloaded: {result.get('items_indexed', 0)} items")
+
+# --- Manifest ---
+
+def load_manifest(data_dir: str) -> dict:
+    path = os.path.join(data_dir, MANIFEST_FILENAME)
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+        print(f"Ignoring manifest with unknown version {manifest.get('version')}; doing a full upload.")
+    except FileNotFoundError:
+        pass
+    except ValueError as e:
+        print(f"Manifest {path} is corrupt ({str(e)}); doing a full upload.")
+    return {"version": MANIFEST_VERSION, "files": {}}
 
-    print("Starting Batch Upload to JamAI Base...")
+def save_manifest(data_dir: str, manifest: dict):
+    # Write-then-rename so an interrupted run never leaves a half-written manifest
+    path = os.path.join(data_dir, MANIFEST_FILENAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
 
-    for filename in os.listdir(data_dir):
+def file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def knowledge_table_for(filename: str) -> str:
+    """PDFs go to the SOP Knowledge Table, CSVs to the Medication Knowledge Table."""
+    lower = filename.lower()
+    if lower.endswith(".pdf"):
+        return settings.KNOWLEDGE_TABLE_SOP
+    if lower.endswith(".csv"):
+        return settings.KNOWLEDGE_TABLE_MEDS
+    return None
+
+def upload_mode_for(filename: str, csv_rows: bool) -> str:
+    return "rows" if csv_rows and filename.lower().endswith(".csv") else "file"
+
+def plan_sync(data_dir: str, manifest: dict, force: bool = False, csv_rows: bool = False):
+    """
+    Compare data_dir against the manifest.
+    Returns (to_upload, unchanged, removed): to_upload is a list of
+    (filename, table_id, sha256, stat) tuples, removed is a list of filenames.
+    A file uploaded in a different mode (whole file vs. CSV rows) counts as changed.
+    """
+    to_upload, unchanged = [], []
+    seen = set()
+    for filename in sorted(os.listdir(data_dir)):
         file_path = os.path.join(data_dir, filename)
-        
-        # Skip directories
-        if not os.path.isfile(file_path):
+        table_id = knowledge_table_for(filename)
+        # Skip directories, the manifest itself and unsupported files
+        if not os.path.isfile(file_path) or table_id is None:
+            continue
+
+        seen.add(filename)
+        stat = os.stat(file_path)
+        entry = manifest["files"].get(filename)
+        if entry and entry.get("mode", "file") != upload_mode_for(filename, csv_rows):
+            entry = None
+        # Fast path: same size and mtime as last upload means the content was not touched
+        if not force and entry and entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+            unchanged.append(filename)
             continue
 
+        sha256 = file_sha256(file_path)
+        if not force and entry and entry.get("sha256") == sha256 and entry.get("table_id") == table_id:
+            # Touched but identical: refresh the stat so the next run takes the fast path
+            entry["size"], entry["mtime_ns"] = stat.st_size, stat.st_mtime_ns
+            unchanged.append(filename)
+            continue
+
+        to_upload.append((filename, table_id, sha256, stat))
+
+    removed = [filename for filename in manifest["files"] if filename not in seen]
+    return to_upload, unchanged, removed
+
+# --- JamAI operations ---
+
+# The SDK drops the HTTP status, so a 429/503 refusal is only recognisable by its message
+_REFUSED_MESSAGES = ("rate limit", "too many requests", "server busy", "service unavailable")
+
+def is_unapplied(error: BaseException) -> bool:
+    """
+    The request was refused before JamAI processed it (connection refused, 429, busy), so sending
+    it again cannot duplicate rows. Timeouts and other server errors are ambiguous.
+    """
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, ServerBusyError)):
+        return True
+    return type(error) is RuntimeError and any(hint in str(error).lower() for hint in _REFUSED_MESSAGES)
+
+def with_retries(operation, description: str, retries: int, backoff: float,
+                 is_safe=None, reconcile=None):
+    """
+    Run operation(), retrying with jittered exponential backoff. Returns (result, attempts).
+    For non-idempotent operations pass is_safe(error), true when the failed attempt had no effect;
+    any other failure is retried only after reconcile() has undone it (raised if there is none).
+    """
+    for attempt in range(1, retries + 2):
         try:
-            # 1. Upload PDFs to the SOP Knowledge Table
-            if filename.lower().endswith(".pdf"):
-                print(f"Uploading SOP: {filename}...")
-                
-                # In JamAI Base, we add a row with the file path
-                # The system automatically parses and embeds the PDF
-                jamai.table.add_table_rows(
-                    table_type=p.TableType.KNOWLEDGE,
-                    request=p.RowAddRequest(
-                        table_id=settings.KNOWLEDGE_TABLE_SOP,
-                        data=[{"file": file_path}], # Assumes column name is 'file' (standard)
-                        stream=False
-                    )
-                )
-                print(f"Indexed {filename}")
-
-            # 2. Upload CSVs to the Medication Knowledge Table
-            elif filename.lower().endswith(".csv"):
-                print(f"Uploading Medication List: {filename}...")
-                
-                jamai.table.add_table_rows(
-                    table_type=p.TableType.KNOWLEDGE,
-                    request=p.RowAddRequest(
-                        table_id=settings.KNOWLEDGE_TABLE_MEDS,
-                        data=[{"file": file_path}],
-                        stream=False
+            return operation(), attempt
+        except Exception as e:
+            if attempt > retries:
+                raise
+            if is_safe is not None and not is_safe(e):
+                if reconcile is None:
+                    raise
+                print(f"  {description} may have been applied ({str(e)}); reconciling before retrying")
+                reconcile()
+            delay = backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+            print(f"  {description} failed (attempt {attempt}): {str(e)}; retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def delete_rows(jamai: JamAI, table_id: str, row_ids: list):
+    # JamAI deletes at most 100 rows per request
+    for start in range(0, len(row_ids), 100):
+        jamai.table.delete_table_rows(
+            table_type=p.TableType.knowledge,
+            request=p.RowDeleteRequest(table_id=table_id, row_ids=row_ids[start:start + 100])
+        )
+
+def upload_file(jamai: JamAI, table_id: str, file_path: str) -> list:
+    """
+    Add a file to a Knowledge Table and return the ids of the rows created.
+    The system automatically parses and embeds the file.
+    """
+    response = jamai.table.add_table_rows(
+        table_type=p.TableType.knowledge,
+        request=p.RowAddRequest(
+            table_id=table_id,
+            data=[{"file": file_path}], # Assumes column name is 'file' (standard)
+            stream=False
+        )
+    )
+    return [row.row_id for row in response.rows]
+
+# --- Row-chunked CSV ingestion ---
+
+REQUIRED_CSV_COLUMNS = ("english_name", "clinic")
+NUMERIC_CSV_COLUMNS = ("stock_quantity", "price_rm", "reorder_level")
+MAX_ROW_WARNINGS = 5
+ROW_LOG_DIR = ".upload_rows"  # Per-file row-id logs, kept next to the manifest
+
+def normalize_medication_row(raw: dict, default_clinic: str = None) -> dict:
+    """
+    Clean one inventory CSV row: trim and collapse whitespace, parse numbers and
+    turn d/m/yyyy expiry dates into ISO dates. Raises ValueError for unusable rows.
+    """
+    row = {k.strip(): " ".join((v or "").split()) for k, v in raw.items() if k}
+    row["clinic"] = row.get("clinic") or (default_clinic or "")
+    for column in REQUIRED_CSV_COLUMNS:
+        if not row.get(column):
+            raise ValueError(f"missing {column}")
+
+    for column in NUMERIC_CSV_COLUMNS:
+        if row.get(column):
+            try:
+                number = float(row[column])
+            except ValueError:
+                raise ValueError(f"{column} is not a number: {row[column]!r}")
+            if number < 0:
+                raise ValueError(f"{column} is negative: {row[column]!r}")
+            row[column] = str(int(number)) if number.is_integer() else str(number)
+
+    if row.get("expiry_date"):
+        try:
+            row["expiry_date"] = datetime.strptime(row["expiry_date"], "%d/%m/%Y").date().isoformat()
+        except ValueError:
+            pass  # Already ISO or free text; keep as written
+    return row
+
+def medication_row_to_knowledge(row: dict) -> dict:
+    """One inventory item as a Knowledge Table row: short title, descriptive text, clinic tag."""
+    name = row["english_name"]
+    if row.get("generic_name") and row["generic_name"].casefold() != name.casefold():
+        name += f" ({row['generic_name']})"
+    parts = [f"{name}. Malay name: {row.get('malay_name') or '-'}."]
+    if row.get("category"):
+        parts.append(f"Category: {row['category']}.")
+    if row.get("common_uses"):
+        parts.append(f"Uses: {row['common_uses']}.")
+    parts.append(
+        f"Stock: {row.get('stock_quantity') or '?'} {row.get('unit', '')} "
+        f"(reorder level {row.get('reorder_level') or '?'}) at {row.get('location') or 'unknown location'}."
+    )
+    if row.get("price_rm"):
+        parts.append(f"Price: RM{row['price_rm']}.")
+    if row.get("supplier"):
+        parts.append(f"Supplier: {row['supplier']}.")
+    if row.get("expiry_date"):
+        parts.append(f"Expiry: {row['expiry_date']}.")
+    parts.append(f"Clinic: {row['clinic']}.")
+    return {
+        "Title": f"{name} - {row['clinic']}",
+        "Text": " ".join(parts),
+        "clinic_name": row["clinic"],  # Lets retrieval filter by clinic
+    }
+
+def iter_medication_rows(file_path: str, default_clinic: str = None):
+    """
+    Lazily read an inventory CSV. Yields (position, knowledge_row, error) per data row,
+    where exactly one of knowledge_row and error is set. Only one row is held in memory.
+    """
+    with open(file_path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        header = [name.strip() for name in reader.fieldnames or []]
+        missing = [column for column in REQUIRED_CSV_COLUMNS if column not in header]
+        if missing and not (missing == ["clinic"] and default_clinic):
+            raise ValueError(f"{os.path.basename(file_path)} is missing columns: {', '.join(missing)}")
+
+        for position, raw in enumerate(reader):
+            try:
+                yield position, medication_row_to_knowledge(normalize_medication_row(raw, default_clinic)), None
+            except ValueError as e:
+                yield position, None, f"line {reader.line_num}: {str(e)}"
+
+def recover_row_log(log_path: str):
+    """
+    Read a row-id log written by ingest_csv_rows. Returns (rows_done, rejected, row_count, orphan_ids).
+    Each committed batch is its row ids followed by a "#<rows_done> <rejected>" marker; ids after
+    the last marker come from a batch whose write was interrupted and are truncated away.
+    """
+    rows_done = rejected = row_count = 0
+    uncommitted, committed_offset = [], 0
+    if not os.path.exists(log_path):
+        return 0, 0, 0, []
+    with open(log_path, "rb") as f:
+        for line in f:
+            text = line.decode("utf-8").strip()
+            if text.startswith("#"):
+                done, rejected_so_far = text[1:].split()
+                rows_done, rejected = int(done), int(rejected_so_far)
+                row_count += len(uncommitted)
+                uncommitted = []
+                committed_offset = f.tell()
+            elif text:
+                uncommitted.append(text)
+    if uncommitted:
+        with open(log_path, "r+b") as f:
+            f.truncate(committed_offset)
+    return rows_done, rejected, row_count, uncommitted
+
+def iter_row_log_ids(log_path: str):
+    with open(log_path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+
+def remove_unlogged_rows(jamai: JamAI, table_id: str, titles: list, log_dir: str) -> int:
+    """
+    Delete rows titled like `titles` that no row log in log_dir knows about: rows a batch created
+    before its request failed ambiguously (e.g. timed out after JamAI had inserted them).
+    Returns the number of rows deleted.
+    """
+    known = set()
+    for name in os.listdir(log_dir):
+        if name.endswith(".ids"):
+            known.update(iter_row_log_ids(os.path.join(log_dir, name)))
+
+    strays = []
+    for title in dict.fromkeys(titles):
+        offset = 0
+        while True:
+            page = jamai.table.list_table_rows(
+                p.TableType.knowledge, table_id, offset=offset, limit=100,
+                search_query=title, columns=["Title"], vec_decimals=-1
+            )
+            for row in page.items:
+                value = row.get("Title")
+                if isinstance(value, dict):
+                    value = value.get("value")
+                if value == title and row["ID"] not in known:
+                    strays.append(row["ID"])
+            offset += len(page.items)
+            if not page.items or offset >= page.total:
+                break
+    if strays:
+        delete_rows(jamai, table_id, strays)
+        print(f"  Removed {len(strays)} rows left by the failed request")
+    return len(strays)
+
+def delete_logged_rows(jamai: JamAI, table_id: str, log_path: str):
+    # Stream ids from the log in request-sized chunks instead of loading them all
+    chunk = []
+    for row_id in iter_row_log_ids(log_path):
+        chunk.append(row_id)
+        if len(chunk) == 100:
+            delete_rows(jamai, table_id, chunk)
+            chunk = []
+    if chunk:
+        delete_rows(jamai, table_id, chunk)
+
+def ingest_csv_rows(jamai: JamAI, table_id: str, file_path: str, log_path: str, batch_size: int,
+                    retries: int, backoff: float, default_clinic: str = None):
+    """
+    Stream an inventory CSV into a Knowledge Table as structured rows, batch_size rows per request.
+    Created row ids are appended to log_path after every batch; if the log already exists the
+    upload resumes after its last committed batch. Memory use does not grow with the file size.
+    Returns (row_count, rejected, batches_sent, resumed_from).
+    """
+    filename = os.path.basename(file_path)
+    rows_done, rejected, row_count, orphans = recover_row_log(log_path)
+    if orphans:
+        # Rows created by a batch whose log write was interrupted; they are re-sent below
+        with_retries(lambda: delete_rows(jamai, table_id, orphans), f"Removing unlogged rows of {filename}", retries, backoff)
+
+    resumed_from = rows_done
+    batch, batch_start, batch_end, batches = [], rows_done, rows_done, 0
+    warnings = 0
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with open(log_path, "a", encoding="utf-8") as log:
+
+        def commit():
+            nonlocal row_count, batches, batch_start
+            if batch:
+                # Inserts are not idempotent: after an ambiguous failure, rows the request may have
+                # created are removed (they are in no row log) before the batch is sent again
+                response, _ = with_retries(
+                    lambda: jamai.table.add_table_rows(
+                        table_type=p.TableType.knowledge,
+                        request=p.RowAddRequest(table_id=table_id, data=batch, stream=False)
+                    ),
+                    f"Uploading rows {batch_start + 1}-{batch_end} of {filename}", retries, backoff,
+                    is_safe=is_unapplied,
+                    reconcile=lambda: remove_unlogged_rows(
+                        jamai, table_id, [row["Title"] for row in batch], os.path.dirname(log_path)
                     )
                 )
-                print(f"Indexed {filename}")
+                row_ids = [row.row_id for row in response.rows]
+                row_count += len(row_ids)
+                batches += 1
+                log.write("".join(f"{row_id}\n" for row_id in row_ids))
+            # Ids and marker go out in one flush so a batch is either fully logged or truncated on resume
+            log.write(f"#{batch_end} {rejected}\n")
+            log.flush()
+            batch_start = batch_end
+
+        for position, row, error in iter_medication_rows(file_path, default_clinic):
+            if position < rows_done:
+                continue
+            batch_end = position + 1
+            if error:
+                rejected += 1
+                warnings += 1
+                if warnings <= MAX_ROW_WARNINGS:
+                    print(f"  Skipping {filename} {error}")
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                commit()
+                batch = []
+
+        if batch or batch_end > batch_start:
+            commit()
+
+    if warnings > MAX_ROW_WARNINGS:
+        print(f"  ... {warnings - MAX_ROW_WARNINGS} more invalid rows skipped in {filename}")
+    return row_count, rejected, batches, resumed_from
+
+def delete_entry_rows(jamai: JamAI, data_dir: str, entry: dict):
+    """Delete every row a manifest entry created, whichever way it was uploaded."""
+    if entry.get("row_log"):
+        log_path = os.path.join(data_dir, ROW_LOG_DIR, entry["row_log"])
+        if os.path.exists(log_path):
+            delete_logged_rows(jamai, entry["table_id"], log_path)
+            os.remove(log_path)
+    elif entry.get("row_ids"):
+        delete_rows(jamai, entry["table_id"], entry["row_ids"])
 
+def sync_file(jamai: JamAI, data_dir: str, manifest: dict, filename: str, table_id: str,
+              sha256: str, stat, retries: int, backoff: float, csv_rows: bool = False,
+              batch_size: int = 50, mark_pending=None, default_clinic: str = None):
+    """
+    Upload a new or changed file, then remove the rows of its previous version.
+    Uploading first means a failed run never leaves the file missing from the table.
+    Returns (manifest_entry, attempts).
+    """
+    file_path = os.path.join(data_dir, filename)
+    old_entry = manifest["files"].get(filename)
+    entry = {
+        "sha256": sha256,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "table_id": table_id,
+        "mode": upload_mode_for(filename, csv_rows)
+    }
+
+    if entry["mode"] == "rows":
+        pending = manifest.get("pending", {}).get(filename)
+        if pending and (pending["sha256"] != sha256 or pending["table_id"] != table_id):
+            # Partial upload of an older version: drop it and start over
+            with_retries(
+                lambda: delete_entry_rows(jamai, data_dir, pending),
+                f"Removing partial upload of {filename}", retries, backoff
+            )
+            pending = None
+        if pending is None:
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+            pending = {"sha256": sha256, "table_id": table_id, "row_log": f"{filename}.{stamp}.ids"}
+            mark_pending(filename, pending)
+
+        row_count, rejected, _, resumed_from = ingest_csv_rows(
+            jamai, table_id, file_path, os.path.join(data_dir, ROW_LOG_DIR, pending["row_log"]),
+            batch_size, retries, backoff, default_clinic
+        )
+        if resumed_from:
+            print(f"  Resumed {filename} after row {resumed_from}")
+        entry.update(row_log=pending["row_log"], row_count=row_count, rows_rejected=rejected)
+        attempts = 1
+    else:
+        # Only refused uploads are retried; the rows of a file upload that failed ambiguously
+        # cannot be told apart, so the file is reported as failed instead of possibly indexed twice
+        row_ids, attempts = with_retries(
+            lambda: upload_file(jamai, table_id, file_path),
+            f"Uploading {filename}", retries, backoff, is_safe=is_unapplied
+        )
+        entry.update(row_ids=row_ids, row_count=len(row_ids))
+
+    if old_entry:
+        try:
+            with_retries(
+                lambda: delete_entry_rows(jamai, data_dir, old_entry),
+                f"Removing old rows of {filename}", retries, backoff
+            )
         except Exception as e:
-            print(f"Failed to upload {filename}: {str(e)}")
+            print(f"  Warning: old rows of {filename} could not be removed: {str(e)}")
+
+    entry["uploaded_at"] = datetime.now(timezone.utc).isoformat()
+    return entry, attempts
+
+# --- Main ---
+
+def upload_data(clinic_name: str = None, data_dir: str = "data", workers: int = 4,
+                retries: int = 3, backoff: float = 1.0, force: bool = False, dry_run: bool = False,
+                csv_rows: bool = False, batch_size: int = 50):
+    if not os.path.exists(data_dir):
+        print(f"Directory '{data_dir}' not found. Please create it and add your PDFs/CSVs.")
+        return
+
+    started = time.perf_counter()
+    manifest = load_manifest(data_dir)
+    manifest.setdefault("pending", {})
+    to_upload, unchanged, removed = plan_sync(data_dir, manifest, force, csv_rows)
+    print(
+        f"Knowledge sync: {len(to_upload)} to upload, {len(unchanged)} unchanged, "
+        f"{len(removed)} removed ({data_dir})"
+    )
+    if dry_run:
+        for filename, table_id, _, _ in to_upload:
+            resume_note = " (resuming)" if filename in manifest["pending"] else ""
+            print(f"  would upload {filename} -> {table_id} as {upload_mode_for(filename, csv_rows)}{resume_note}")
+        for filename in removed:
+            print(f"  would remove {filename}")
+        return
+
+    jamai = JamAI(project_id=settings.JAMAI_PROJECT_ID, token=settings.JAMAI_API_KEY)
+    manifest_lock = threading.Lock()
+    changed_tables = set()
+    failed = []
+    uploaded = 0
+    batch_size = max(1, min(batch_size, 100))  # JamAI accepts at most 100 rows per request
+
+    def mark_pending(filename: str, pending: dict):
+        with manifest_lock:
+            manifest["pending"][filename] = pending
+            save_manifest(data_dir, manifest)
+
+    # 1. Drop rows of files that no longer exist
+    for filename in removed:
+        entry = manifest["files"][filename]
+        try:
+            with_retries(lambda: delete_entry_rows(jamai, data_dir, entry), f"Removing {filename}", retries, backoff)
+            del manifest["files"][filename]
+            changed_tables.add(entry["table_id"])
+            print(f"Removed {filename}")
+        except Exception as e:
+            failed.append(filename)
+            print(f"Failed to remove {filename}: {str(e)}")
+    for filename in [f for f in manifest["pending"] if not os.path.exists(os.path.join(data_dir, f))]:
+        try:
+            pending = manifest["pending"][filename]
+            with_retries(lambda: delete_entry_rows(jamai, data_dir, pending), f"Removing partial upload of {filename}", retries, backoff)
+            del manifest["pending"][filename]
+        except Exception as e:
+            print(f"Failed to remove partial upload of {filename}: {str(e)}")
+    save_manifest(data_dir, manifest)
+
+    # 2. Upload new and changed files in a bounded worker pool
+    total = len(to_upload)
+    done = 0
+    durations = {}
+
+    def timed_sync_file(filename: str, *args):
+        # Timed from when a worker picks the file up, so time queued behind other files is not counted
+        start = time.perf_counter()
+        try:
+            return sync_file(jamai, data_dir, manifest, filename, *args)
+        finally:
+            durations[filename] = time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {}
+        for filename, table_id, sha256, stat in to_upload:
+            future = pool.submit(
+                timed_sync_file, filename, table_id, sha256, stat, retries, backoff,
+                csv_rows, batch_size, mark_pending, clinic_name
+            )
+            futures[future] = (filename, table_id)
+
+        for future in as_completed(futures):
+            filename, table_id = futures[future]
+            done += 1
+            try:
+                entry, attempts = future.result()
+            except Exception as e:
+                failed.append(filename)
+                print(f"[{done}/{total}] Failed to upload {filename} after {durations[filename]:.2f}s: {str(e)}")
+                continue
+            elapsed = durations[filename]
+
+            uploaded += 1
+            with manifest_lock:
+                manifest["files"][filename] = entry
+                manifest["pending"].pop(filename, None)
+                changed_tables.add(table_id)
+                # Persist after every file so an interrupted run resumes where it stopped
+                save_manifest(data_dir, manifest)
+            retry_note = f", {attempts} attempts" if attempts > 1 else ""
+            rejected_note = f", {entry['rows_rejected']} rejected" if entry.get("rows_rejected") else ""
+            print(f"[{done}/{total}] Indexed {filename} in {elapsed:.2f}s ({entry['row_count']} rows{rejected_note}{retry_note})")
+
+    if settings.KNOWLEDGE_TABLE_SOP in changed_tables:
+        invalidate_sop_cache(clinic_name)
+    if settings.KNOWLEDGE_TABLE_MEDS in changed_tables:
+        reload_medication_index()
 
-    print("\nBatch Upload Complete!")
+    print(
+        f"\nBatch Upload Complete in {time.perf_counter() - started:.2f}s: "
+        f"{uploaded} uploaded, {len(unchanged)} unchanged, "
+        f"{len(removed)} removed, {len(failed)} failed"
+    )
+    if failed:
+        sys.exit(1)
 
 if __name__ == "__main__":
-    upload_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Upload PDFs/CSVs in data/ to JamAI Knowledge Tables")
+    parser.add_argument("--clinic", help="Clinic name the uploaded documents belong to (limits cache invalidation)")
+    parser.add_argument("--data-dir", default="data", help="Directory with PDFs/CSVs (default: data)")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel uploads (default: 4)")
+    parser.add_argument("--retries", type=int, default=3,
+                        help="Retries per request for refused or reconciled errors (default: 3)")
+    parser.add_argument("--backoff", type=float, default=1.0, help="Initial retry delay in seconds (default: 1.0)")
+    parser.add_argument("--force", action="store_true", help="Re-upload every file, ignoring the manifest")
+    parser.add_argument("--dry-run", action="store_true", help="Show what would be uploaded or removed")
+    parser.add_argument("--csv-rows", action="store_true",
+                        help="Stream medication CSVs in as one structured row per item (resumable)")
+    parser.add_argument("--batch-size", type=int, default=50, help="Rows per request with --csv-rows (max 100, default: 50)")
+    args = parser.parse_args()
+    upload_data(
+        clinic_name=args.clinic,
+        data_dir=args.data_dir,
+        workers=args.workers,
+        retries=args.retries,
+        backoff=args.backoff,
+        force=args.force,
+        dry_run=args.dry_run,
+        csv_rows=args.csv_rows,
+        batch_size=args.batch_size
+    )
@@ -5,6 +5,8 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
+from app.services.clinic_registry import clinic_registry
+
 app = FastAPI(title="MediFlow Test Server")
 
 # CORS configuration
@@ -27,28 +29,10 @@ async def health_check():
 
 @app.get("/api/v1/clinics")
 async def get_clinics():
-    """Mock clinics endpoint"""
+    """Clinics endpoint backed by the shared clinic registry"""
     return [
-        {
-            "clinic_id": "cid_01_public",
-            "name": "Public Clinic Bandar Utama",
-            "address": "123 Main St, Bandar Utama",
-            "phone": "+60-3-1234-5678",
-            "operating_hours": "Mon-Fri: 8:00 AM - 6:00 PM",
-            "languages_supported": ["English", "Bahasa Malaysia"],
-            "services": ["General Medicine", "Pediatrics", "Vaccination"],
-            "is_active": True
-        },
-        {
-            "clinic_id": "cid_02_private",
-            "name": "Private Health Center",
-            "address": "456 Health Ave, Petaling Jaya",
-            "phone": "+60-3-2345-6789",
-            "operating_hours": "Mon-Sun: 9:00 AM - 9:00 PM",
-            "languages_supported": ["English", "Bahasa Malaysia", "Mandarin"],
-            "services": ["General Medicine", "Specialist Consultations", "Lab Tests"],
-            "is_active": True
-        }
+        clinic.public_dump()
+        for clinic in clinic_registry.active_clinics()
     ]
 
 @app.post("/api/v1/patients/appointment")
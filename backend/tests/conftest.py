@@ -0,0 +1,14 @@
+# Shared pytest setup: dummy JamAI credentials and throwaway state paths, set before `app` is imported
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATE_DIR = tempfile.mkdtemp(prefix="mediflow-tests-")
+
+os.environ.setdefault("JAMAI_API_KEY", "test")
+os.environ.setdefault("JAMAI_PROJECT_ID", "test")
+os.environ.setdefault("MEDICATION_DATA_DIR", os.path.join(STATE_DIR, "medications"))
+os.environ.setdefault("ANSWER_STORE_PATH", os.path.join(STATE_DIR, "answer_store.sqlite3"))
+
+sys.path.insert(0, BACKEND_DIR)
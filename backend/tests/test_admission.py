@@ -0,0 +1,256 @@
+# Admission control (token buckets, priority tiers, weighted fair queuing) and its use by JamAIService
+import asyncio
+
+import pytest
+
+from app.services import admission, jamai_services
+from app.services.admission import (
+    PRIORITY_BOOKING, PRIORITY_EMERGENCY, PRIORITY_FAQ, PRIORITY_STAFF,
+    AdmissionController, AdmissionRejected, ClinicLimits, clinic_id_for_name,
+)
+from app.services.clinic_registry import get_clinic_name_from_id
+from app.services.jamai_services import JamAIService
+from app.services.single_flight import SingleFlight
+
+
+def make_controller(max_concurrent=1, rate=0.0, burst=10, max_queue=10, aging_seconds=0.0, max_wait=5.0,
+                    emergency=None):
+    return AdmissionController(
+        max_concurrent=max_concurrent,
+        max_wait_seconds=max_wait,
+        defaults=ClinicLimits(weight=1.0, rate_per_second=rate, burst=burst, max_queue=max_queue),
+        aging_seconds=aging_seconds,
+        emergency=emergency,
+    )
+
+
+def test_empty_bucket_is_429():
+    async def main():
+        controller = make_controller(max_concurrent=10, rate=0.5, burst=2)
+        for _ in range(2):
+            async with controller.admit("c1", PRIORITY_FAQ):
+                pass
+        with pytest.raises(AdmissionRejected) as e:
+            async with controller.admit("c1", PRIORITY_FAQ):
+                pass
+        assert e.value.status_code == 429
+        assert int(e.value.headers["Retry-After"]) >= 1
+        # Other clinics have their own bucket
+        async with controller.admit("c2", PRIORITY_FAQ):
+            pass
+
+    asyncio.run(main())
+
+
+
+def test_unregistered_clinics_get_their_own_bucket():
+    assert clinic_id_for_name(get_clinic_name_from_id("clinic_001")) == "clinic_001"
+    assert clinic_id_for_name("  Klinik   BARU ") == clinic_id_for_name("klinik baru") == "unknown:klinik baru"
+
+    async def main():
+        controller = make_controller(max_concurrent=10, rate=0.5, burst=1)
+        async with controller.admit(clinic_id_for_name("Klinik Baru"), PRIORITY_FAQ):
+            pass
+        with pytest.raises(AdmissionRejected):
+            async with controller.admit(clinic_id_for_name("KLINIK BARU"), PRIORITY_FAQ):
+                pass
+        # Another unregistered clinic is not held back by the first one's traffic
+        async with controller.admit(clinic_id_for_name("Klinik Lain"), PRIORITY_FAQ):
+            pass
+
+    asyncio.run(main())
+
+
+def test_idle_unregistered_clinics_are_dropped(monkeypatch):
+    monkeypatch.setattr(admission, "MAX_UNKNOWN_CLINICS", 3)
+
+    async def main():
+        controller = make_controller(max_concurrent=10)
+        for i in range(10):
+            async with controller.admit(clinic_id_for_name(f"Klinik {i}"), PRIORITY_FAQ):
+                pass
+        async with controller.admit("clinic_001", PRIORITY_FAQ):
+            pass
+        clinics = controller.stats()["clinics"]
+        assert "clinic_001" in clinics
+        assert sum(clinic_id.startswith("unknown:") for clinic_id in clinics) <= 3
+
+    asyncio.run(main())
+
+def test_emergency_has_its_own_bucket():
+    async def main():
+        emergency = ClinicLimits(weight=1.0, rate_per_second=0.1, burst=3, max_queue=5)
+        controller = make_controller(max_concurrent=10, rate=0.1, burst=1, emergency=emergency)
+        async with controller.admit("c1", PRIORITY_FAQ):
+            pass
+        with pytest.raises(AdmissionRejected):
+            async with controller.admit("c1", PRIORITY_FAQ):
+                pass
+        # FAQ traffic emptied the normal bucket; emergencies still get in, up to their own cap
+        for _ in range(3):
+            async with controller.admit("c1", PRIORITY_EMERGENCY):
+                pass
+        with pytest.raises(AdmissionRejected) as e:
+            async with controller.admit("c1", PRIORITY_EMERGENCY):
+                pass
+        assert e.value.status_code == 429
+
+    asyncio.run(main())
+
+
+def test_emergency_queue_is_bounded_separately():
+    async def main():
+        emergency = ClinicLimits(weight=1.0, rate_per_second=0.0, burst=1, max_queue=1)
+        controller = make_controller(max_concurrent=1, max_queue=1, emergency=emergency)
+        holder = await controller.acquire("holder", PRIORITY_BOOKING)
+        faq = asyncio.ensure_future(controller.acquire("c1", PRIORITY_FAQ))
+        first = asyncio.ensure_future(controller.acquire("c1", PRIORITY_EMERGENCY))
+        await asyncio.sleep(0)
+        assert not first.done()  # a full FAQ queue does not block the emergency queue
+        with pytest.raises(AdmissionRejected) as e:
+            await controller.acquire("c1", PRIORITY_EMERGENCY)
+        assert e.value.status_code == 503
+        controller.release(holder, 0.0)
+        controller.release(await first, 0.0)
+        controller.release(await faq, 0.0)
+        assert controller.stats()["clinics"]["c1"]["queued"] == 0
+
+    asyncio.run(main())
+
+
+def test_full_clinic_queue_is_503():
+    async def main():
+        controller = make_controller(max_concurrent=1, max_queue=1)
+        holder = await controller.acquire("c1", PRIORITY_FAQ)
+        queued = asyncio.ensure_future(controller.acquire("c1", PRIORITY_FAQ))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as e:
+            await controller.acquire("c1", PRIORITY_FAQ)
+        assert e.value.status_code == 503
+        controller.release(holder, 0.0)
+        controller.release(await queued, 0.0)
+
+    asyncio.run(main())
+
+
+async def _grant_order(controller, requests, step=0.0):
+    """Queue (clinic_id, priority) requests behind one held slot; returns the order they are granted."""
+    holder = await controller.acquire("holder", PRIORITY_BOOKING)
+    order = []
+
+    async def one(clinic_id, priority):
+        state = await controller.acquire(clinic_id, priority)
+        order.append((clinic_id, priority))
+        controller.release(state, 0.0)
+
+    tasks = []
+    for clinic_id, priority in requests:
+        tasks.append(asyncio.ensure_future(one(clinic_id, priority)))
+        await asyncio.sleep(step)
+    await asyncio.sleep(0)
+    controller.release(holder, 0.0)
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_priority_order():
+    order = asyncio.run(_grant_order(make_controller(), [
+        ("c1", PRIORITY_FAQ), ("c1", PRIORITY_STAFF), ("c1", PRIORITY_BOOKING),
+    ]))
+    assert [priority for _, priority in order] == [PRIORITY_BOOKING, PRIORITY_STAFF, PRIORITY_FAQ]
+
+
+def test_fair_share_across_clinics():
+    # A busy clinic queues first, but the quiet clinic does not wait behind all of it
+    requests = [("busy", PRIORITY_FAQ)] * 4 + [("quiet", PRIORITY_FAQ)]
+    order = asyncio.run(_grant_order(make_controller(), requests))
+    assert [clinic_id for clinic_id, _ in order].index("quiet") <= 1
+
+
+def test_aging_promotes_starved_tier():
+    async def main():
+        controller = make_controller(aging_seconds=0.05)
+        holder = await controller.acquire("holder", PRIORITY_BOOKING)
+        faq = asyncio.ensure_future(controller.acquire("c1", PRIORITY_FAQ))
+        await asyncio.sleep(0.12)  # two aging steps: FAQ now competes as booking
+        booking = asyncio.ensure_future(controller.acquire("c2", PRIORITY_BOOKING))
+        await asyncio.sleep(0)
+        controller.release(holder, 0.0)
+        await asyncio.sleep(0.01)
+        assert faq.done() and not booking.done()
+        controller.release(faq.result(), 0.0)
+        controller.release(await booking, 0.0)
+        assert controller.stats()["priorities"]["faq"]["promoted_by_aging"] == 1
+
+    asyncio.run(main())
+
+
+def test_single_flight_shares_result_and_error():
+    async def main():
+        flight = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "answer"
+
+        assert await asyncio.gather(*(flight.do("k", work) for _ in range(5))) == ["answer"] * 5
+        assert len(calls) == 1
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(*(flight.do("e", fail) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert flight.stats()["in_flight"] == 0
+
+    asyncio.run(main())
+
+
+def test_coalesced_followers_spend_no_admission(monkeypatch):
+    async def main():
+        controller = make_controller(max_concurrent=4, rate=0.01, burst=1)
+        monkeypatch.setattr(jamai_services, "admission_controller", controller)
+        service = JamAIService(client=object())
+        calls = []
+
+        async def fake_row(table_id, row):
+            calls.append(row)
+            await asyncio.sleep(0.01)
+            return "row"
+
+        monkeypatch.setattr(service, "_add_action_row", fake_row)
+        row = {"user_input": "Waktu operasi?", "clinic_name": "Klinik Test"}
+        table = jamai_services.settings.ACTION_TABLE_SOP_QNA
+        results = await asyncio.gather(*(service._add_action_row_once(table, row) for _ in range(5)))
+        assert results == ["row"] * 5
+        assert len(calls) == 1
+        clinic = controller.stats()["clinics"]["unknown:klinik test"]
+        assert clinic["admitted"] == 1 and clinic["rejected"]["rate_limited"] == 0
+
+    asyncio.run(main())
+
+
+def test_bookings_are_never_coalesced(monkeypatch):
+    async def main():
+        monkeypatch.setattr(jamai_services, "admission_controller", make_controller(max_concurrent=8))
+        service = JamAIService(client=object())
+        calls = []
+
+        async def fake_row(table_id, row):
+            calls.append(row)
+            booking = f"booking-{len(calls)}"
+            await asyncio.sleep(0.01)
+            return booking
+
+        monkeypatch.setattr(service, "_add_action_row", fake_row)
+        row = {"user_input": "Demam dan batuk", "clinic_name": "Klinik Test"}
+        table = jamai_services.settings.ACTION_TABLE_TRIAGE
+        results = await asyncio.gather(*(
+            service._add_action_row_once(table, row, "BM", priority=PRIORITY_BOOKING) for _ in range(3)
+        ))
+        assert len(calls) == 3 and len(set(results)) == 3
+
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+# In-process SOP answer cache
+import time
+
+from app.services.answer_cache import AnswerCache, normalize_query
+
+CLINIC = "Klinik Sri Hartamas"
+
+
+def test_normalize_query():
+    assert normalize_query("  Waktu   OPERASI?! ") == "waktu operasi"
+    assert normalize_query("Waktu operasi") == normalize_query("waktu operasi.")
+
+
+def test_hit_miss_and_copies():
+    cache = AnswerCache(max_entries=10, ttl_seconds=60)
+    assert cache.get(CLINIC, "Waktu operasi?", "bm") is None
+    cache.set(CLINIC, "Waktu operasi?", "bm", {"reply": "8 pagi"})
+    hit = cache.get(CLINIC.upper(), "waktu operasi", "BM")
+    assert hit == {"reply": "8 pagi"}
+    hit["reply"] = "changed"
+    assert cache.get(CLINIC, "waktu operasi", "BM") == {"reply": "8 pagi"}
+    assert cache.get(CLINIC, "waktu operasi", "EN") is None
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 2
+
+
+def test_ttl_expiry():
+    cache = AnswerCache(max_entries=10, ttl_seconds=0.05)
+    cache.set(CLINIC, "q", "EN", {"reply": "a"})
+    assert cache.age(CLINIC, "q", "EN") is not None
+    time.sleep(0.1)
+    assert cache.age(CLINIC, "q", "EN") is None
+    assert cache.get(CLINIC, "q", "EN") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_eviction():
+    cache = AnswerCache(max_entries=2, ttl_seconds=60)
+    cache.set(CLINIC, "a", "EN", {"reply": "a"})
+    cache.set(CLINIC, "b", "EN", {"reply": "b"})
+    cache.get(CLINIC, "a", "EN")  # "b" is now least recently used
+    cache.set(CLINIC, "c", "EN", {"reply": "c"})
+    assert cache.get(CLINIC, "b", "EN") is None
+    assert cache.get(CLINIC, "a", "EN") and cache.get(CLINIC, "c", "EN")
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidate_clinic():
+    cache = AnswerCache(max_entries=10, ttl_seconds=60)
+    cache.set(CLINIC, "q", "EN", {"reply": "a"})
+    cache.set(CLINIC, "q", "BM", {"reply": "b"})
+    cache.set("Klinik Desa Jaya", "q", "EN", {"reply": "c"})
+    assert cache.invalidate_clinic(CLINIC.lower()) == 2
+    assert cache.get(CLINIC, "q", "EN") is None
+    assert cache.get("Klinik Desa Jaya", "q", "EN") == {"reply": "c"}
+
+
+def test_disabled_when_size_is_zero():
+    cache = AnswerCache(max_entries=0, ttl_seconds=60)
+    cache.set(CLINIC, "q", "EN", {"reply": "a"})
+    assert cache.get(CLINIC, "q", "EN") is None
@@ -0,0 +1,140 @@
+# Persistent SQLite answer store and cross-worker invalidation of in-process caches
+import asyncio
+import os
+
+import pytest
+
+from app.core.config import Settings
+from app.services.answer_cache import AnswerCache
+from app.services.answer_store import NAMESPACE_MEDICATION, NAMESPACE_SOP, AnswerStore
+
+CLINIC = "Klinik Sri Hartamas"
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "answers.sqlite3")
+
+
+def make_store(path, **options):
+    options = {"ttl_seconds": 60, "max_entries": 100, "max_bytes": 1 << 20, "revalidate_seconds": 0, **options}
+    return AnswerStore(path, **options)
+
+
+def test_round_trip_and_normalized_keys(path):
+    async def main():
+        store = make_store(path)
+        long_reply = {"reply": "Klinik dibuka 8 pagi. " * 50, "source_document": "sop.pdf"}
+        await store.set(NAMESPACE_SOP, CLINIC, "Waktu operasi?", "bm", long_reply)
+        assert await store.get(NAMESPACE_SOP, CLINIC.upper(), "  waktu  OPERASI ", "BM") == long_reply
+        assert await store.get(NAMESPACE_SOP, CLINIC, "Waktu operasi?", "EN") is None
+        assert await store.get(NAMESPACE_MEDICATION, CLINIC, "Waktu operasi?", "BM") is None
+        stats = await store.stats()
+        assert stats["hits"] == 1 and stats["misses"] == 2
+        # Large values are compressed on disk
+        assert stats["namespaces"]["sop"]["bytes"] < len(long_reply["reply"])
+
+    asyncio.run(main())
+
+
+def test_expired_entries_are_misses(path):
+    async def main():
+        store = make_store(path)
+        await store.set(NAMESPACE_MEDICATION, CLINIC, "panadol stock", "", {"m": "ok"}, ttl_seconds=0.05)
+        await asyncio.sleep(0.1)
+        assert await store.get(NAMESPACE_MEDICATION, CLINIC, "panadol stock") is None
+        assert store.expired == 1
+
+    asyncio.run(main())
+
+
+def test_sweep_evicts_least_recently_used(path):
+    async def main():
+        store = make_store(path, max_entries=3, sweep_every=1000)
+        for i in range(5):
+            await store.set(NAMESPACE_SOP, CLINIC, f"question {i}", "EN", {"reply": str(i)})
+        await store.sweep()
+        assert store.evictions == 2
+        assert await store.get(NAMESPACE_SOP, CLINIC, "question 0", "EN") is None
+        assert await store.get(NAMESPACE_SOP, CLINIC, "question 4", "EN") == {"reply": "4"}
+
+    asyncio.run(main())
+
+
+def test_purge_clinic_and_namespace(path):
+    async def main():
+        store = make_store(path)
+        await store.set(NAMESPACE_SOP, CLINIC, "q", "EN", {"reply": "a"})
+        await store.set(NAMESPACE_MEDICATION, CLINIC, "q", "", {"m": "b"})
+        await store.set(NAMESPACE_SOP, "Klinik Desa Jaya", "q", "EN", {"reply": "c"})
+        assert await store.purge_clinic(CLINIC, NAMESPACE_SOP) == 1
+        assert await store.get(NAMESPACE_MEDICATION, CLINIC, "q") == {"m": "b"}
+        assert await store.clear() == 2
+
+    asyncio.run(main())
+
+
+def test_purge_reaches_other_workers_caches(path):
+    async def main():
+        # Two workers: each has its own store connection and in-process cache
+        store_a, cache_a = make_store(path), AnswerCache(100, 60)
+        store_b, cache_b = make_store(path), AnswerCache(100, 60)
+        for store, cache in ((store_a, cache_a), (store_b, cache_b)):
+            await store.revalidate(cache)
+            cache.set(CLINIC, "q", "EN", {"reply": "old"})
+            cache.set("Klinik Desa Jaya", "q", "EN", {"reply": "other"})
+
+        await store_a.purge_clinic(CLINIC, NAMESPACE_SOP)
+        await store_b.revalidate(cache_b)
+        assert cache_b.get(CLINIC, "q", "EN") is None
+        assert cache_b.get("Klinik Desa Jaya", "q", "EN") == {"reply": "other"}
+
+        await store_a.clear(NAMESPACE_SOP)
+        await store_b.revalidate(cache_b)
+        assert cache_b.get("Klinik Desa Jaya", "q", "EN") is None
+
+    asyncio.run(main())
+
+
+def test_revalidate_is_throttled(path):
+    async def main():
+        store_a = make_store(path)
+        store_b, cache_b = make_store(path, revalidate_seconds=60), AnswerCache(100, 60)
+        await store_b.revalidate(cache_b)
+        cache_b.set(CLINIC, "q", "EN", {"reply": "old"})
+        await store_a.purge_clinic(CLINIC)
+        await store_b.revalidate(cache_b)  # within the interval: no store read
+        assert cache_b.get(CLINIC, "q", "EN") == {"reply": "old"}
+
+    asyncio.run(main())
+
+
+def test_lease_held_by_one_worker_until_it_expires(path):
+    async def main():
+        store_a, store_b = make_store(path), make_store(path)
+        assert await store_a.acquire_lease("warmup", "worker-a", 60)
+        assert not await store_b.acquire_lease("warmup", "worker-b", 60)
+        assert await store_a.acquire_lease("warmup", "worker-a", 60)  # The holder renews
+        assert await store_b.acquire_lease("other", "worker-b", 60)  # Leases are independent
+        await store_a.acquire_lease("warmup", "worker-a", -1)  # Renewed into the past: lapsed
+        assert await store_b.acquire_lease("warmup", "worker-b", 60)
+        assert not await store_a.acquire_lease("warmup", "worker-a", 60)
+
+    asyncio.run(main())
+
+
+def test_disabled_store_is_inert(path):
+    async def main():
+        store = make_store(path, enabled=False)
+        await store.set(NAMESPACE_SOP, CLINIC, "q", "EN", {"reply": "a"})
+        assert await store.get(NAMESPACE_SOP, CLINIC, "q", "EN") is None
+        assert await store.purge_clinic(CLINIC) == 0
+        assert not os.path.exists(path)
+
+    asyncio.run(main())
+
+
+def test_default_path_is_absolute(monkeypatch):
+    monkeypatch.delenv("ANSWER_STORE_PATH", raising=False)
+    default = Settings(_env_file=None).ANSWER_STORE_PATH
+    assert os.path.isabs(default) and default.endswith(os.path.join("backend", "data", "answer_store.sqlite3"))
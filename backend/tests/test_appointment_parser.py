@@ -0,0 +1,88 @@
+# Decoding of Appointment Booking column outputs
+import pytest
+
+from app.services.appointment_parser import loads_llm_json, parse_appointment
+
+CLINIC = "Klinik Sri Hartamas"
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1}', {"a": 1}),
+    ('```json\n{"a": 1}\n```', {"a": 1}),
+    ('```\n[1, 2]\n```', [1, 2]),
+    ('Here is the result: {"a": {"b": 2}} Hope this helps!', {"a": {"b": 2}}),
+    ('Slots: [{"date": "2025-01-02"}].', [{"date": "2025-01-02"}]),
+])
+def test_loads_llm_json(text, expected):
+    assert loads_llm_json(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", "   ", "no json here", '{"a": 1', "```json\n```"])
+def test_loads_llm_json_rejects_garbage(text):
+    with pytest.raises(ValueError):
+        loads_llm_json(text)
+
+
+def test_parse_appointment_valid_columns():
+    response = parse_appointment({
+        "available_time_slots": '[{"date": "2025-01-02", "time": "09:00", "doctor": "Dr. Lim", "clinic": "x"}]',
+        "case_type": '{"case_type": "URGENT", "booking_needed": true, "response_template": "Sila datang"}',
+        "recommended_time": '{"slot_found": true, "display_date": "2 Jan", "display_time": "9:00 AM"}',
+        "refined_user_message": "Demam 3 hari",
+        "booking_record": '{"patient": "Ali"}',
+    }, CLINIC)
+
+    assert response.parse_errors == []
+    assert response.clinic_name == CLINIC
+    assert response.available_time_slots[0].doctor == "Dr. Lim"
+    assert response.available_time_slots[0].model_extra == {"clinic": "x"}
+    assert response.case_type.case_type == "URGENT"
+    assert response.recommended_time.slot_found is True
+    assert response.booking_record == {"patient": "Ali"}
+
+
+def test_parse_appointment_malformed_columns_fall_back():
+    response = parse_appointment({
+        "available_time_slots": "Tiada slot",
+        "case_type": '{"booking_needed": "maybe"}',
+        "recommended_time": "```json\n{broken\n```",
+        "refined_user_message": "Sakit kepala",
+        "booking_record": "[1, 2]",
+    }, CLINIC)
+
+    assert response.parse_errors == ["available_time_slots", "case_type", "recommended_time", "booking_record"]
+    assert response.available_time_slots == []
+    assert response.case_type.case_type == "ROUTINE"
+    assert response.case_type.response_template == "Sakit kepala"
+    assert response.recommended_time.slot_found is False
+    assert response.booking_record == {}
+
+
+def test_parse_appointment_slots_wrapped_or_partly_invalid():
+    wrapped = parse_appointment({
+        "available_time_slots": '{"slots": [{"date": "2025-01-02", "time": "09:00"}]}',
+    }, CLINIC)
+    assert wrapped.parse_errors == []
+    assert [slot.time for slot in wrapped.available_time_slots] == ["09:00"]
+
+    partial = parse_appointment({
+        "available_time_slots": '[{"date": "2025-01-02", "time": "09:00"}, {"date": "2025-01-03"}]',
+    }, CLINIC)
+    assert len(partial.available_time_slots) == 1
+    assert partial.parse_errors == ["available_time_slots"]
+
+
+def test_parse_appointment_missing_columns_use_defaults():
+    response = parse_appointment({}, CLINIC)
+    assert response.parse_errors == []
+    assert response.refined_user_message == "Appointment processed"
+    assert response.case_type.response_template == "Appointment processed"
+
+
+def test_parse_appointment_empty_template_uses_refined_message():
+    response = parse_appointment({
+        "case_type": '{"case_type": "ROUTINE", "response_template": ""}',
+        "refined_user_message": "Batuk",
+    }, CLINIC)
+    assert response.parse_errors == []
+    assert response.case_type.response_template == "Batuk"
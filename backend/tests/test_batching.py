@@ -0,0 +1,63 @@
+# Micro-batching of concurrent Action Table rows
+import asyncio
+
+from app.services.batching import RowBatcher
+
+
+def make_batcher(max_batch_size=10, window_seconds=0.01, fail=False):
+    batches = []
+
+    async def send_batch(rows):
+        batches.append(list(rows))
+        await asyncio.sleep(0)
+        if fail:
+            raise RuntimeError("JamAI down")
+        return [f"result:{row['q']}" for row in rows]
+
+    return RowBatcher("table", send_batch, max_batch_size, window_seconds), batches
+
+
+def test_concurrent_rows_share_one_call_in_order():
+    async def main():
+        batcher, batches = make_batcher()
+        results = await asyncio.gather(*(batcher.submit({"q": i}) for i in range(5)))
+        assert results == [f"result:{i}" for i in range(5)]
+        assert batches == [[{"q": i} for i in range(5)]]
+        assert batcher.stats()["avg_batch_size"] == 5
+
+    asyncio.run(main())
+
+
+def test_full_batch_flushes_without_waiting_for_window():
+    async def main():
+        batcher, batches = make_batcher(max_batch_size=3, window_seconds=10)
+        results = await asyncio.wait_for(asyncio.gather(*(batcher.submit({"q": i}) for i in range(6))), 1)
+        assert len(results) == 6 and [len(batch) for batch in batches] == [3, 3]
+
+    asyncio.run(main())
+
+
+def test_batch_size_is_capped_at_jamai_limit():
+    batcher, _ = make_batcher(max_batch_size=500)
+    assert batcher.max_batch_size == 100
+
+
+def test_error_reaches_every_row():
+    async def main():
+        batcher, _ = make_batcher(fail=True)
+        results = await asyncio.gather(*(batcher.submit({"q": i}) for i in range(3)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    asyncio.run(main())
+
+
+def test_short_response_fills_missing_rows_with_none():
+    async def main():
+        async def send_batch(rows):
+            return ["only one"]
+
+        batcher = RowBatcher("table", send_batch, max_batch_size=10, window_seconds=0.01)
+        results = await asyncio.gather(batcher.submit({"q": 1}), batcher.submit({"q": 2}))
+        assert results == ["only one", None]
+
+    asyncio.run(main())
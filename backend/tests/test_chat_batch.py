@@ -0,0 +1,121 @@
+# /patients/chat/batch: many FAQ questions answered with one multi-row SOP QnA call
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from jamaibase import protocol as p
+
+from app.core.config import settings
+from app.main import app
+from app.services import jamai_services
+from app.services.answer_cache import sop_answer_cache
+from app.services.clinic_registry import get_clinic_name_from_id
+from app.services.jamai_services import jamai_service
+
+CLINIC_ID = "clinic_001"
+
+
+def _completion(text):
+    return p.ChatCompletionChunk(
+        id="test", created=0, model="test", usage=None,
+        choices=[p.ChatCompletionChoice(message=p.ChatEntry.assistant(text), index=0)],
+    )
+
+
+class FakeBatchTable:
+    """Answers each row with "A: <question>"; questions listed in `unanswered` get no response column."""
+
+    def __init__(self, unanswered=()):
+        self.unanswered = set(unanswered)
+        self.requests = []
+
+    async def add_table_rows(self, table_type, request):
+        questions = [row["question"] for row in request.data]
+        self.requests.append(questions)
+        rows = []
+        for i, question in enumerate(questions):
+            columns = {"source_doc": _completion("sop.pdf")}
+            if question not in self.unanswered:
+                columns["response"] = _completion(f"A: {question}")
+            rows.append(p.GenTableChatCompletionChunks(columns=columns, row_id=str(i)))
+        return p.GenTableRowsChatCompletionChunks(rows=rows)
+
+
+@pytest.fixture
+def fake_table(monkeypatch):
+    monkeypatch.setattr(jamai_services.answer_store, "enabled", False)
+
+    def install(table):
+        monkeypatch.setattr(jamai_service, "client", SimpleNamespace(table=table))
+        return table
+
+    return install
+
+
+def _post(questions, stream=False):
+    client = TestClient(app)  # Not entered, so the lifespan does not run
+    return client.post("/api/v1/patients/chat/batch", json={
+        "clinic_id": CLINIC_ID, "questions": questions, "language": "EN", "stream": stream
+    })
+
+
+def test_results_keep_question_order_with_cached_answers(fake_table):
+    table = fake_table(FakeBatchTable())
+    clinic_name = get_clinic_name_from_id(CLINIC_ID, None)
+    questions = ["Batch q1 parking?", "Batch q2 hours?", "Batch q3 fees?", "batch Q1 parking"]
+    sop_answer_cache.set(clinic_name, "Batch q2 hours?", "EN", {"response": "8am-5pm", "source_document": "hours.pdf"})
+
+    response = _post(questions)
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["index"] for result in results] == [0, 1, 2, 3]
+    assert [result["question"] for result in results] == questions
+    assert results[1] == {"index": 1, "question": "Batch q2 hours?", "reply": "8am-5pm",
+                          "source_document": "hours.pdf", "cached": True, "error": None}
+    assert results[0]["reply"] == results[3]["reply"] == "A: Batch q1 parking?"
+    assert results[2]["reply"] == "A: Batch q3 fees?" and not results[2]["cached"]
+    # One request for the uncached questions; the repeated question shares its row
+    assert table.requests == [["Batch q1 parking?", "Batch q3 fees?"]]
+
+
+def test_streamed_results_carry_their_index(fake_table):
+    fake_table(FakeBatchTable())
+    response = _post(["Batch stream a?", "Batch stream b?"], stream=True)
+    events = [message.split("\n") for message in response.text.split("\n\n") if message.startswith("event:")]
+    results = [json.loads(data[len("data: "):]) for event, data in events if event == "event: result"]
+    assert sorted((result["index"], result["reply"]) for result in results) == [
+        (0, "A: Batch stream a?"), (1, "A: Batch stream b?")
+    ]
+    assert events[-1] == ["event: done", 'data: {"count": 2}']
+
+
+def test_max_questions_enforced(fake_table, monkeypatch):
+    table = fake_table(FakeBatchTable())
+    monkeypatch.setattr(settings, "CHAT_BATCH_MAX_QUESTIONS", 3)
+    response = _post([f"Batch limit {i}?" for i in range(4)])
+    assert response.status_code == 422
+    assert "At most 3" in response.json()["detail"]
+    assert _post([]).status_code == 422
+    assert table.requests == []
+
+
+def test_failed_row_gets_fallback_without_failing_batch(fake_table):
+    fake_table(FakeBatchTable(unanswered={"Batch broken?"}))
+    response = _post(["Batch fine?", "Batch broken?", "   "])
+    assert response.status_code == 200
+    fine, broken, empty = response.json()["results"]
+    assert fine["reply"] == "A: Batch fine?" and fine["error"] is None
+    assert broken["error"] == "No answer generated" and broken["reply"] == "No answer found in documents"
+    assert empty["error"] == "Empty question"
+
+
+def test_failed_call_gives_every_question_a_fallback(fake_table):
+    class DownTable(FakeBatchTable):
+        async def add_table_rows(self, table_type, request):
+            raise RuntimeError("Invalid column")
+
+    fake_table(DownTable())
+    results = _post(["Batch down 1?", "Batch down 2?"]).json()["results"]
+    assert [result["error"] for result in results] == ["Document search failed"] * 2
+    assert all(result["reply"].startswith("Sorry, document search") for result in results)
@@ -0,0 +1,118 @@
+# Server-Sent Events from /patients/chat/stream
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from jamaibase import protocol as p
+
+from app.core.config import settings
+from app.main import app
+from app.services import jamai_services
+from app.services.jamai_services import jamai_service
+
+TABLE = settings.ACTION_TABLE_SOP_QNA
+
+
+def _chunk(column, text):
+    return p.GenTableStreamChatCompletionChunk(
+        id="test", created=0, model="test", usage=None, output_column_name=column, row_id="r0",
+        choices=[p.ChatCompletionChoice(message=p.ChatEntry.assistant(text), index=0)],
+    )
+
+
+class FakeStreamingTable:
+    """Streams the given chunks; `stall_after` chunks in, it hangs (a stalled JamAI stream)."""
+
+    def __init__(self, chunks, stall_after=None):
+        self.chunks = chunks
+        self.stall_after = stall_after
+        self.calls = 0
+
+    async def add_table_rows(self, table_type, request):
+        assert request.stream
+        self.calls += 1
+
+        async def stream():
+            for i, chunk in enumerate(self.chunks):
+                if i == self.stall_after:
+                    await asyncio.sleep(60)
+                yield chunk
+
+        return stream()
+
+
+@pytest.fixture
+def fake_table(monkeypatch):
+    monkeypatch.setattr(jamai_services.answer_store, "enabled", False)
+
+    def install(table):
+        monkeypatch.setattr(jamai_service, "client", SimpleNamespace(table=table))
+        return table
+
+    yield install
+    jamai_service.reset_circuit_breakers(TABLE)
+
+
+def _events(body: str):
+    """Parse an SSE body into [(event, data)], checking the framing along the way."""
+    events = []
+    for message in body.split("\n\n"):
+        if not message or message.startswith(":"):
+            continue
+        lines = message.split("\n")
+        assert len(lines) == 2 and lines[0].startswith("event: ") and lines[1].startswith("data: "), message
+        events.append((lines[0][len("event: "):], json.loads(lines[1][len("data: "):])))
+    return events
+
+
+def _stream(message):
+    client = TestClient(app)  # Not entered, so the lifespan (FAQ warm-up, job workers) does not run
+    response = client.post("/api/v1/patients/chat/stream", json={
+        "clinic_id": "clinic_001", "message": message, "language": "EN"
+    })
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.startswith(": stream opened\n\n")
+    return _events(response.text)
+
+
+def test_streams_response_chunks_then_done(fake_table):
+    table = fake_table(FakeStreamingTable([
+        _chunk("response", "Klinik dibuka "), _chunk("response", "8 pagi."), _chunk("source_doc", "sop.pdf"),
+    ]))
+    events = _stream("What time does the clinic open? (stream test)")
+    assert events == [
+        ("response", {"text": "Klinik dibuka "}),
+        ("response", {"text": "8 pagi."}),
+        ("done", {"source_document": "sop.pdf"}),
+    ]
+    assert table.calls == 1
+
+    # The finished answer is cached and replayed as one chunk without calling JamAI
+    assert _stream("What time does the clinic open? (stream test)") == [
+        ("response", {"text": "Klinik dibuka 8 pagi."}),
+        ("done", {"source_document": "sop.pdf"}),
+    ]
+    assert table.calls == 1
+
+
+def test_stalled_stream_ends_with_fallback(fake_table, monkeypatch):
+    fake_table(FakeStreamingTable([_chunk("response", "Klinik "), _chunk("response", "dibuka")], stall_after=1))
+    monkeypatch.setitem(jamai_service._deadlines, TABLE, 0.2)
+    events = _stream("Is the clinic open on Sunday? (stall test)")
+    assert events[0] == ("response", {"text": "Klinik "})
+    assert events[-1][0] == "error" and "document search" in events[-1][1]["reply"]
+    assert all(event != "done" for event, _ in events)
+
+
+def test_open_breaker_ends_with_fallback(fake_table):
+    table = fake_table(FakeStreamingTable([_chunk("response", "unused")]))
+    breaker = jamai_service._breakers[TABLE]
+    for _ in range(breaker.failure_threshold):
+        breaker.before_call()
+        breaker.record_failure(TimeoutError())
+    events = _stream("Do you accept walk-in patients? (breaker test)")
+    assert [event for event, _ in events] == ["error"]
+    assert table.calls == 0
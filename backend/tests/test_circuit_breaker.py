@@ -0,0 +1,134 @@
+# Per-table circuit breakers
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.services import circuit_breaker
+from app.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, ActionTableTimeout, CircuitBreaker, CircuitOpenError
+from app.services.hedging import is_transient
+from app.services.jamai_services import jamai_service
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return clock
+
+
+def _trip(breaker, failures):
+    for _ in range(failures):
+        breaker.before_call()
+        breaker.record_failure(RuntimeError("502 Bad Gateway"))
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("test-open", failure_threshold=3, recovery_seconds=30)
+    _trip(breaker, 2)
+    breaker.before_call()
+    breaker.record_success()  # A success resets the streak
+    _trip(breaker, 2)
+    assert breaker.state == CLOSED
+
+    _trip(breaker, 1)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    stats = breaker.stats()
+    assert stats["rejected"] == 1 and stats["retry_in_seconds"] == 30.0
+    assert stats["transitions"][-1]["to"] == OPEN
+
+
+def test_half_open_probe_success_closes(clock):
+    breaker = CircuitBreaker("test-probe", failure_threshold=1, recovery_seconds=30, half_open_probes=1)
+    _trip(breaker, 1)
+    clock.now += 30
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.check()  # Only one probe at a time
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.before_call()
+
+
+def test_half_open_probe_failure_reopens(clock):
+    breaker = CircuitBreaker("test-reopen", failure_threshold=1, recovery_seconds=30)
+    _trip(breaker, 1)
+    clock.now += 30
+    _trip(breaker, 1)
+    assert breaker.state == OPEN
+    clock.now += 29
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_released_probe_frees_its_slot(clock):
+    breaker = CircuitBreaker("test-release", failure_threshold=1, recovery_seconds=30)
+    _trip(breaker, 1)
+    clock.now += 30
+    breaker.before_call()
+    breaker.release()
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+
+
+def test_reset_closes(clock):
+    breaker = CircuitBreaker("test-reset", failure_threshold=1, recovery_seconds=30)
+    _trip(breaker, 1)
+    breaker.reset()
+    assert breaker.state == CLOSED and breaker.consecutive_failures == 0
+    breaker.before_call()
+    assert breaker.stats()["transitions"][-1]["reason"] == "manual reset"
+
+
+def test_only_transient_errors_count(clock):
+    breaker = CircuitBreaker("test-transient", failure_threshold=2, recovery_seconds=30, is_failure=is_transient)
+    for _ in range(5):
+        breaker.before_call()
+        breaker.record_failure(RuntimeError("Column 'question' is required"))
+    assert breaker.state == CLOSED and breaker.consecutive_failures == 0
+
+    for error in (ActionTableTimeout("slow"), RuntimeError("503 Service Unavailable")):
+        breaker.before_call()
+        breaker.record_failure(error)
+    assert breaker.state == OPEN
+
+
+def test_bad_request_probe_frees_the_probe_slot(clock):
+    breaker = CircuitBreaker("test-probe-4xx", failure_threshold=1, recovery_seconds=30, is_failure=is_transient)
+    _trip(breaker, 1)
+    clock.now += 30
+    breaker.before_call()
+    breaker.record_failure(RuntimeError("Invalid table_id"))
+    assert breaker.state == HALF_OPEN
+    breaker.before_call()  # The next call may still probe
+
+
+def test_malformed_requests_do_not_open_table_breaker(monkeypatch):
+    async def add_table_rows(table_type, request):
+        raise RuntimeError("Validation error: column 'user_input' is too long")
+
+    monkeypatch.setattr(jamai_service, "client", SimpleNamespace(table=SimpleNamespace(add_table_rows=add_table_rows)))
+    table_id = settings.ACTION_TABLE_LOOKUP
+
+    async def main():
+        for _ in range(settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD + 2):
+            with pytest.raises(RuntimeError):
+                await jamai_service._add_action_rows(table_id, [{"user_input": "x" * 10000, "clinic_name": "A"}])
+
+    try:
+        asyncio.run(main())
+        assert jamai_service.circuit_breaker_stats()[table_id]["state"] == CLOSED
+    finally:
+        jamai_service.reset_circuit_breakers(table_id)
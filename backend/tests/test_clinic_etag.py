@@ -0,0 +1,53 @@
+# Conditional GET on the clinic list/detail endpoints
+import asyncio
+
+import httpx
+import pytest
+
+from app.api.v1.clinics import _etag_matches
+from app.main import app
+
+
+@pytest.mark.parametrize("if_none_match, expected", [
+    (None, False),
+    ("", False),
+    ("*", True),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"xyz", W/"abc"', True),
+    ('"xyz"', False),
+])
+def test_etag_matches(if_none_match, expected):
+    assert _etag_matches(if_none_match, '"abc"') is expected
+
+
+def _get(path, headers_for_second):
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+            first = await client.get(path)
+            second = await client.get(path, headers=headers_for_second(first.headers["etag"]))
+            return first, second
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("path", ["/api/v1/clinics", "/api/v1/clinics/clinic_001"])
+def test_matching_etag_returns_304(path):
+    first, second = _get(path, lambda etag: {"If-None-Match": etag})
+    assert first.status_code == 200 and first.content
+    assert second.status_code == 304 and not second.content
+    # The 200 may carry the weakened ETag of a compressed body; both name the same representation
+    assert second.headers["etag"] == first.headers["etag"].removeprefix("W/")
+    assert "max-age" in second.headers["cache-control"]
+
+
+def test_weak_etag_from_compressed_response_returns_304():
+    # CompressionMiddleware sends W/"..." on compressed bodies; clients echo it back as-is
+    first, second = _get("/api/v1/clinics", lambda etag: {"If-None-Match": f"W/{etag.removeprefix('W/')}"})
+    assert second.status_code == 304
+
+
+def test_stale_etag_returns_body():
+    first, second = _get("/api/v1/clinics", lambda etag: {"If-None-Match": '"stale"'})
+    assert second.status_code == 200
+    assert second.content == first.content
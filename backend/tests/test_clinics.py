@@ -0,0 +1,29 @@
+# Public clinic payloads
+import asyncio
+
+import httpx
+
+from app.main import app
+from app.models.clinic import Clinic, ClinicCapacity, ClinicResponse
+
+INTERNAL_FIELDS = {"aliases", "capacity", "faq_questions"}
+
+
+def test_public_dump_hides_registry_internals():
+    clinic = Clinic(
+        clinic_id="clinic_009", name="Klinik Ujian", address="Jalan 1", phone="03-1234",
+        operating_hours="8am-5pm", aliases=["old_id"], capacity=ClinicCapacity(weight=2.0),
+        faq_questions={"EN": ["Opening hours?"]},
+    )
+    dumped = clinic.public_dump()
+    assert set(dumped) == set(ClinicResponse.model_fields)
+    assert not INTERNAL_FIELDS & set(dumped)
+
+
+def test_patient_clinic_list_is_public():
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+            return (await client.get("/api/v1/patients/clinics")).json()
+
+    clinics = asyncio.run(main())
+    assert clinics and all(set(clinic) == set(ClinicResponse.model_fields) for clinic in clinics)
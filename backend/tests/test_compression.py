@@ -0,0 +1,113 @@
+# Accept-Encoding negotiation and CompressionMiddleware
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import Response, StreamingResponse
+
+from app.core.compression import CompressionMiddleware, brotli, choose_encoding, parse_accept_encoding
+
+BIG = b'{"answer": "' + b"Klinik dibuka 8 pagi. " * 200 + b'"}'
+SMALL = b'{"answer": "ok"}'
+
+api = FastAPI()
+api.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+
+@api.get("/big")
+async def big():
+    return Response(content=BIG, media_type="application/json", headers={"ETag": '"v1"'})
+
+
+@api.get("/small")
+async def small():
+    return Response(content=SMALL, media_type="application/json")
+
+
+@api.get("/png")
+async def png():
+    return Response(content=b"\x89PNG" * 1000, media_type="image/png")
+
+
+@api.get("/sse")
+async def sse():
+    async def events():
+        for i in range(3):
+            yield f"data: {'x' * 600} {i}\n\n"
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@api.get("/stream")
+async def stream():
+    async def chunks():
+        for _ in range(3):
+            yield BIG
+    return StreamingResponse(chunks(), media_type="application/json")
+
+
+def _get(path, accept_encoding):
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api), base_url="http://t") as client:
+            return await client.get(path, headers={"Accept-Encoding": accept_encoding})
+
+    return asyncio.run(main())
+
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding("gzip, br;q=0.8, identity;q=bad, ") == {"gzip": 1.0, "br": 0.8, "identity": 0.0}
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("gzip, br", "br"),  # Tie goes to the server's preference
+    ("br;q=0.5, gzip", "gzip"),
+    ("*", "br"),
+    ("*, br;q=0", "gzip"),
+])
+def test_choose_encoding(header, expected):
+    assert choose_encoding(header, ("br", "gzip")) == expected
+
+
+def test_gzip_body_with_weak_etag_and_vary():
+    response = _get("/big", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) < len(BIG)
+    assert response.headers["etag"] == 'W/"v1"'
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.content == BIG
+
+
+@pytest.mark.skipif(brotli is None, reason="brotli not installed")
+def test_brotli_preferred():
+    response = _get("/big", "gzip, deflate, br")
+    assert response.headers["content-encoding"] == "br"
+    assert response.content == BIG
+
+
+def test_identity_still_varies():
+    response = _get("/big", "identity")
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == '"v1"'
+    assert "Accept-Encoding" in response.headers["vary"]
+
+
+@pytest.mark.parametrize("path", ["/small", "/png"])
+def test_small_and_binary_bodies_pass_through(path):
+    response = _get(path, "gzip")
+    assert "content-encoding" not in response.headers
+
+
+def test_sse_passes_through():
+    response = _get("/sse", "gzip, br")
+    assert "content-encoding" not in response.headers
+    assert response.text.count("data: ") == 3
+
+
+def test_stream_compressed_chunk_by_chunk():
+    response = _get("/stream", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.content == BIG * 3
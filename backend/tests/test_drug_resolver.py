@@ -0,0 +1,161 @@
+# Drug name resolution and the local medication index
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.answer_store import AnswerStore
+from app.services.drug_resolver import DEFAULT_SYNONYMS_PATH, DrugNameResolver
+from app.services.jamai_services import jamai_service
+from app.services.medication_index import MedicationIndex, normalize_drug_name
+from app.services import jamai_services
+
+CLINIC = "Klinik Sri Hartamas"
+CSV = """english_name,malay_name,generic_name,stock_quantity,unit,price_rm,reorder_level,category,common_uses,location,supplier,clinic,expiry_date
+Panadol,Panadol,Paracetamol,150,tablets,0.15,30,Pain Relief,Fever,SHELF-A1,PharmaCare,Klinik Sri Hartamas,31/12/2025
+Painkiller,Ubat Sakit,Ibuprofen,85,tablets,0.25,20,Pain Relief,Body pain,SHELF-A1,MediSupply,Klinik Sri Hartamas,15/3/2026
+Antibiotic,Antibiotik,Amoxicillin,60,capsules,0.80,15,Antibiotics,Infections,SHELF-B2,PharmaCare,Klinik Sri Hartamas,1/6/2026
+Cough Syrup,Ubat Batuk,Dextromethorphan,40,bottles,6.50,10,Cough,Dry cough,SHELF-C1,MediSupply,Klinik Sri Hartamas,1/9/2026
+Worm Tablets,Ubat Cacing,Mebendazole,30,tablets,1.20,10,Antiparasitic,Worms,SHELF-C3,PharmaCare,Klinik Sri Hartamas,1/9/2026
+"""
+
+
+@pytest.fixture
+def index(tmp_path):
+    (tmp_path / "medication_inventory.csv").write_text(CSV, encoding="utf-8")
+    return MedicationIndex(str(tmp_path))
+
+
+@pytest.fixture
+def resolver(index):
+    return DrugNameResolver(index, DEFAULT_SYNONYMS_PATH, min_score=0.5)
+
+
+def test_resolve_exact_synonym_and_typo(resolver):
+    assert resolver.resolve("pcm") == [("Paracetamol", 1.0)]
+    assert resolver.resolve("panadol") == [("Paracetamol", 1.0)]
+    name, score = resolver.resolve("paracetmol")[0]
+    assert name == "Paracetamol" and score < 1.0
+
+
+def test_exact_match_ignores_near_misses(resolver):
+    assert resolver.exact_match("PCM") == "Paracetamol"
+    assert resolver.exact_match("paracetmol") is None
+    assert resolver.exact_match("penicillin") is None
+
+
+@pytest.mark.parametrize("question", [
+    "What medicine for cough?",
+    "ubat",
+    "Patient allergic to penicillin, what can we give?",
+    "panadl stock",
+])
+def test_canonicalize_leaves_ordinary_words_and_typos_alone(resolver, question):
+    assert resolver.canonicalize(question) == normalize_drug_name(question)
+
+
+def test_canonicalize_substitutes_synonyms(resolver):
+    assert resolver.canonicalize("pcm stok tinggal berapa") == "Paracetamol stok tinggal berapa"
+
+
+def test_answer_question_single_drug(index):
+    assert index.answer_question(CLINIC, "Panadol stock tinggal berapa?").generic_name == "Paracetamol"
+    assert index.answer_question(CLINIC, "Panadol or ibuprofen?") is None
+    assert index.answer_question("Klinik Lain", "Panadol stock?") is None
+
+
+@pytest.mark.parametrize("question", [
+    "Patient allergic to amoxicillin, stock?",
+    "Pesakit alahan amoxicillin",
+    "Can pregnant women take ibuprofen?",
+    "Ibuprofen boleh untuk ibu hamil?",
+    "Give paracetamol instead?",
+    "Ganti ibuprofen dengan apa?",
+])
+def test_answer_question_defers_open_ended(index, question):
+    assert index.answer_question(CLINIC, question) is None
+
+
+@pytest.mark.parametrize("question", [
+    "What medicine for cough?",
+    "Patient allergic to penicillin, what can we give?",
+])
+def test_lookup_sends_question_as_typed(monkeypatch, index, resolver, question):
+    monkeypatch.setattr(jamai_services, "medication_index", index)
+    monkeypatch.setattr(jamai_services, "drug_resolver", resolver)
+    monkeypatch.setattr(jamai_services.answer_store, "enabled", False)
+    sent = []
+
+    async def fake_add_row(table_id, row, language="", priority=0, coalesce_row=None):
+        sent.append(row)
+        return None
+
+    monkeypatch.setattr(jamai_service, "_add_action_row_once", fake_add_row)
+    result = asyncio.run(jamai_service.medication_lookup_staff(CLINIC, question))
+
+    assert result["answered_from"] == "action_table"
+    assert sent == [{"user_input": question, "clinic_name": CLINIC}]
+
+
+def test_lookup_answers_synonym_locally(monkeypatch, index, resolver):
+    monkeypatch.setattr(jamai_services, "medication_index", index)
+    monkeypatch.setattr(jamai_services, "drug_resolver", resolver)
+    result = asyncio.run(jamai_service.medication_lookup_staff(CLINIC, "pcm stok?"))
+    assert result["answered_from"] == "inventory_index"
+    result = asyncio.run(jamai_service.medication_lookup_staff(CLINIC, "stok?", drug_name="pcm"))
+    assert result["answered_from"] == "inventory_index"
+
+
+def test_synonyms_share_one_action_table_call(monkeypatch, tmp_path, index, resolver):
+    monkeypatch.setattr(jamai_services, "medication_index", index)
+    monkeypatch.setattr(jamai_services, "drug_resolver", resolver)
+    store = AnswerStore(str(tmp_path / "answers.sqlite3"), ttl_seconds=60, max_entries=100, max_bytes=1 << 20)
+    monkeypatch.setattr(jamai_services, "answer_store", store)
+    sent = []
+
+    async def fake_add_row(table_id, row):
+        sent.append(row["user_input"])
+        await asyncio.sleep(0.05)
+        columns = {"drug_entry": SimpleNamespace(text="{}"), "medication_message": SimpleNamespace(text="Boleh")}
+        return SimpleNamespace(columns=columns)
+
+    monkeypatch.setattr(jamai_service, "_add_action_row", fake_add_row)
+
+    async def main():
+        # In flight together: coalesced on the canonical question
+        together = await asyncio.gather(
+            jamai_service.medication_lookup_staff(CLINIC, "pcm boleh untuk ibu hamil?"),
+            jamai_service.medication_lookup_staff(CLINIC, "Paracetamol boleh untuk ibu hamil?"),
+        )
+        # Later: answered from the store under the canonical key
+        later = await jamai_service.medication_lookup_staff(CLINIC, "Parasetamol boleh untuk ibu hamil")
+        return together, later
+
+    together, later = asyncio.run(main())
+    # One call, with whichever caller led it sending its question as typed
+    assert len(sent) == 1 and sent[0] in ("pcm boleh untuk ibu hamil?", "Paracetamol boleh untuk ibu hamil?")
+    assert [result["medication_message"] for result in together] == ["Boleh", "Boleh"]
+    assert later["answered_from"] == "answer_store"
+
+
+def test_misspelling_is_not_coalesced(monkeypatch, index, resolver):
+    monkeypatch.setattr(jamai_services, "medication_index", index)
+    monkeypatch.setattr(jamai_services, "drug_resolver", resolver)
+    monkeypatch.setattr(jamai_services.answer_store, "enabled", False)
+    sent = []
+
+    async def fake_add_row(table_id, row):
+        sent.append(row["user_input"])
+        await asyncio.sleep(0.05)
+        return None
+
+    monkeypatch.setattr(jamai_service, "_add_action_row", fake_add_row)
+
+    async def main():
+        await asyncio.gather(
+            jamai_service.medication_lookup_staff(CLINIC, "paracetmol boleh untuk ibu hamil?"),
+            jamai_service.medication_lookup_staff(CLINIC, "paracetamol boleh untuk ibu hamil?"),
+        )
+
+    asyncio.run(main())
+    assert len(sent) == 2
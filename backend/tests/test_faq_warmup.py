@@ -0,0 +1,162 @@
+# FAQ warm-up: mined starter questions, the warm cycle and the one-worker lease
+import asyncio
+
+import pytest
+
+from app.core.config import Settings
+from app.models.clinic import Clinic
+from app.services import faq_warmup
+from app.services.answer_cache import sop_answer_cache
+from app.services.answer_store import NAMESPACE_SOP, AnswerStore
+from app.services.clinic_registry import clinic_registry
+from app.services.faq_warmup import FaqWarmer, QuestionMiner
+
+CLINIC_ID = "clinic_001"
+QUESTIONS = {"EN": ["Warm-up hours?", "Warm-up fees?"]}
+
+
+class FakeJamAI:
+    """batch_pdf_sop_answering stand-in that answers and stores like the real one; `failing` questions error."""
+
+    def __init__(self, store, failing=()):
+        self.store = store
+        self.failing = set(failing)
+        self.calls = []
+
+    async def batch_pdf_sop_answering(self, clinic_name, questions, language, use_cache=True):
+        self.calls.append(list(questions))
+        results = []
+        for question in questions:
+            if question in self.failing:
+                results.append({"response": "fallback", "source_document": "", "cached": False,
+                                "error": "No answer generated"})
+                continue
+            answer = {"response": f"A: {question}", "source_document": "sop.pdf"}
+            sop_answer_cache.set(clinic_name, question, language, answer)
+            await self.store.set(NAMESPACE_SOP, clinic_name, question, language, answer)
+            results.append({**answer, "cached": False, "error": None})
+        return results
+
+
+@pytest.fixture
+def clinic():
+    clinic = clinic_registry.get(CLINIC_ID)
+    sop_answer_cache.invalidate_clinic(clinic.name)
+    yield clinic
+    sop_answer_cache.invalidate_clinic(clinic.name)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = AnswerStore(str(tmp_path / "answers.sqlite3"), ttl_seconds=3600, max_entries=100, max_bytes=1 << 20)
+    monkeypatch.setattr(faq_warmup, "answer_store", store)
+    return store
+
+
+def make_warmer(default_questions=QUESTIONS, **options):
+    options = {"max_questions": 20, "mined_top_n": 5, "mined_min_count": 2, "interval_seconds": 900,
+               "stale_seconds": 2400, "after_upload_delay_seconds": 0, "enabled": False, **options}
+    return FaqWarmer(default_questions=default_questions, languages=["en"],
+                     miner=QuestionMiner(max_tracked=options.pop("max_tracked", 50)), **options)
+
+
+def test_miner_ranks_and_decays():
+    miner = QuestionMiner(max_tracked=3)
+    for question, times in [("Parking?", 5), ("Fees?", 3), ("Hours?", 2)]:
+        for _ in range(times):
+            miner.record(CLINIC_ID, question, "en")
+    miner.record(CLINIC_ID, "  PARKING ", "EN")  # Same question after normalization
+    assert miner.top(CLINIC_ID, "EN", n=2, min_count=1) == ["Parking?", "Fees?"]
+    assert miner.top(CLINIC_ID, "EN", n=5, min_count=3) == ["Parking?", "Fees?"]
+    assert miner.top(CLINIC_ID, "BM", n=5, min_count=1) == []
+
+    miner.record(CLINIC_ID, "Vaccines?", "EN")  # Full: the least frequent question makes room
+    assert "Hours?" not in miner.top(CLINIC_ID, "EN", n=5, min_count=1)
+
+    miner.decay()
+    assert miner.top(CLINIC_ID, "EN", n=5, min_count=1) == ["Parking?", "Fees?"]  # 6 -> 3, 3 -> 1; 1 dropped
+
+
+def test_questions_configured_then_mined_deduplicated_and_capped():
+    warmer = make_warmer(max_questions=4)
+    clinic = Clinic(clinic_id="clinic_test", name="Klinik Ujian", address="", phone="", operating_hours="",
+                    faq_questions={"EN": ["Do you do vaccinations?"]})
+    for question in ["warm-up HOURS", "Is there parking?", "Is there parking?", "Lone question?"]:
+        warmer.miner.record(clinic.clinic_id, question, "EN")
+    assert warmer.questions_for(clinic, "EN") == [
+        ("Warm-up hours?", "configured"),
+        ("Warm-up fees?", "configured"),
+        ("Do you do vaccinations?", "configured"),
+        ("Is there parking?", "mined"),  # "Lone question?" is below mined_min_count
+    ]
+    assert len(make_warmer(max_questions=2).questions_for(clinic, "EN")) == 2
+
+
+def test_warm_cycle(clinic, store, monkeypatch):
+    jamai = FakeJamAI(store)
+    monkeypatch.setattr(faq_warmup, "jamai_service", jamai)
+    warmer = make_warmer()
+
+    async def main():
+        first = await warmer.warm(CLINIC_ID)
+        second = await warmer.warm(CLINIC_ID)
+        warmer.knowledge_updated(CLINIC_ID)  # New documents: every answer is stale
+        await asyncio.sleep(0.01)
+        third = await warmer.warm(CLINIC_ID)
+        return first, second, third
+
+    first, second, third = asyncio.run(main())
+    assert first[CLINIC_ID] == {"warmed": 2, "failed": 0, "fresh": 0}
+    assert second[CLINIC_ID] == {"warmed": 0, "failed": 0, "fresh": 2}
+    assert third[CLINIC_ID] == {"warmed": 2, "failed": 0, "fresh": 0}
+    assert jamai.calls == [QUESTIONS["EN"], QUESTIONS["EN"]]
+    assert sop_answer_cache.get(clinic.name, "Warm-up hours?", "EN")["response"] == "A: Warm-up hours?"
+    assert warmer.status(CLINIC_ID)["clinics"][CLINIC_ID]["counts"]["warm"] == 2
+
+
+def test_failed_questions_retried_on_next_run(clinic, store, monkeypatch):
+    jamai = FakeJamAI(store, failing={"Warm-up fees?"})
+    monkeypatch.setattr(faq_warmup, "jamai_service", jamai)
+    warmer = make_warmer()
+
+    asyncio.run(warmer.warm(CLINIC_ID))
+    assert warmer.status(CLINIC_ID)["clinics"][CLINIC_ID]["counts"] == {"warm": 1, "stale": 0, "failed": 1, "cold": 0}
+    jamai.failing.clear()
+    asyncio.run(warmer.warm(CLINIC_ID))
+    assert jamai.calls[-1] == ["Warm-up fees?"]
+
+
+def test_stale_answers_recomputed(clinic, store, monkeypatch):
+    jamai = FakeJamAI(store)
+    monkeypatch.setattr(faq_warmup, "jamai_service", jamai)
+    warmer = make_warmer(stale_seconds=0)
+    asyncio.run(warmer.warm(CLINIC_ID))
+    asyncio.run(warmer.warm(CLINIC_ID))
+    assert len(jamai.calls) == 2
+
+
+def test_only_the_lease_holder_calls_jamai(clinic, store, monkeypatch):
+    jamai = FakeJamAI(store)
+    monkeypatch.setattr(faq_warmup, "jamai_service", jamai)
+    # Two uvicorn workers sharing one answer store
+    leader, follower = make_warmer(), make_warmer()
+
+    async def main():
+        await leader.scheduled_warm()
+        leader_calls = len(jamai.calls)
+        sop_answer_cache.invalidate_clinic(clinic.name)  # The follower's process cache starts empty
+        return leader_calls, await follower.scheduled_warm()
+
+    leader_calls, follower_results = asyncio.run(main())
+    assert leader.leader is True and follower.leader is False
+    assert leader_calls > 0 and len(jamai.calls) == leader_calls  # Only the leader asked JamAI
+    assert follower_results[CLINIC_ID] == {"warmed": 0, "failed": 0, "fresh": 2}
+    assert sop_answer_cache.get(clinic.name, "Warm-up hours?", "EN") is not None
+    assert follower.status()["leader"] is False
+
+
+def test_default_stale_plus_interval_below_cache_ttl(monkeypatch):
+    for name in ("FAQ_WARM_STALE_SECONDS", "FAQ_WARM_INTERVAL_SECONDS", "ANSWER_CACHE_TTL_SECONDS"):
+        monkeypatch.delenv(name, raising=False)
+    defaults = Settings(_env_file=None)
+    assert defaults.FAQ_WARM_STALE_SECONDS + defaults.FAQ_WARM_INTERVAL_SECONDS < defaults.ANSWER_CACHE_TTL_SECONDS
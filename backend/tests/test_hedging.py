@@ -0,0 +1,113 @@
+# Retries, hedged requests and the shared extra-call budget
+import asyncio
+
+import httpx
+import pytest
+from jamaibase.exceptions import ServerBusyError
+
+from app.services.circuit_breaker import ActionTableTimeout, CircuitBreaker
+from app.services.hedging import ExtraCallBudget, Hedger, is_transient
+
+
+@pytest.mark.parametrize("error,transient", [
+    (httpx.ConnectError("refused"), True),
+    (httpx.ReadTimeout("slow"), True),
+    (ActionTableTimeout("deadline"), True),
+    (ServerBusyError("busy"), True),
+    (RuntimeError("Service Unavailable"), True),
+    (RuntimeError("Rate limit exceeded, please try again"), True),
+    (RuntimeError("Invalid table_id"), False),
+    (RuntimeError("Unauthorized"), False),
+    (RuntimeError("You do not have permission to access this project"), False),
+    (ValueError("bad"), False),
+])
+def test_is_transient(error, transient):
+    assert is_transient(error) is transient
+
+
+def test_budget_caps_extra_calls():
+    budget = ExtraCallBudget(ratio=0.5, burst=2)
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
+    budget.deposit()
+    budget.deposit()
+    assert budget.try_spend()
+    assert budget.stats()["spent"] == 3 and budget.stats()["denied"] == 1
+
+
+def make_hedger(**options):
+    options.setdefault("retry_base_seconds", 0.0)
+    return Hedger("table", options.pop("budget", ExtraCallBudget(ratio=0.0, burst=10)), **options)
+
+
+def flaky(errors, result="ok"):
+    """An attempt that raises each error in turn, then returns `result`; counts its calls."""
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+
+    return attempt, calls
+
+
+def test_retries_transient_errors():
+    attempt, calls = flaky([httpx.ReadTimeout("slow"), RuntimeError("Bad Gateway")])
+    assert asyncio.run(make_hedger(max_retries=2).call(attempt)) == "ok"
+    assert len(calls) == 3
+
+
+def test_does_not_retry_client_errors():
+    attempt, calls = flaky([RuntimeError("Invalid input")])
+    with pytest.raises(RuntimeError):
+        asyncio.run(make_hedger().call(attempt))
+    assert len(calls) == 1
+
+
+def test_retries_stop_when_budget_is_spent():
+    attempt, calls = flaky([httpx.ReadTimeout("slow")] * 3)
+    hedger = make_hedger(budget=ExtraCallBudget(ratio=0.0, burst=1), max_retries=3)
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(hedger.call(attempt))
+    assert len(calls) == 2 and hedger.counts["retries_denied"] == 1
+
+
+def test_writes_only_retry_unsent_calls():
+    hedger = make_hedger(idempotent=False, hedge=True)
+    assert not hedger.hedge
+    attempt, calls = flaky([httpx.ConnectError("refused")])
+    assert asyncio.run(hedger.call(attempt)) == "ok" and len(calls) == 2
+    attempt, calls = flaky([httpx.ReadTimeout("slow")])
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(hedger.call(attempt))
+    assert len(calls) == 1
+
+
+def test_no_retry_while_half_open():
+    breaker = CircuitBreaker("table", failure_threshold=1, recovery_seconds=0.0)
+    breaker.before_call()
+    breaker.record_failure(RuntimeError("boom"))
+    breaker.check()  # recovery elapsed: half-open
+    assert breaker.state == "half_open"
+    attempt, calls = flaky([httpx.ReadTimeout("slow")])
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(make_hedger(breaker=breaker).call(attempt))
+    assert len(calls) == 1
+
+
+def test_hedge_wins_over_slow_primary():
+    async def main():
+        hedger = make_hedger(hedge=True, min_samples=1, min_delay_seconds=0.01)
+        hedger.latency.observe(0.01)
+        delays = iter([1.0, 0.0])
+
+        async def attempt():
+            await asyncio.sleep(next(delays))
+            return "done"
+
+        assert await asyncio.wait_for(hedger.call(attempt), 0.5) == "done"
+        assert hedger.counts["hedges"] == 1 and hedger.counts["hedges_won"] == 1
+
+    asyncio.run(main())
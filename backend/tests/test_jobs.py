@@ -0,0 +1,257 @@
+# Background job manager: polling, idempotency, queue bound, webhook validation and delivery
+import asyncio
+import hashlib
+import hmac
+
+import httpx
+import orjson
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import jobs
+from app.services.jobs import JOB_FAILED, JOB_SUCCEEDED, JobManager, is_public_address
+
+PUBLIC_URL = "http://93.184.216.34/hook"
+
+
+def make_manager(**overrides):
+    options = dict(
+        workers=2, max_pending=10, result_ttl_seconds=60, max_retained=100,
+        webhook_timeout_seconds=1, webhook_max_attempts=2, webhook_allowed_hosts="*",
+    )
+    options.update(overrides)
+    return JobManager(**options)
+
+
+async def _wait(job):
+    for _ in range(200):
+        if job.finished:
+            return job
+        await asyncio.sleep(0.005)
+    raise AssertionError("job did not finish")
+
+
+@pytest.mark.parametrize("address,public", [
+    ("93.184.216.34", True),
+    ("2606:2800:220:1:248:1893:25c8:1946", True),
+    ("127.0.0.1", False),
+    ("10.0.0.5", False),
+    ("192.168.1.10", False),
+    ("169.254.169.254", False),
+    ("0.0.0.0", False),
+    ("240.0.0.1", False),
+    ("224.0.0.1", False),
+    ("::1", False),
+    ("fe80::1%eth0", False),
+    ("::ffff:127.0.0.1", False),
+])
+def test_is_public_address(address, public):
+    assert is_public_address(address) is public
+
+
+@pytest.mark.parametrize("url,allowed_hosts", [
+    (PUBLIC_URL, ""),  # no allowlist: webhooks are off
+    ("ftp://93.184.216.34/hook", "*"),
+    ("/relative/hook", "*"),
+    (PUBLIC_URL, "hooks.example.com"),
+    ("http://127.0.0.1:8000/hook", "*"),
+    ("http://169.254.169.254/latest/meta-data", "*"),
+    ("http://[::1]/hook", "*"),
+    ("http://localhost/hook", "localhost"),
+])
+def test_webhook_url_refused(url, allowed_hosts):
+    manager = make_manager(webhook_allowed_hosts=allowed_hosts)
+    with pytest.raises(ValueError):
+        asyncio.run(manager.validate_webhook_url(url))
+
+
+def test_webhook_url_accepted():
+    asyncio.run(make_manager().validate_webhook_url(PUBLIC_URL))
+    asyncio.run(make_manager(webhook_allowed_hosts="localhost", webhook_allow_private=True)
+                .validate_webhook_url("http://localhost:9000/hook"))
+
+
+def test_job_result_and_error():
+    async def main():
+        manager = make_manager()
+
+        async def ok():
+            return {"answer": 42}
+
+        async def bad_request():
+            raise HTTPException(status_code=400, detail="clinic not found")
+
+        async def crash():
+            raise RuntimeError("boom")
+
+        done = await _wait(await manager.submit("triage", "clinic_001", ok))
+        assert done.status == JOB_SUCCEEDED and done.result == {"answer": 42}
+        assert manager.get(done.job_id) is done
+
+        failed = await _wait(await manager.submit("triage", "clinic_001", bad_request))
+        assert failed.status == JOB_FAILED and failed.error == {"status_code": 400, "detail": "clinic not found"}
+
+        crashed = await _wait(await manager.submit("triage", "clinic_001", crash))
+        assert crashed.error["status_code"] == 500
+
+    asyncio.run(main())
+
+
+def test_idempotency_key_is_scoped():
+    async def main():
+        manager = make_manager()
+        calls = []
+
+        async def run():
+            calls.append(1)
+            return {}
+
+        first = await manager.submit("appointment", "clinic_001", run, idempotency_key="abc")
+        again = await manager.submit("appointment", "clinic_001", run, idempotency_key="abc")
+        other_clinic = await manager.submit("appointment", "clinic_002", run, idempotency_key="abc")
+        assert again is first and other_clinic is not first
+        await _wait(first)
+        await _wait(other_clinic)
+        assert len(calls) == 2 and manager.stats()["deduplicated"] == 1
+
+    asyncio.run(main())
+
+
+def test_full_queue_is_503():
+    async def main():
+        manager = make_manager(workers=1, max_pending=1)
+        release = asyncio.Event()
+
+        async def blocked():
+            await release.wait()
+            return {}
+
+        running = await manager.submit("triage", "clinic_001", blocked)
+        await asyncio.sleep(0.01)  # picked up by the only worker
+        queued = await manager.submit("triage", "clinic_001", blocked)
+        with pytest.raises(HTTPException) as e:
+            await manager.submit("triage", "clinic_001", blocked)
+        assert e.value.status_code == 503 and "Retry-After" in e.value.headers
+        release.set()
+        await _wait(running)
+        await _wait(queued)
+
+    asyncio.run(main())
+
+
+def _capture_webhooks(manager, statuses):
+    received = []
+
+    def handler(request):
+        received.append(request)
+        return httpx.Response(statuses[min(len(received), len(statuses)) - 1])
+
+    manager._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return received
+
+
+async def _wait_webhook(manager):
+    while manager._webhook_tasks:
+        await asyncio.gather(*manager._webhook_tasks)
+
+
+def test_webhook_signed_and_retried(monkeypatch):
+    real_sleep = asyncio.sleep
+
+    async def no_backoff(delay, *args):
+        await real_sleep(0)
+
+    monkeypatch.setattr(jobs.asyncio, "sleep", no_backoff)
+
+    async def main():
+        manager = make_manager(webhook_secret="s3cret")
+        received = _capture_webhooks(manager, [503, 200])
+
+        async def run():
+            return {"ok": True}
+
+        job = await _wait(await manager.submit("triage", "clinic_001", run, webhook_url=PUBLIC_URL))
+        await _wait_webhook(manager)
+        assert job.webhook_status == "delivered" and job.webhook_attempts == 2
+        body = received[-1].content
+        assert orjson.loads(body)["result"] == {"ok": True}
+        expected = hmac.new(b"s3cret", body, hashlib.sha256).hexdigest()
+        assert received[-1].headers["X-MediFlow-Signature"] == f"sha256={expected}"
+
+    asyncio.run(main())
+
+
+def test_webhook_rechecked_before_delivery(monkeypatch):
+    async def main():
+        manager = make_manager()
+        received = _capture_webhooks(manager, [200])
+
+        async def run():
+            return {}
+
+        job = await manager.submit("triage", "clinic_001", run, webhook_url=PUBLIC_URL)
+        # The host now resolves somewhere private (DNS rebinding)
+        monkeypatch.setattr(jobs, "is_public_address", lambda address: False)
+        await _wait(job)
+        await _wait_webhook(manager)
+        assert job.webhook_status == "failed" and received == []
+
+    asyncio.run(main())
+
+
+def test_close_drains_queued_jobs_and_closes_webhook_client():
+    async def main():
+        manager = make_manager(workers=1, shutdown_grace_seconds=5)
+        _capture_webhooks(manager, [200])
+        http = manager._http
+
+        async def run():
+            await asyncio.sleep(0.01)
+            return {"ok": True}
+
+        queued = [await manager.submit("triage", "clinic_001", run, webhook_url=PUBLIC_URL) for _ in range(3)]
+        await manager.close()
+        assert all(job.status == JOB_SUCCEEDED and job.webhook_status == "delivered" for job in queued)
+        assert http.is_closed and manager._http is None
+        assert manager._worker_tasks == [] and not manager._webhook_tasks
+
+    asyncio.run(main())
+
+
+def test_close_cancels_jobs_past_the_grace_period():
+    async def main():
+        manager = make_manager(workers=1, shutdown_grace_seconds=0.05)
+
+        async def hang():
+            await asyncio.sleep(60)
+
+        running = await manager.submit("triage", "clinic_001", hang)
+        queued = await manager.submit("triage", "clinic_001", hang)
+        await asyncio.sleep(0)
+        await asyncio.wait_for(manager.close(), timeout=2)
+        for job in (running, queued):
+            assert job.status == JOB_FAILED and job.error["status_code"] == 503
+        assert manager.stats()["failed"] == 2
+
+        # A later submit starts fresh workers
+        async def ok():
+            return {}
+
+        assert (await _wait(await manager.submit("triage", "clinic_001", ok))).status == JOB_SUCCEEDED
+        await manager.close()
+
+    asyncio.run(main())
+
+
+def test_app_shutdown_closes_job_manager(monkeypatch):
+    closed = []
+
+    async def close():
+        closed.append(True)
+
+    monkeypatch.setattr(jobs.job_manager, "close", close)
+    with TestClient(app):
+        assert closed == []
+    assert closed == [True]
@@ -0,0 +1,103 @@
+# Local medication inventory index
+import json
+import os
+
+import pytest
+
+from app.core.config import Settings
+from app.services.medication_index import MIN_PREFIX_LENGTH, MedicationIndex, normalize_drug_name
+
+CLINIC = "Klinik Sri Hartamas"
+CSV = """english_name,malay_name,generic_name,stock_quantity,unit,price_rm,reorder_level,category,common_uses,location,supplier,clinic,expiry_date
+Panadol,Panadol,Paracetamol,150,tablets,0.15,30,Pain Relief,Fever,SHELF-A1,PharmaCare,Klinik Sri Hartamas,31/12/2025
+Panadol Extra,Panadol Extra,Paracetamol,10,tablets,0.30,20,Pain Relief,Headache,SHELF-A1,PharmaCare,Klinik Sri Hartamas,31/12/2025
+Painkiller,Ubat Sakit,Ibuprofen,85,tablets,0.25,20,Pain Relief,Body pain,SHELF-A2,MediSupply,Klinik Sri Hartamas,15/3/2026
+Vitamin C,Vitamin C,Ascorbic Acid,200,tablets,0.10,50,Supplements,Immunity,SHELF-D1,MediSupply,Klinik Sri Hartamas,1/1/2027
+Panadol,Panadol,Paracetamol,5,tablets,0.15,30,Pain Relief,Fever,SHELF-1,PharmaCare,Klinik Bangsar,31/12/2025
+"""
+
+
+@pytest.fixture
+def index(tmp_path):
+    (tmp_path / "medication_inventory.csv").write_text(CSV, encoding="utf-8")
+    (tmp_path / "notes.txt").write_text("not a csv", encoding="utf-8")
+    return MedicationIndex(str(tmp_path))
+
+
+def test_normalize_drug_name():
+    assert normalize_drug_name("  Cold & Flu Tablets ") == "cold flu tablets"
+
+
+def test_exact_lookup_by_any_name(index):
+    assert index.lookup(CLINIC, "painkiller").generic_name == "Ibuprofen"
+    assert index.lookup(CLINIC, "Ubat Sakit").generic_name == "Ibuprofen"
+    assert index.lookup(CLINIC, "IBUPROFEN").english_name == "Painkiller"
+
+
+def test_shared_generic_resolves_only_by_brand(index):
+    # Paracetamol is stocked as two products, so only the brand name picks one
+    assert index.lookup(CLINIC, "paracetamol") is None
+    assert index.lookup(CLINIC, "panadol extra").english_name == "Panadol Extra"
+    assert index.lookup(CLINIC, "panadol").english_name == "Panadol"
+
+
+def test_prefix_lookup_needs_unambiguous_min_length(index):
+    assert index.lookup(CLINIC, "ibu").generic_name == "Ibuprofen"
+    assert index.lookup(CLINIC, "ibuprofen"[:MIN_PREFIX_LENGTH - 1]) is None  # Too short
+    assert index.lookup(CLINIC, "pai").english_name == "Painkiller"
+    assert index.lookup(CLINIC, "vit").english_name == "Vitamin C"
+    assert index.lookup(CLINIC, "pana") is None  # Panadol and Panadol Extra
+
+
+def test_clinics_are_separate(index):
+    assert json.loads(index.lookup("klinik  BANGSAR", "panadol").drug_entry)["stock_quantity"] == 5
+    assert index.lookup("Klinik Lain", "panadol") is None
+
+
+def test_drug_entry_and_message(index):
+    record = index.lookup(CLINIC, "panadol extra")
+    entry = json.loads(record.drug_entry)
+    assert entry["low_stock"] is True
+    assert entry["alternatives"][0]["drug_name"] == "Panadol"  # Same category, most stock first
+    assert "please reorder" in record.medication_message
+    assert record.as_result()["answered_from"] == "inventory_index"
+
+
+def test_answer_question_prefers_longest_name(index):
+    assert index.answer_question(CLINIC, "Vitamin C ada lagi?").english_name == "Vitamin C"
+    assert index.answer_question(CLINIC, "Panadol Extra stock?").english_name == "Panadol Extra"
+
+
+def test_stats_and_reload(index, tmp_path):
+    index.lookup(CLINIC, "panadol")
+    index.lookup(CLINIC, "unknown")
+    stats = index.stats()
+    assert stats["files_loaded"] == ["medication_inventory.csv"]
+    assert stats["clinics"] == {CLINIC: 4, "Klinik Bangsar": 1}
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+    version = index.version
+    (tmp_path / "medication_inventory.csv").write_text(CSV.splitlines()[0] + "\n", encoding="utf-8")
+    assert index.reload() == 0
+    assert index.version == version + 1
+    assert index.lookup(CLINIC, "panadol") is None
+
+
+def test_missing_directory_loads_nothing(tmp_path):
+    index = MedicationIndex(str(tmp_path / "missing"))
+    assert index.lookup(CLINIC, "panadol") is None
+    assert index.stats()["files_loaded"] == []
+
+
+def test_empty_directory_warns(tmp_path, caplog):
+    (tmp_path / "medication_inventory.csv").write_text(CSV.splitlines()[0] + "\n", encoding="utf-8")
+    MedicationIndex(str(tmp_path))
+    assert "loaded no items" in caplog.text
+
+
+def test_default_data_dir_holds_the_bundled_csvs(monkeypatch):
+    monkeypatch.delenv("MEDICATION_DATA_DIR", raising=False)
+    data_dir = Settings(_env_file=None).MEDICATION_DATA_DIR
+    assert os.path.isabs(data_dir)
+    index = MedicationIndex(data_dir)
+    assert index.lookup(CLINIC, "panadol") is not None
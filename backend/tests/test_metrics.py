@@ -0,0 +1,50 @@
+# Prometheus /metrics endpoint and the request timing middleware
+import asyncio
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+from app.main import app
+
+REQUEST_COUNT = "mediflow_http_request_duration_seconds_count"
+
+
+def _scrape(*paths):
+    """GET each path, then /metrics; returns the request-count samples keyed by (route, method, status)."""
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+            for path in paths:
+                await client.get(path)
+            return await client.get("/metrics")
+
+    response = asyncio.run(main())
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    return {
+        (sample.labels["route"], sample.labels["method"], sample.labels["status"]): sample.value
+        for family in text_string_to_metric_families(response.text)
+        for sample in family.samples
+        if sample.name == REQUEST_COUNT
+    }
+
+
+def test_requests_labelled_by_route_template():
+    before = _scrape()
+    after = _scrape("/api/v1/clinics/clinic_001", "/api/v1/clinics/clinic_002", "/api/v1/clinics/no_such_clinic")
+    route = "/api/v1/clinics/{clinic_id}"
+    assert after[(route, "GET", "200")] - before.get((route, "GET", "200"), 0) == 2
+    assert after[(route, "GET", "404")] - before.get((route, "GET", "404"), 0) == 1
+    assert not any("clinic_001" in labels[0] for labels in after)
+
+
+def test_unmatched_paths_share_one_label():
+    before = _scrape()
+    after = _scrape("/no/such/path", "/another/missing/path")
+    key = ("unmatched", "GET", "404")
+    assert after[key] - before.get(key, 0) == 2
+
+
+def test_metrics_endpoint_not_counted():
+    _scrape()
+    samples = _scrape()
+    assert not any(labels[0] == "/metrics" for labels in samples)
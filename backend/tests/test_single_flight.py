@@ -0,0 +1,96 @@
+# Single-flight coalescing of identical in-flight calls
+import asyncio
+
+import pytest
+
+from app.services.single_flight import SingleFlight
+
+
+def test_followers_share_the_leaders_result():
+    async def main():
+        flight = SingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return {"answer": 42}
+
+        results = await asyncio.gather(*(flight.do("key", fn) for _ in range(5)))
+        return flight, calls, results
+
+    flight, calls, results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert flight.stats()["calls_started"] == 1 and flight.stats()["calls_coalesced"] == 4
+
+
+def test_exception_reaches_every_waiter():
+    async def main():
+        flight = SingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.02)
+            raise RuntimeError("502 Bad Gateway")
+
+        return await asyncio.gather(*(flight.do("key", fn) for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(main())
+    assert len(errors) == 3
+    assert all(isinstance(error, RuntimeError) and str(error) == "502 Bad Gateway" for error in errors)
+
+
+def test_key_is_released_after_the_call():
+    async def main():
+        flight = SingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("first call fails")
+            return "ok"
+
+        with pytest.raises(RuntimeError):
+            await flight.do("key", fn)
+        assert flight.stats()["in_flight"] == 0
+        assert await flight.do("key", fn) == "ok"
+        assert await flight.do("key", fn) == "ok"
+        return calls
+
+    assert len(asyncio.run(main())) == 3
+
+
+def test_different_keys_do_not_coalesce():
+    async def main():
+        flight = SingleFlight()
+
+        async def fn(value):
+            await asyncio.sleep(0.01)
+            return value
+
+        return await asyncio.gather(flight.do("a", lambda: fn("a")), flight.do("b", lambda: fn("b")))
+
+    assert asyncio.run(main()) == ["a", "b"]
+
+
+def test_cancelled_waiter_does_not_cancel_the_shared_call():
+    async def main():
+        flight = SingleFlight()
+        finished = []
+
+        async def fn():
+            await asyncio.sleep(0.05)
+            finished.append(1)
+            return "ok"
+
+        leader = asyncio.create_task(flight.do("key", fn))
+        follower = asyncio.create_task(flight.do("key", fn))
+        await asyncio.sleep(0.01)
+        leader.cancel()  # The client that started the call disconnects
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower, finished
+
+    result, finished = asyncio.run(main())
+    assert result == "ok" and finished == [1]
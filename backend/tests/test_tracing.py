@@ -0,0 +1,135 @@
+# Server-Timing header, traceparent sampling and OTLP/JSON export
+import asyncio
+import re
+from types import SimpleNamespace
+
+import httpx
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+from jamaibase import protocol as p
+
+from app.core.config import settings
+from app.core.tracing import MAX_SERVER_TIMING_SPANS, OTLPExporter, TracedRoute, TracingMiddleware, Trace, span
+from app.main import app
+from app.services import jamai_services
+from app.services.jamai_services import jamai_service
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+class CapturingExporter(OTLPExporter):
+    """Enabled exporter that keeps traces in memory instead of starting the export thread."""
+
+    def __init__(self):
+        super().__init__(file_path="unused.jsonl")
+        self.traces = []
+
+    def export(self, trace):
+        self.traces.append(trace)
+
+
+def _traced_app(exporter, sample_rate=0.0):
+    router = APIRouter(route_class=TracedRoute)
+
+    @router.post("/items/{item_id}")
+    async def create_item(item_id: str, body: dict):
+        with span("clinic"):
+            with span("jamai", desc="Test Table"):
+                await asyncio.sleep(0)
+        return {"item_id": item_id, **body}
+
+    traced = FastAPI()
+    traced.include_router(router)
+    traced.add_middleware(TracingMiddleware, exporter=exporter, sample_rate=sample_rate)
+    return traced
+
+
+def _post(traced, headers=None):
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=traced), base_url="http://t") as client:
+            return await client.post("/items/abc", json={"q": 1}, headers=headers or {})
+
+    return asyncio.run(main())
+
+
+def _timing_names(header):
+    return [entry.split(";")[0] for entry in header.split(", ")]
+
+
+def test_server_timing_on_chat_batch(monkeypatch):
+    class FakeTable:
+        async def add_table_rows(self, table_type, request):
+            chunk = p.ChatCompletionChunk(
+                id="test", created=0, model="test", usage=None,
+                choices=[p.ChatCompletionChoice(message=p.ChatEntry.assistant("answer"), index=0)],
+            )
+            return p.GenTableRowsChatCompletionChunks(rows=[
+                p.GenTableChatCompletionChunks(columns={"response": chunk, "source_doc": chunk}, row_id=str(i))
+                for i in range(len(request.data))
+            ])
+
+    monkeypatch.setattr(jamai_services.answer_store, "enabled", False)
+    monkeypatch.setattr(jamai_service, "client", SimpleNamespace(table=FakeTable()))
+    response = TestClient(app).post("/api/v1/patients/chat/batch", json={
+        "clinic_id": "clinic_001", "questions": ["Server-Timing trace question?"], "language": "EN"
+    })
+    assert response.status_code == 200
+    header = response.headers["server-timing"]
+    names = _timing_names(header)
+    assert "parse" in names and names[-1] == "total"
+    assert re.search(rf'jamai;dur=[0-9.]+;desc="{re.escape(settings.ACTION_TABLE_SOP_QNA)}"', header)
+    assert response.headers["timing-allow-origin"] == "*"
+
+
+def test_sampled_traceparent_is_followed():
+    exporter = CapturingExporter()
+    traced = _traced_app(exporter, sample_rate=0.0)
+
+    _post(traced, {"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"})
+    assert len(exporter.traces) == 1
+    trace = exporter.traces[0]
+    assert trace.sampled and trace.trace_id == TRACE_ID and trace.parent_span_id == PARENT_ID
+    assert trace.name == "POST /items/{item_id}"
+    assert trace.attributes["http.status_code"] == 200
+
+    _post(traced, {"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-00"})  # Caller did not sample
+    _post(traced, {"traceparent": "not-a-traceparent"})
+    assert len(exporter.traces) == 1
+
+
+def test_server_timing_truncated():
+    trace = Trace("GET /", sampled=False)
+    for i in range(MAX_SERVER_TIMING_SPANS + 10):
+        trace.add_span(f"s{i}", 0, 1_000_000)
+    names = _timing_names(trace.server_timing())
+    assert len(names) == MAX_SERVER_TIMING_SPANS + 1
+    assert names[-2] == f"s{MAX_SERVER_TIMING_SPANS - 1}" and names[-1] == "total"
+
+
+def test_otlp_export_is_well_formed():
+    exporter = CapturingExporter()
+    _post(_traced_app(exporter), {"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"})
+    payload = exporter.to_otlp(exporter.traces)
+
+    (resource_spans,) = payload["resourceSpans"]
+    assert {"key": "service.name", "value": {"stringValue": "mediflow-backend"}} in resource_spans["resource"]["attributes"]
+    spans = {s["name"]: s for s in resource_spans["scopeSpans"][0]["spans"]}
+    root = spans["POST /items/{item_id}"]
+    assert set(spans) == {root["name"], "parse", "clinic", "jamai", "serialize"}
+
+    for s in spans.values():
+        assert s["traceId"] == TRACE_ID
+        assert re.fullmatch(r"[0-9a-f]{16}", s["spanId"])
+        assert int(s["startTimeUnixNano"]) <= int(s["endTimeUnixNano"])
+    assert len({s["spanId"] for s in spans.values()}) == len(spans)
+
+    # Root continues the caller's trace; children link back through the span tree
+    assert root["parentSpanId"] == PARENT_ID and root["kind"] == 2
+    assert spans["clinic"]["parentSpanId"] == root["spanId"]
+    assert spans["jamai"]["parentSpanId"] == spans["clinic"]["spanId"]
+    assert spans["parse"]["parentSpanId"] == spans["serialize"]["parentSpanId"] == root["spanId"]
+    assert spans["jamai"]["kind"] == 3  # CLIENT
+    assert all(spans[name]["kind"] == 1 for name in ("parse", "clinic", "serialize"))
+    assert {"key": "http.status_code", "value": {"intValue": "200"}} in root["attributes"]
+    assert root["status"] == {"code": 1}
@@ -0,0 +1,220 @@
+# Incremental knowledge sync: manifest planning and resumable CSV row ingestion
+import os
+import re
+import threading
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from scripts import upload_knowledge
+from scripts.upload_knowledge import (
+    MANIFEST_VERSION, ROW_LOG_DIR, ingest_csv_rows, load_manifest, plan_sync, recover_row_log, save_manifest
+)
+
+HEADER = "english_name,malay_name,generic_name,stock_quantity,unit,price_rm,reorder_level,category,common_uses,location,supplier,clinic,expiry_date\n"
+ROWS = [
+    "Panadol,Panadol,Paracetamol,150,tablets,0.15,30,Pain Relief,Fever,SHELF-A1,PharmaCare,Klinik A,31/12/2025\n",
+    "Painkiller,Ubat Sakit,Ibuprofen,85,tablets,0.25,20,Pain Relief,Body pain,SHELF-A1,MediSupply,Klinik A,15/3/2026\n",
+    "Broken,,,-5,tablets,,,,,,,Klinik A,\n",
+    "Antibiotic,Antibiotik,Amoxicillin,60,capsules,0.80,15,Antibiotics,Infections,SHELF-B2,PharmaCare,Klinik A,1/6/2026\n",
+    "Cough Syrup,Ubat Batuk,Dextromethorphan,40,bottles,6.50,10,Cough,Dry cough,SHELF-C1,MediSupply,Klinik A,1/9/2026\n",
+]
+
+
+class FakeTable:
+    """
+    Knowledge Table stand-in: hands out row ids and keeps the rows it holds. Add number
+    `fail_on_add` raises `error`; with `applied` it inserts its rows first (a timeout after
+    JamAI accepted the request).
+    """
+
+    def __init__(self, fail_on_add: int = None, error: Exception = None, applied: bool = False):
+        self.fail_on_add = fail_on_add
+        self.error = error or ConnectionError("connection refused")
+        self.applied = applied
+        self.rows = {}
+        self.added = []
+        self.deleted = []
+        self.adds = 0
+        self.next_id = 0
+
+    def add_table_rows(self, table_type, request):
+        self.adds += 1
+        failing = self.adds == self.fail_on_add
+        if failing and not self.applied:
+            raise self.error
+        rows = []
+        for item in request.data:
+            row_id = f"r{self.next_id}"
+            self.next_id += 1
+            self.rows[row_id] = item["Title"]
+            self.added.append(item["Title"])
+            rows.append(SimpleNamespace(row_id=row_id))
+        if failing:
+            raise self.error
+        return SimpleNamespace(rows=rows)
+
+    def delete_table_rows(self, table_type, request):
+        self.deleted.extend(request.row_ids)
+        for row_id in request.row_ids:
+            self.rows.pop(row_id, None)
+
+    def list_table_rows(self, table_type, table_id, offset=0, limit=100, search_query="", columns=None,
+                        vec_decimals=0):
+        matches = [{"ID": row_id, "Title": {"value": title}}
+                   for row_id, title in self.rows.items() if search_query in title]
+        return SimpleNamespace(items=matches[offset:offset + limit], total=len(matches))
+
+
+def table_client(table):
+    return SimpleNamespace(table=table)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(upload_knowledge.time, "sleep", lambda seconds: None)
+
+
+def _write_csv(path, rows=ROWS):
+    path.write_text(HEADER + "".join(rows), encoding="utf-8")
+    return str(path)
+
+
+def test_plan_sync_skips_unchanged_files(tmp_path):
+    _write_csv(tmp_path / "meds.csv")
+    (tmp_path / "sop.pdf").write_bytes(b"%PDF-1.4 sop")
+    (tmp_path / "notes.txt").write_text("ignored", encoding="utf-8")
+    manifest = load_manifest(str(tmp_path))
+
+    to_upload, unchanged, removed = plan_sync(str(tmp_path), manifest)
+    assert [item[0] for item in to_upload] == ["meds.csv", "sop.pdf"]
+
+    # Record both as uploaded, plus a file that has since been deleted
+    for filename, table_id, sha256, stat in to_upload:
+        manifest["files"][filename] = {"sha256": sha256, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                                       "table_id": table_id, "mode": "file"}
+    manifest["files"]["old.pdf"] = {"sha256": "x", "table_id": "t", "mode": "file"}
+    save_manifest(str(tmp_path), manifest)
+    manifest = load_manifest(str(tmp_path))
+    assert manifest["version"] == MANIFEST_VERSION
+
+    to_upload, unchanged, removed = plan_sync(str(tmp_path), manifest)
+    assert to_upload == [] and unchanged == ["meds.csv", "sop.pdf"] and removed == ["old.pdf"]
+
+    # Touched but identical content is still unchanged; edited content is not
+    os.utime(tmp_path / "sop.pdf", ns=(1, 1))
+    (tmp_path / "meds.csv").write_text(HEADER + ROWS[0], encoding="utf-8")
+    to_upload, unchanged, _ = plan_sync(str(tmp_path), manifest)
+    assert [item[0] for item in to_upload] == ["meds.csv"] and unchanged == ["sop.pdf"]
+    assert manifest["files"]["sop.pdf"]["mtime_ns"] == 1
+
+    # Switching to row mode or forcing re-uploads everything affected
+    assert [item[0] for item in plan_sync(str(tmp_path), manifest, csv_rows=True)[0]] == ["meds.csv"]
+    assert len(plan_sync(str(tmp_path), manifest, force=True)[0]) == 2
+
+
+def test_corrupt_manifest_means_full_upload(tmp_path):
+    (tmp_path / upload_knowledge.MANIFEST_FILENAME).write_text("{not json", encoding="utf-8")
+    assert load_manifest(str(tmp_path))["files"] == {}
+
+
+def test_recover_row_log_truncates_uncommitted_ids(tmp_path):
+    log_path = tmp_path / "meds.csv.ids"
+    log_path.write_text("r0\nr1\n#2 0\nr2\n#4 1\nr3\nr4\n", encoding="utf-8")
+    assert recover_row_log(str(log_path)) == (4, 1, 3, ["r3", "r4"])
+    assert log_path.read_text(encoding="utf-8") == "r0\nr1\n#2 0\nr2\n#4 1\n"
+    assert recover_row_log(str(tmp_path / "missing.ids")) == (0, 0, 0, [])
+
+
+def test_ingest_csv_rows_in_batches(tmp_path):
+    table = FakeTable()
+    log_path = str(tmp_path / ROW_LOG_DIR / "meds.ids")
+    result = ingest_csv_rows(table_client(table), "meds", _write_csv(tmp_path / "meds.csv"), log_path,
+                             batch_size=2, retries=0, backoff=0)
+    assert result == (4, 1, 2, 0)  # 4 rows, 1 rejected, 2 requests, not resumed
+    assert table.added[0] == "Panadol (Paracetamol) - Klinik A"
+    assert recover_row_log(log_path)[:3] == (5, 1, 4)
+
+
+def test_ingest_resumes_after_partial_row_log(tmp_path):
+    csv_path = _write_csv(tmp_path / "meds.csv")
+    log_path = str(tmp_path / ROW_LOG_DIR / "meds.ids")
+
+    # First run dies on its second request: the first batch is committed in the log
+    first = FakeTable(fail_on_add=2)
+    with pytest.raises(ConnectionError):
+        ingest_csv_rows(table_client(first), "meds", csv_path, log_path, batch_size=2, retries=0, backoff=0)
+    assert recover_row_log(log_path)[:3] == (2, 0, 2)
+    # A batch that reached JamAI but was never marked committed
+    with open(log_path, "a", encoding="utf-8") as log:
+        log.write("orphan1\n")
+
+    second = FakeTable()
+    row_count, rejected, batches, resumed_from = ingest_csv_rows(
+        table_client(second), "meds", csv_path, log_path, batch_size=2, retries=0, backoff=0
+    )
+    assert resumed_from == 2
+    assert second.deleted == ["orphan1"]
+    assert second.added == ["Antibiotic (Amoxicillin) - Klinik A", "Cough Syrup (Dextromethorphan) - Klinik A"]
+    assert (row_count, rejected, batches) == (4, 1, 1)
+
+
+def test_per_file_time_excludes_queue_wait(tmp_path, monkeypatch, capsys):
+    for name in ("a.pdf", "b.pdf", "c.pdf"):
+        (tmp_path / name).write_bytes(b"%PDF-1.4 " + name.encode())
+
+    class SlowTable(FakeTable):
+        def add_table_rows(self, table_type, request):
+            threading.Event().wait(0.1)  # time.sleep is patched out for retry backoff
+            return SimpleNamespace(rows=[SimpleNamespace(row_id=request.data[0]["file"])])
+
+    monkeypatch.setattr(upload_knowledge, "JamAI", lambda **kwargs: table_client(SlowTable()))
+    monkeypatch.setattr(upload_knowledge, "notify_backend", lambda endpoint, params=None: None)
+    upload_knowledge.upload_data(data_dir=str(tmp_path), workers=1)
+
+    # One worker: the third file waits ~0.2s in the queue but its upload takes ~0.1s
+    times = [float(t) for t in re.findall(r"Indexed \S+ in ([0-9.]+)s", capsys.readouterr().out)]
+    assert len(times) == 3 and max(times) < 0.18
+    assert load_manifest(str(tmp_path))["files"].keys() == {"a.pdf", "b.pdf", "c.pdf"}
+
+
+def test_refused_batch_is_resent_without_reconciling(tmp_path):
+    table = FakeTable(fail_on_add=1, error=RuntimeError("Too Many Requests"))
+    log_path = str(tmp_path / ROW_LOG_DIR / "meds.ids")
+    ingest_csv_rows(table_client(table), "meds", _write_csv(tmp_path / "meds.csv"), log_path,
+                    batch_size=10, retries=2, backoff=0)
+    assert sorted(table.rows.values()) == sorted(set(table.added))
+    assert len(table.rows) == 4 and table.deleted == []
+
+
+def test_ambiguous_batch_failure_is_reconciled_before_resending(tmp_path):
+    # Second batch times out after JamAI inserted it: those rows are removed, then the batch is resent
+    table = FakeTable(fail_on_add=2, error=httpx.ReadTimeout("timed out"), applied=True)
+    log_path = str(tmp_path / ROW_LOG_DIR / "meds.ids")
+    result = ingest_csv_rows(table_client(table), "meds", _write_csv(tmp_path / "meds.csv"), log_path,
+                             batch_size=2, retries=2, backoff=0)
+    assert result[0] == 4
+    assert len(table.rows) == 4 and len(set(table.rows.values())) == 4  # No duplicates
+    assert len(table.deleted) == 2
+    assert set(upload_knowledge.iter_row_log_ids(log_path)) == set(table.rows)
+
+
+def test_ambiguous_file_upload_is_not_retried(tmp_path):
+    table = FakeTable(fail_on_add=1, error=RuntimeError("502 Bad Gateway"), applied=True)
+    with pytest.raises(RuntimeError):
+        upload_knowledge.with_retries(lambda: table.add_table_rows(None, SimpleNamespace(data=[{"Title": "sop"}])),
+                                      "Uploading sop.pdf", 3, 0, is_safe=upload_knowledge.is_unapplied)
+    assert table.adds == 1
+
+
+@pytest.mark.parametrize("error, unapplied", [
+    (httpx.ConnectError("refused"), True),
+    (RuntimeError("Rate limit exceeded"), True),
+    (RuntimeError("Service Unavailable"), True),
+    (httpx.ReadTimeout("timed out"), False),
+    (RuntimeError("502 Bad Gateway"), False),
+    (RuntimeError("Internal Server Error"), False),
+])
+def test_is_unapplied(error, unapplied):
+    assert upload_knowledge.is_unapplied(error) is unapplied
@@ -82,21 +82,33 @@ class ApiService {
   static const String baseUrl = 'http://localhost:8080/api/v1';
   static const String staffSecretCode = 'MEDIFLOW-ADMIN-2024';
 
+  // Last clinic list and its ETag, reused when the backend answers 304 Not Modified
+  static List<ApiClinic>? _cachedClinics;
+  static String? _clinicsEtag;
+
   /// Get available clinics
   static Future<ApiResponse<List<ApiClinic>>> getClinics() async {
     try {
+      final headers = {'Content-Type': 'application/json'};
+      if (_cachedClinics != null && _clinicsEtag != null) {
+        headers['If-None-Match'] = _clinicsEtag!;
+      }
       final response = await http.get(
         Uri.parse('$baseUrl/clinics'),
-        headers: {'Content-Type': 'application/json'},
+        headers: headers,
       );
 
-      if (response.statusCode == 200) {
+      if (response.statusCode == 304 && _cachedClinics != null) {
+        return ApiResponse.success(_cachedClinics);
+      } else if (response.statusCode == 200) {
         final data = json.decode(response.body);
         // Backend returns array directly, not wrapped in 'clinics' field
         final List<ApiClinic> clinics = (data as List?)
                 ?.map((clinic) => ApiClinic.fromJson(clinic))
                 .toList() ??
             [];
+        _cachedClinics = clinics;
+        _clinicsEtag = response.headers['etag'];
         return ApiResponse.success(clinics);
       } else {
         return ApiResponse.error('Failed to load clinics: ${response.statusCode}');